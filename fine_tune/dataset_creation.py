@@ -28,6 +28,7 @@ from qna.engine import retrieve_question_context, build_grounded_answer_prompt
 from qna.generators import generate
 from qna.utils import extract_entity_terms
 from qna.types import RetrievalResult
+from qna.db_fetch import hydrate_chunks
 from qna.retrieval_metrics import RetrievalMetrics, make_retrieval_metric_record
 
 REPO_ROOT = Path(__file__).resolve().parents[1]
@@ -686,11 +687,21 @@ Return [] only if there is genuinely no factual statement in the source.
                     settings.get("validator_jitter") or {},
                     validator_rng,
                 )
-                hard_candidates = get_hard_negative_candidates(
-                    retrieval,
-                    positive,
-                    pool_size=settings["negative_pool_size"],
+                hard_conn = sqlite3.connect(
+                    f"file:{settings['db_path']}?mode=ro",
+                    uri=True,
                 )
+                hard_conn.row_factory = sqlite3.Row
+
+                try:
+                    hard_candidates = get_hard_negative_candidates(
+                        hard_conn,
+                        retrieval,
+                        positive,
+                        pool_size=settings["negative_pool_size"],
+                    )
+                finally:
+                    hard_conn.close()
 
                 hard_negatives = select_validated_negatives(
                     hard_candidates,
@@ -992,14 +1003,15 @@ def validate_negative_candidate(*, question: str, reference_answer: str, candida
     valid_negative = (not answerable_from_candidate and confidence >= min_confidence)
     return valid_negative, result
 
-def get_hard_negative_candidates(retrieval: RetrievalResult, positive: dict, *, pool_size: int) -> list[dict]:
+def get_hard_negative_candidates(conn: sqlite3.Connection, retrieval: RetrievalResult, positive: dict, *, pool_size: int) -> list[dict]:
     positive_doc_id = int(positive["doc_id"])
 
     output: list[dict] = []
     seen_docs = {positive_doc_id}
 
-    for candidate in retrieval.candidate_chunks:
-        candidate = dict(candidate)
+    # Retrieval only hydrates the rows that can reach the context; fill in text for the rest by chunk_id.
+    candidates = [dict(candidate) for candidate in retrieval.candidate_chunks if int(candidate["doc_id"]) != positive_doc_id]
+    for candidate in hydrate_chunks(conn, candidates):
         doc_id = int(candidate["doc_id"])
 
         if doc_id in seen_docs:
@@ -21,6 +21,8 @@ RAG_DIR = REPO_ROOT / "rag"
 log = logging.getLogger(__name__)
 
 from core.paths import resolve_db_path, resolve_faiss_dir
+from core.compression import resolve_embedding_dtype
+from utils.codec import encode_vectors
 from utils.logging_setup import setup_logging
 
 
@@ -178,7 +180,7 @@ def show_available_files(output_dir: Path) -> None:
             log.info("[PULL] %-24s %8.3f GB  %s", p.name, size_gb, role)
 
 
-def import_embeddings(db_path: Path, chunk_ids_path: Path, vectors_path: Path, batch_size: int = 2000) -> int:
+def import_embeddings(db_path: Path, chunk_ids_path: Path, vectors_path: Path, batch_size: int = 2000, cfg: dict | None = None) -> int:
     if not chunk_ids_path.exists():
         raise FileNotFoundError(chunk_ids_path)
     if not vectors_path.exists():
@@ -200,6 +202,8 @@ def import_embeddings(db_path: Path, chunk_ids_path: Path, vectors_path: Path, b
 
     conn = rw_connect(str(db_path))
     cur = conn.cursor()
+    embed_dtype = resolve_embedding_dtype(conn, cfg)
+    log.info("[EMBED_IMPORT] storing vectors as %s", embed_dtype)
 
     inserted_total = 0
     t0 = time.time()
@@ -212,8 +216,8 @@ def import_embeddings(db_path: Path, chunk_ids_path: Path, vectors_path: Path, b
             vec_block = np.asarray(vectors[start:end], dtype=np.float32)
 
             rows = [
-                (int(cid), dims, vec_block[i].tobytes())
-                for i, cid in enumerate(ids_block)
+                (int(cid), dims, blob)
+                for cid, blob in zip(ids_block, encode_vectors(vec_block, embed_dtype))
             ]
 
             cur.execute("BEGIN")
@@ -377,6 +381,7 @@ def main() -> None:
             embedding_dir / "chunk_ids.npy",
             embedding_dir / "vectors.npy",
             batch_size=args.embedding_batch_size,
+            cfg=cfg,
         )
         log.info("[KAGGLE_PULL] Imported %d embeddings into %s", inserted, db_path)
     else:
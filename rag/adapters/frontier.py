@@ -0,0 +1,110 @@
+import logging
+import sqlite3
+from collections import deque
+from pathlib import Path
+
+log = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS frontier (
+    url TEXT PRIMARY KEY,
+    seq INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS seen (
+    url TEXT PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS pages (
+    url TEXT PRIMARY KEY,
+    bytes INTEGER NOT NULL,
+    links TEXT NOT NULL
+);
+"""
+
+class CrawlFrontier:
+    def __init__(self, path: str | None, seeds: list[str], *, commit_every: int = 50):
+        path = path or ":memory:"
+        if path != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.commit_every = max(1, int(commit_every))
+        self.pending_ops = 0
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(SCHEMA)
+
+        pending = [url for (url,) in self.conn.execute("SELECT url FROM frontier ORDER BY seq")]
+        self.resumed = bool(pending)
+        if self.resumed:
+            self.seen = {url for (url,) in self.conn.execute("SELECT url FROM seen")}
+        else:
+            self.conn.execute("DELETE FROM seen")
+            self.seen = set()
+            pending = list(dict.fromkeys(seeds))
+            self.conn.executemany("INSERT OR REPLACE INTO frontier(url, seq) VALUES (?, ?)", [(url, i) for i, url in enumerate(pending)])
+        self.conn.commit()
+
+        self.queue = deque(pending)
+        self.queued = set(pending)
+        self.seq = int(self.conn.execute("SELECT COALESCE(MAX(seq), 0) FROM frontier").fetchone()[0]) + 1
+        if self.resumed:
+            log.info("[FRONTIER] resumed path=%s pending=%d seen=%d", path, len(self.queue), len(self.seen))
+
+    def __bool__(self) -> bool:
+        return bool(self.queue)
+
+    def __len__(self) -> int:
+        return len(self.queue)
+
+    def __contains__(self, url: str) -> bool:
+        return url in self.queued
+
+    def push(self, url: str) -> bool:
+        if url in self.seen or url in self.queued:
+            return False
+        self.queue.append(url)
+        self.queued.add(url)
+        self.conn.execute("INSERT OR REPLACE INTO frontier(url, seq) VALUES (?, ?)", (url, self.seq))
+        self.seq += 1
+        self.touch()
+        return True
+
+    def pop(self) -> str:
+        url = self.queue.popleft()
+        self.queued.discard(url)
+        return url
+
+    def mark_seen(self, *urls: str) -> None:
+        fresh = [url for url in urls if url not in self.seen]
+        self.seen.update(fresh)
+        self.conn.executemany("INSERT OR IGNORE INTO seen(url) VALUES (?)", [(url,) for url in fresh])
+        self.conn.executemany("DELETE FROM frontier WHERE url=?", [(url,) for url in fresh if url not in self.queued])
+        self.touch()
+
+    def set_page(self, url: str, nbytes: int, links: list[str]) -> None:
+        self.conn.execute("INSERT OR REPLACE INTO pages(url, bytes, links) VALUES (?, ?, ?)", (url, int(nbytes), "\n".join(links)))
+        self.touch()
+
+    def get_page(self, url: str) -> tuple[int, list[str]] | None:
+        row = self.conn.execute("SELECT bytes, links FROM pages WHERE url=?", (url,)).fetchone()
+        if row is None:
+            return None
+        return int(row[0]), [link for link in str(row[1]).split("\n") if link]
+
+    def touch(self) -> None:
+        self.pending_ops += 1
+        if self.pending_ops >= self.commit_every:
+            self.checkpoint()
+
+    def checkpoint(self) -> None:
+        self.conn.commit()
+        self.pending_ops = 0
+
+    def finish(self) -> None:
+        self.queue.clear()
+        self.queued.clear()
+        self.conn.execute("DELETE FROM frontier")
+        self.conn.execute("DELETE FROM seen")
+        self.checkpoint()
+
+    def close(self) -> None:
+        self.checkpoint()
+        self.conn.close()
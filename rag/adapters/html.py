@@ -4,13 +4,15 @@ import logging
 import random
 import re
 
-from urllib.parse import urlsplit, urlunsplit, parse_qs
-from collections import deque
+from pathlib import Path
+from urllib.parse import urlsplit, urlunsplit, parse_qs, quote
 from urllib.parse import urljoin, urlparse
 from bs4 import BeautifulSoup
-from markdownify import markdownify as md
+from markdownify import MarkdownConverter, markdownify as md
 from requests.exceptions import RequestException, Timeout, ConnectionError
 
+from adapters.frontier import CrawlFrontier
+
 log = logging.getLogger(__name__)
 
 _RETRY_STATUSES = {408, 425, 429, 500, 502, 503, 504}
@@ -206,8 +208,8 @@ def soup_text_fallback(node) -> str:
     lines = [l for l in lines if l]
     return "\n".join(lines)
 
-def extract_links(html: str, base: str):
-    soup = BeautifulSoup(html, "lxml")
+def soup_links(soup: BeautifulSoup, base: str) -> list[str]:
+    links = []
     for a in soup.select("a[href]"):
         href = a.get("href")
         if not href:
@@ -216,12 +218,35 @@ def extract_links(html: str, base: str):
         parts = urlsplit(u)
         if parts.scheme not in ("http", "https"):
             continue
-        u = normalize_url(u)
-        yield u
+        links.append(normalize_url(u))
+    return list(dict.fromkeys(links))
 
-def html_to_text(html: str, url: str | None = None) -> str:
-    soup = BeautifulSoup(html, "lxml")
+def extract_links(html: str, base: str):
+    yield from soup_links(BeautifulSoup(html, "lxml"), base)
+
+def soup_title(soup: BeautifulSoup, default: str) -> str:
+    if soup.title and soup.title.string:
+        return soup.title.string.strip()
+    return default
+
+def node_to_markdown(node, *, reparse: bool = False) -> str:
+    try:
+        if reparse:
+            text = md(str(node))
+        else:
+            text = MarkdownConverter().convert_soup(node)
 
+    except RecursionError:
+        log.warning("[HTML] markdownify recursion error; using text fallback")
+        text = soup_text_fallback(node)
+
+    except Exception as exc:
+        log.warning("[HTML] markdownify failed type=%s; using text fallback", type(exc).__name__)
+        text = soup_text_fallback(node)
+
+    return text.strip()
+
+def soup_to_text(soup: BeautifulSoup, url: str | None = None, *, reparse: bool = False) -> str:
     for tag in soup(["script", "style", "noscript"]):
         tag.decompose()
 
@@ -258,18 +283,7 @@ def html_to_text(html: str, url: str | None = None) -> str:
             or soup
         )
 
-    try:
-        text = md(str(main))
-
-    except RecursionError:
-        log.warning("[HTML] markdownify recursion error; using text fallback")
-        text = soup_text_fallback(main)
-
-    except Exception as exc:
-        log.warning("[HTML] markdownify failed type=%s; using text fallback", type(exc).__name__)
-        text = soup_text_fallback(main)
-
-    text = text.strip()
+    text = node_to_markdown(main, reparse=reparse)
 
     if "game8.co" in host:
         if is_low_value_game8_text(text):
@@ -280,6 +294,26 @@ def html_to_text(html: str, url: str | None = None) -> str:
 
     return text
 
+def html_to_text(html: str, url: str | None = None) -> str:
+    return soup_to_text(BeautifulSoup(html, "lxml"), url)
+
+def extract_page(html: str, url: str) -> tuple[str, str, list[str]]:
+    soup = BeautifulSoup(html, "lxml")
+    links = soup_links(soup, url)
+    title = soup_title(soup, url)
+    return soup_to_text(soup, url), title, links
+
+def save_html_fixture(fixtures_dir: str, url: str, html: str) -> None:
+    name = quote(url, safe="")
+    if len(name) > 240:
+        log.debug("[HTML] fixture name too long url=%s", url)
+        return
+    path = Path(fixtures_dir) / f"{name}.html"
+    try:
+        path.write_text(html, encoding="utf-8")
+    except OSError as exc:
+        log.warning("[HTML] failed to save fixture url=%s error=%s", url, exc)
+
 def game8_response_problem(response:requests.Response,html:str) -> str | None:
     if len(response.content)<1500:
         return f"undersized response body: {len(response.content)} bytes"
@@ -289,10 +323,24 @@ def game8_response_problem(response:requests.Response,html:str) -> str | None:
         return f"blocking or challenge page: {marker!r}"
     return None
 
-def crawl_site(base_url: str, seeds: list[str], deny_url, allow_url = None, rate_limit_s: float = 1.0, max_pages: int | None = 2000, allowed_langs: str = "EN"):
-    q = deque(normalize_url (url) for url in seeds)
-    seen: set[str] = set()
+def conditional_headers(validator: tuple[str | None, str | None] | None) -> dict[str, str]:
+    if not validator:
+        return {}
+    etag, last_modified = validator
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+    return headers
+
+def crawl_site(base_url: str, seeds: list[str], deny_url, allow_url = None, rate_limit_s: float = 1.0, max_pages: int | None = 2000, allowed_langs: str = "EN", validators: dict[str, tuple[str | None, str | None]] | None = None, frontier_path: str | None = None, fixtures_dir: str | None = None, stats: dict | None = None):
+    q = CrawlFrontier(frontier_path, [normalize_url(url) for url in seeds])
+    seen = q.seen
+    validators = validators or {}
     retries: dict[str, int] = {}
+    stats = stats if stats is not None else {}
+    stats.update({"requests": 0, "not_modified": 0, "bytes_received": 0, "bytes_saved": 0, "resumed_seen": len(seen)})
     session = requests.Session()
     game8_source = is_game8_url(base_url)
     request_delay_s = (max(rate_limit_s, 3.0) if game8_source else rate_limit_s)
@@ -323,7 +371,7 @@ def crawl_site(base_url: str, seeds: list[str], deny_url, allow_url = None, rate
         retries[requested_url] = attempt
         if attempt > max_retries:
             log.warning("[HTML] Giving up url=%s retries=%d reason=%s", requested_url, attempt - 1, reason,)
-            seen.add(requested_url)
+            q.mark_seen(requested_url)
             return False
 
         retry_after = None
@@ -338,164 +386,184 @@ def crawl_site(base_url: str, seeds: list[str], deny_url, allow_url = None, rate
         else:
             sleep_backoff(attempt - 1, base=2.0, cap=90.0,)
 
-        q.append(requested_url)
+        q.push(requested_url)
         return True
 
-    def enqueue_game8_articles(html:str, page_url:str) -> int:
+    def enqueue_game8_articles(links: list[str]) -> int:
         added = 0
-        for link in extract_links(html, page_url):
-            link = normalize_url(link)
-
+        for link in links:
             if not is_game8_article(link):
                 continue
             if deny_url and deny_url.search(link):
                 continue
             if allow_url and not allow_url.search(link):
                 continue
-            if link in seen or link in q:
-                continue
-
-            q.append(link)
-            added+=1
+            if q.push(link):
+                added+=1
         return added
 
-    while q and (max_pages is None or len(seen) < max_pages):
-        requested_url = normalize_url(q.popleft())
-
-        if requested_url in seen:
-            continue
-        if not same_site(requested_url, base_url):
-            continue
-
-        if deny_url and deny_url.search(requested_url):
-            log.warning("[HTML] Skip denied URL: %s", requested_url)
-            seen.add(requested_url)
-            continue
+    def enqueue_site_links(links: list[str]) -> int:
+        added = 0
+        for link in links:
+            link_path = urlsplit(link).path.lower()
 
-        if allow_url and not allow_url.search(requested_url):
-            if not (game8_source and is_game8_discovery_url(requested_url)):
-                log.info("[HTML] Skip URL outside allow list: %s",requested_url)
-                seen.add(requested_url)
+            if link_path.endswith(SKIP_EXT):
                 continue
+            if not allow_lang(link, allowed_langs):
+                continue
+            if not same_site(link, base_url):
+                continue
+            if deny_url and deny_url.search(link):
+                continue
+            if allow_url and not allow_url.search(link):
+                continue
+            if q.push(link):
+                added += 1
+        return added
 
-        if not allow_lang(requested_url, allowed_langs):
-            seen.add(requested_url)
-            continue
-
-        path = urlsplit(requested_url).path.lower()
-        if path.endswith(SKIP_EXT):
-            seen.add(requested_url)
-            continue
-
-        try:
-            if game8_source:
-                time.sleep(request_delay_s + random.uniform(0.2, 0.8))
-            response = session.get(requested_url, timeout=(15, 60), allow_redirects=True)
-        except (Timeout, ConnectionError, RequestException) as exc:
-            schedule_retry(requested_url, reason=f"{type(exc).__name__}: {exc}")
-            continue
+    try:
+        while q and (max_pages is None or len(seen) < max_pages):
+            requested_url = normalize_url(q.pop())
 
-        final_url = normalize_url(response.url)
-        retry_statuses = _RETRY_STATUSES if game8_source else _RETRY_STATUSES
+            if requested_url in seen:
+                continue
+            if not same_site(requested_url, base_url):
+                q.mark_seen(requested_url)
+                continue
 
-        if game8_source and response.status_code == 403:
-            log.warning("[GAME8] HTTP 403 blocked url=%s", requested_url)
-            seen.add(requested_url)
-            sleep_backoff(2, base=5.0, cap=30.0)
-            continue
+            if deny_url and deny_url.search(requested_url):
+                log.warning("[HTML] Skip denied URL: %s", requested_url)
+                q.mark_seen(requested_url)
+                continue
 
-        if response.status_code in retry_statuses:
-            schedule_retry(requested_url, reason=f"HTTP {response.status_code}", response=response)
-            continue
+            if allow_url and not allow_url.search(requested_url):
+                if not (game8_source and is_game8_discovery_url(requested_url)):
+                    log.info("[HTML] Skip URL outside allow list: %s",requested_url)
+                    q.mark_seen(requested_url)
+                    continue
 
-        if response.status_code >= 400:
-            log.warning("[HTML] HTTP %d requested=%s final=%s", response.status_code, requested_url, final_url)
-            seen.add(requested_url)
-            time.sleep(request_delay_s)
-            continue
+            if not allow_lang(requested_url, allowed_langs):
+                q.mark_seen(requested_url)
+                continue
 
-        if not same_site(final_url, base_url):
-            log.warning("[HTML] Redirect outside approved site requested=%s final=%s", requested_url, final_url)
-            seen.add(requested_url)
-            continue
+            path = urlsplit(requested_url).path.lower()
+            if path.endswith(SKIP_EXT):
+                q.mark_seen(requested_url)
+                continue
 
-        if allow_url and not allow_url.search(final_url):
-            if not (game8_source and is_game8_discovery_url(final_url)):
-                log.warning("[HTML] Redirect outside allow list requested=%s final=%s",requested_url,final_url)
-                seen.add(requested_url)
+            # A 304 is only useful when the page's links were stored; otherwise the crawl would stop at this page.
+            page = q.get_page(requested_url)
+            try:
+                if game8_source:
+                    time.sleep(request_delay_s + random.uniform(0.2, 0.8))
+                response = session.get(requested_url, headers=conditional_headers(validators.get(requested_url) if page is not None else None), timeout=(15, 60), allow_redirects=True)
+            except (Timeout, ConnectionError, RequestException) as exc:
+                schedule_retry(requested_url, reason=f"{type(exc).__name__}: {exc}")
                 continue
 
-        content_type = (response.headers.get("Content-Type") or "").lower()
-        if "text/html" not in content_type and "application/xhtml+xml" not in content_type:
-            log.info("[HTML] Skip non-HTML content-type=%s url=%s", content_type, final_url)
-            seen.add(requested_url)
-            continue
+            stats["requests"] += 1
+            stats["bytes_received"] += len(response.content)
+
+            if response.status_code == 304:
+                stats["not_modified"] += 1
+                if page is not None:
+                    stats["bytes_saved"] += page[0]
+                    added = enqueue_game8_articles(page[1]) if game8_source else enqueue_site_links(page[1])
+                else:
+                    added = 0
+                log.info("[HTML] not modified url=%s stored_links_added=%d", requested_url, added)
+                q.mark_seen(requested_url)
+                if not game8_source:
+                    time.sleep(request_delay_s)
+                continue
 
-        html=response.text
+            final_url = normalize_url(response.url)
+            retry_statuses = _RETRY_STATUSES if game8_source else _RETRY_STATUSES
 
-        if game8_source:
-            problem = game8_response_problem(response, html)
-            if problem:
-                schedule_retry(requested_url, reason = problem, response = response)
+            if game8_source and response.status_code == 403:
+                log.warning("[GAME8] HTTP 403 blocked url=%s", requested_url)
+                q.mark_seen(requested_url)
+                sleep_backoff(2, base=5.0, cap=30.0)
                 continue
 
-            if is_game8_discovery_url(final_url):
-                added = enqueue_game8_articles(html, final_url)
-                seen.add(requested_url)
-                seen.add(final_url)
-                log.info("[GAME8] discovery processed url=%s article_links_added=%d", final_url, added)
+            if response.status_code in retry_statuses:
+                schedule_retry(requested_url, reason=f"HTTP {response.status_code}", response=response)
                 continue
 
-            if not is_game8_article(final_url):
-                log.info("[GAME8] skipping non-article url=%s", final_url)
-                seen.add(requested_url)
-                seen.add(final_url)
+            if response.status_code >= 400:
+                log.warning("[HTML] HTTP %d requested=%s final=%s", response.status_code, requested_url, final_url)
+                q.mark_seen(requested_url)
+                time.sleep(request_delay_s)
                 continue
 
-        text = html_to_text(html, final_url)
-        if not text.strip():
-            log.warning("[HTML] Skipping empty extraction url=%s", final_url)
-            seen.add(requested_url)
-            seen.add(final_url)
-            continue
+            if not same_site(final_url, base_url):
+                log.warning("[HTML] Redirect outside approved site requested=%s final=%s", requested_url, final_url)
+                q.mark_seen(requested_url)
+                continue
 
-        title = final_url
-        try:
-            soup = BeautifulSoup(html, "lxml")
-            if soup.title and soup.title.string:
-                title = soup.title.string.strip()
-        except Exception:
-            log.exception("[HTML] Failed to extract title url=%s", final_url)
+            if allow_url and not allow_url.search(final_url):
+                if not (game8_source and is_game8_discovery_url(final_url)):
+                    log.warning("[HTML] Redirect outside allow list requested=%s final=%s",requested_url,final_url)
+                    q.mark_seen(requested_url)
+                    continue
 
-        seen.add(requested_url)
-        seen.add(final_url)
+            content_type = (response.headers.get("Content-Type") or "").lower()
+            if "text/html" not in content_type and "application/xhtml+xml" not in content_type:
+                log.info("[HTML] Skip non-HTML content-type=%s url=%s", content_type, final_url)
+                q.mark_seen(requested_url)
+                continue
 
-        if game8_source:
-            added = enqueue_game8_articles(html, final_url)
-            log.debug("[GAME8] article=%s discovered_articles=%d", final_url, added)
-        else:
-            for link in extract_links(html, final_url):
-                link = normalize_url(link)
-                link_path = urlsplit(link).path.lower()
+            html=response.text
+            soup = BeautifulSoup(html, "lxml")
+            links = soup_links(soup, final_url)
 
-                if link_path.endswith(SKIP_EXT):
-                    continue
-                if not allow_lang(link, allowed_langs):
-                    continue
-                if not same_site(link, base_url):
+            if game8_source:
+                problem = game8_response_problem(response, html)
+                if problem:
+                    schedule_retry(requested_url, reason = problem, response = response)
                     continue
-                if deny_url and deny_url.search(link):
+
+                if is_game8_discovery_url(final_url):
+                    added = enqueue_game8_articles(links)
+                    q.mark_seen(requested_url, final_url)
+                    log.info("[GAME8] discovery processed url=%s article_links_added=%d", final_url, added)
                     continue
-                if allow_url and not allow_url.search(link):
+
+                if not is_game8_article(final_url):
+                    log.info("[GAME8] skipping non-article url=%s", final_url)
+                    q.mark_seen(requested_url, final_url)
                     continue
-                if link not in seen and link not in q:
-                    q.append(link)
 
-        last_modified = response.headers.get("Last-Modified")
-        etag = response.headers.get("ETag")
+            title = soup_title(soup, final_url)
+            text = soup_to_text(soup, final_url)
+            if not text.strip():
+                log.warning("[HTML] Skipping empty extraction url=%s", final_url)
+                q.mark_seen(requested_url, final_url)
+                continue
 
-        log.info("[HTML] accepted requested=%s final=%s chars=%d", requested_url, final_url, len(text))
-        yield final_url, title, text, last_modified, etag
+            q.mark_seen(requested_url, final_url)
+            if fixtures_dir:
+                save_html_fixture(fixtures_dir, final_url, html)
 
-        if not game8_source:
-            time.sleep(request_delay_s)
\ No newline at end of file
+            q.set_page(final_url, len(response.content), links)
+            if requested_url != final_url:
+                q.set_page(requested_url, len(response.content), links)
+
+            if game8_source:
+                added = enqueue_game8_articles(links)
+                log.debug("[GAME8] article=%s discovered_articles=%d", final_url, added)
+            else:
+                enqueue_site_links(links)
+
+            last_modified = response.headers.get("Last-Modified")
+            etag = response.headers.get("ETag")
+
+            log.info("[HTML] accepted requested=%s final=%s chars=%d", requested_url, final_url, len(text))
+            yield final_url, title, text, last_modified, etag
+
+            if not game8_source:
+                time.sleep(request_delay_s)
+        q.finish()
+    finally:
+        q.close()
+        log.info("[HTML] crawl done base=%s requests=%d not_modified=%d bytes_received=%d bytes_saved=%d resumed_seen=%d", base_url, stats["requests"], stats["not_modified"], stats["bytes_received"], stats["bytes_saved"], stats["resumed_seen"])
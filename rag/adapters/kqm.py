@@ -1,6 +1,7 @@
 from pathlib import Path
+from collections.abc import Callable
 import shutil, logging
-from git import Repo, InvalidGitRepositoryError
+from git import Repo, InvalidGitRepositoryError, GitCommandError
 
 log = logging.getLogger(__name__)
 
@@ -58,17 +59,44 @@ def ensure_repo(repo_path: str, repo_url: str) -> tuple[bool, str]:
     log.info("[KQM] Git repo up to date (%s)", local_commit[:7])
     return False, local_commit
 
+def is_markdown_doc(path: Path) -> bool:
+    if path.suffix.lower() != ".md":
+        return False
+    if any(part in ("node_modules", ".git") for part in path.parts):
+        return False
+    return path.name.lower() not in SKIP_NAMES
+
 def iter_markdown_files(repo_path: str):
     root = Path(repo_path)
     for path in root.rglob("*.md"):
-        name = path.name.lower()
-        if any(part in ("node_modules", ".git") for part in path.parts):
-            continue
-        if name in SKIP_NAMES:
+        if is_markdown_doc(path.relative_to(root)):
+            yield path
+
+def diff_markdown_files(repo_path: str, since: str, head: str) -> tuple[list[Path], list[str]] | None:
+    try:
+        out = Repo(repo_path).git.diff("--name-status", "--no-renames", since, head)
+    except GitCommandError as exc:
+        log.warning("[KQM] git diff %s..%s failed (%s); falling back to full scan", since[:7], head[:7], str(exc).strip().splitlines()[0] if str(exc).strip() else type(exc).__name__)
+        return None
+
+    root = Path(repo_path)
+    changed: list[Path] = []
+    deleted: list[str] = []
+    for line in out.splitlines():
+        status, _, rel = line.partition("\t")
+        if not rel or not is_markdown_doc(Path(rel)):
             continue
-        yield path
+        if status.startswith("D"):
+            deleted.append(rel)
+        else:
+            changed.append(root / rel)
+    return changed, deleted
+
+def record_kqm_commit(state_path: str | Path, head: str, name: str) -> None:
+    Path(state_path).write_text(head, encoding="utf-8")
+    log.info("[KQM] %s ingested commit recorded %s", name, head[:7])
 
-def load_kqm_tcl_docs(source_cfg: dict):
+def load_kqm_tcl_docs(source_cfg: dict, on_deleted: Callable[[list[str]], None] | None = None, on_complete: Callable[[str], None] | None = None):
     REPO_MAP = {
         "kqm_tcl": "https://github.com/KQM-git/TCL.git",
         "kqm_news": "https://github.com/KQM-git/GINews.git",
@@ -83,15 +111,34 @@ def load_kqm_tcl_docs(source_cfg: dict):
     skip_if_unchanged = bool(source_cfg.get("skip_if_unchanged", True))
     force_rescan = bool(source_cfg.get("force_rescan", False))
 
+    state_path = Path(source_cfg.get("state_file", f"data/{name}_last_commit.txt"))
+    state_path.parent.mkdir(parents=True, exist_ok=True)
+    last_commit = None
+    if state_path.exists():
+        last_commit = state_path.read_text(encoding="utf-8").strip() or None
+
     changed, head = ensure_repo(repo_path, repo_url)
 
-    if skip_if_unchanged and not changed and not force_rescan:
+    if skip_if_unchanged and not force_rescan and (last_commit == head or (last_commit is None and not changed)):
+        if last_commit is None:
+            state_path.write_text(head, encoding="utf-8")
         log.info("[KQM] %s unchanged (%s). Skipping scan.", name, head[:7])
         return
 
-    log.info("[KQM] %s scanning markdown (head=%s)", name, head[:7])
+    diff = None
+    if last_commit and not force_rescan:
+        diff = diff_markdown_files(repo_path, last_commit, head)
 
-    for md_path in iter_markdown_files(repo_path):
+    if diff is None:
+        log.info("[KQM] %s scanning markdown (head=%s)", name, head[:7])
+        md_paths = iter_markdown_files(repo_path)
+    else:
+        md_paths, deleted = diff
+        log.info("[KQM] %s incremental %s..%s changed=%d deleted=%d", name, last_commit[:7], head[:7], len(md_paths), len(deleted))
+        if deleted and on_deleted is not None:
+            on_deleted([f"kqm://{name}/{rel}" for rel in deleted])
+
+    for md_path in md_paths:
         try:
             text = md_path.read_text(encoding="utf-8", errors="ignore")
         except Exception:
@@ -101,4 +148,11 @@ def load_kqm_tcl_docs(source_cfg: dict):
         title = md_path.stem
         rel = md_path.relative_to(repo_path).as_posix()
         url = f"kqm://{name}/{rel}"
-        yield url, title, text, None, None
\ No newline at end of file
+        yield url, title, text, None, None
+
+    # Draining the generator does not mean the docs were stored. A caller that feeds an ingest pipeline
+    # takes the head through on_complete and records it once ingest has succeeded.
+    if on_complete is None:
+        record_kqm_commit(state_path, head, name)
+    else:
+        on_complete(head)
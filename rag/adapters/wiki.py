@@ -2,11 +2,13 @@ import requests
 import time
 import random
 import logging
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime, timezone
 from pathlib import Path
 from typing import Any, Optional
 from bs4 import BeautifulSoup
-from markdownify import markdownify as md
+from markdownify import MarkdownConverter, markdownify as md
 from urllib.parse import quote
 from requests.exceptions import RequestException, Timeout, ConnectionError
 
@@ -20,6 +22,7 @@ def sleep_backoff(attempt: int, base: float = 1.0, cap: float = 60.0) -> None:
 
 def iter_recently_changed_titles(api: str, session: requests.Session, *, start_iso: str, namespace: int = 0, limit: int = 200):
     cont = None
+    seen: set[str] = set()
     while True:
         params = {
             "action": "query",
@@ -43,7 +46,8 @@ def iter_recently_changed_titles(api: str, session: requests.Session, *, start_i
         for r in rows:
             title = r.get("title")
             ts = r.get("timestamp")
-            if title and ts:
+            if title and ts and title not in seen:
+                seen.add(title)
                 yield title, ts
 
         cont = data.get("continue")
@@ -114,12 +118,14 @@ def list_allpages(api: str, limit: int = 100, namespace: int = 0):
         if not cont:
             break
 
-def fandom_html_to_text(html: str) -> str:
+def fandom_html_to_text(html: str, *, reparse: bool = False) -> str:
     soup = BeautifulSoup(html, "lxml")
     for tag in soup.select("script, style, noscript, .reference, .mw-editsection"):
         tag.decompose()
     main = soup.select_one(".mw-parser-output") or soup
-    return md(str(main))
+    if reparse:
+        return md(str(main))
+    return MarkdownConverter().convert_soup(main).strip()
 
 def fetch_page_html(session: requests.Session, api: str, title: str) -> str | None:
     params = {
@@ -138,7 +144,130 @@ def fetch_page_html(session: requests.Session, api: str, title: str) -> str | No
     html = data.get("parse", {}).get("text", {}).get("*")
     return html or None
 
-def load_fandom_docs(source_cfg: dict, rate_limit_s: float = 1.0, max_pages: int | None = None):
+class RateLimiter:
+    def __init__(self, interval_s: float):
+        self.interval_s = max(0.0, float(interval_s))
+        self.next_at = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            delay = max(0.0, self.next_at - now)
+            self.next_at = max(now, self.next_at) + self.interval_s
+        if delay > 0:
+            time.sleep(delay)
+
+thread_state = threading.local()
+
+def thread_session() -> requests.Session:
+    session = getattr(thread_state, "session", None)
+    if session is None:
+        session = thread_state.session = requests.Session()
+    return session
+
+def query_page_revisions(session: requests.Session, api: str, titles: list[str]) -> dict[str, dict[str, Any]] | None:
+    params = {
+        "action": "query",
+        "format": "json",
+        "formatversion": "2",
+        "prop": "revisions",
+        "rvprop": "ids|timestamp",
+        "titles": "|".join(titles),
+        "redirects": "1",
+    }
+    data = get_json_with_retry(session, api, params=params, timeout=60, max_retries=10)
+    if not data:
+        return None
+
+    query = data.get("query", {})
+    resolved = {t: t for t in titles}
+    for step in ("normalized", "redirects"):
+        hops = {r.get("from"): r.get("to") for r in query.get(step, []) or []}
+        resolved = {t: hops.get(target, target) for t, target in resolved.items()}
+
+    pages: dict[str, dict[str, Any]] = {}
+    for page in query.get("pages", []) or []:
+        title = page.get("title")
+        revs = page.get("revisions") or []
+        if not title or page.get("missing") or page.get("invalid") or not revs:
+            continue
+        pages[title] = {"title": title, "revid": int(revs[0]["revid"]), "timestamp": revs[0].get("timestamp")}
+    return {t: pages[target] for t, target in resolved.items() if target in pages}
+
+def fetch_revision_html(api: str, revid: int, limiter: RateLimiter) -> str | None:
+    params = {
+        "action": "parse",
+        "format": "json",
+        "formatversion": "2",
+        "oldid": str(revid),
+        "prop": "text",
+        "disabletoc": "1",
+        "disablelimitreport": "1",
+    }
+    limiter.wait()
+    data = get_json_with_retry(thread_session(), api, params=params, timeout=60, max_retries=10)
+    if not data:
+        return None
+
+    html = data.get("parse", {}).get("text")
+    if isinstance(html, dict):
+        html = html.get("*")
+    return html or None
+
+def iter_fandom_batched(session: requests.Session, api: str, titles: list[str], source_cfg: dict, rate_limit_s: float, validators: dict[str, tuple[str | None, str | None]] | None = None):
+    batch_size = max(1, min(50, int(source_cfg.get("batch_size", 50))))
+    fetch_workers = max(1, int(source_cfg.get("fetch_workers", 4)))
+    convert_workers = int(source_cfg.get("convert_workers", 4))
+    limiter = RateLimiter(rate_limit_s)
+    fetched: set[int] = set()
+    validators = {} if source_cfg.get("force_rebuild") else (validators or {})
+    unchanged_total = 0
+
+    with ThreadPoolExecutor(max_workers=fetch_workers) as fetch_pool, (ProcessPoolExecutor(max_workers=convert_workers) if convert_workers > 0 else ThreadPoolExecutor(max_workers=1)) as convert_pool:
+        for start in range(0, len(titles), batch_size):
+            batch = titles[start:start + batch_size]
+            limiter.wait()
+            revisions = query_page_revisions(session, api, batch)
+            if revisions is None:
+                for title in batch:
+                    yield title, None
+                continue
+
+            pages = []
+            unchanged = 0
+            for title in batch:
+                page = revisions.get(title)
+                if page is None:
+                    log.info("[WIKI] missing or deleted page title=%s", title)
+                    continue
+                if page["revid"] in fetched:
+                    log.debug("[WIKI] duplicate revision title=%s -> %s", title, page["title"])
+                    continue
+                fetched.add(page["revid"])
+                url = f"{api}?title={quote(page['title'])}"
+                if validators.get(url, (None, None))[0] == f"rev:{page['revid']}":
+                    unchanged += 1
+                    continue
+                pages.append(page)
+
+            htmls = list(fetch_pool.map(lambda page: fetch_revision_html(api, page["revid"], limiter), pages))
+            ok = [(page, html) for page, html in zip(pages, htmls) if html]
+            texts = list(convert_pool.map(fandom_html_to_text, [html for _, html in ok]))
+            by_revid = {page["revid"]: text for (page, _), text in zip(ok, texts)}
+
+            for page in pages:
+                text = by_revid.get(page["revid"])
+                if text is None:
+                    yield page["title"], None
+                    continue
+                url = f"{api}?title={quote(page['title'])}"
+                yield page["title"], (url, page["title"], text or "", page["timestamp"], f"rev:{page['revid']}")
+            unchanged_total += unchanged
+            log.info("[WIKI] batch titles=%d unchanged=%d pages=%d converted=%d", len(batch), unchanged, len(pages), len(ok))
+    log.info("[WIKI] batched fetch done titles=%d unchanged_revisions=%d", len(titles), unchanged_total)
+
+def load_fandom_docs(source_cfg: dict, rate_limit_s: float = 1.0, max_pages: int | None = None, validators: dict[str, tuple[str | None, str | None]] | None = None):
     api = source_cfg["api"]
     ns = int(source_cfg.get("namespace", 0))
     session = requests.Session()
@@ -164,22 +293,36 @@ def load_fandom_docs(source_cfg: dict, rate_limit_s: float = 1.0, max_pages: int
     failed = 0
     partial = False
 
-    for title, change_ts in changes:
-        html = fetch_page_html(session, api, title)
-        if html:
-            text = fandom_html_to_text(html) or ""
-            url = f"{api}?title={quote(title)}"
-            yield url, title, text, None, None
-        else:
-            failed += 1
-            log.warning("[WIKI] Skipping page (fetch failed) title=%s", title)
-
-        count += 1
-        if max_pages is not None and count >= max_pages:
+    if str(source_cfg.get("fetch_mode", "parse")).lower() == "batched":
+        titles = [title for title, _ in changes]
+        if max_pages is not None and len(titles) > max_pages:
+            titles = titles[:max_pages]
             partial = True
             log.warning("[WIKI] Stopped early due to max_pages=%d", max_pages)
-            break
-        time.sleep(rate_limit_s)
+        for title, doc in iter_fandom_batched(session, api, titles, source_cfg, rate_limit_s, validators):
+            count += 1
+            if doc is None:
+                failed += 1
+                log.warning("[WIKI] Skipping page (fetch failed) title=%s", title)
+                continue
+            yield doc
+    else:
+        for title, change_ts in changes:
+            html = fetch_page_html(session, api, title)
+            if html:
+                text = fandom_html_to_text(html) or ""
+                url = f"{api}?title={quote(title)}"
+                yield url, title, text, None, None
+            else:
+                failed += 1
+                log.warning("[WIKI] Skipping page (fetch failed) title=%s", title)
+
+            count += 1
+            if max_pages is not None and count >= max_pages:
+                partial = True
+                log.warning("[WIKI] Stopped early due to max_pages=%d", max_pages)
+                break
+            time.sleep(rate_limit_s)
 
     if not partial and failed==0:
         state_path.write_text(crawl_started_at, encoding="utf-8")
@@ -0,0 +1,291 @@
+from __future__ import annotations
+
+import logging
+import sqlite3
+import time
+
+import numpy as np
+
+from core.db import get_embedding_meta, set_embedding_meta
+from utils.codec import (
+    ACTIVE_DICTIONARY,
+    convert_vector_blob,
+    decode_vectors,
+    encode_vectors,
+    frame_dictionary_id,
+    normalize_vector_dtype,
+    register_zstd_dictionary,
+    train_zstd_dictionary,
+    vector_blob_dtype,
+    zstd_compress_text,
+    zstd_decompress_text,
+)
+
+log = logging.getLogger(__name__)
+
+ARCHIVE_TABLES = {
+    "chunks": ("chunks", "chunk_id", "text_zst", "text_zst_len"),
+    "docs": ("docs", "doc_id", "raw_zst", "raw_zst_len"),
+}
+
+def dictionary_enabled(cfg: dict) -> bool:
+    comp_cfg = cfg.get("compression", {}) or {}
+    return str(comp_cfg.get("use_dictionary", True)).strip().lower() in ("1", "true", "yes", "y", "on")
+
+def load_zstd_dictionaries(conn: sqlite3.Connection, cfg: dict | None = None) -> dict[str, int]:
+    use_active = dictionary_enabled(cfg or {})
+    rows = conn.execute("SELECT dict_id, kind, dict_data, is_active FROM zstd_dictionaries ORDER BY created_at").fetchall()
+    ACTIVE_DICTIONARY.clear()
+    for dict_id, kind, data, is_active in rows:
+        register_zstd_dictionary(int(dict_id), bytes(data), kind=str(kind), active=bool(is_active) and use_active)
+    if rows:
+        log.info("[ZSTD] loaded dictionaries=%d active=%s", len(rows), dict(ACTIVE_DICTIONARY))
+    return dict(ACTIVE_DICTIONARY)
+
+def sample_archive_texts(conn: sqlite3.Connection, kind: str, limit: int, piece_chars: int = 16384) -> list[bytes]:
+    if kind == "chunks":
+        rows = conn.execute("SELECT text FROM chunks WHERE is_active=1 AND text IS NOT NULL ORDER BY RANDOM() LIMIT ?", (int(limit),)).fetchall()
+        return [str(r[0]).encode("utf-8") for r in rows if r[0]]
+
+    rows = conn.execute("SELECT raw_zst FROM docs WHERE raw_zst IS NOT NULL AND status=1 ORDER BY RANDOM() LIMIT ?", (int(limit),)).fetchall()
+    samples: list[bytes] = []
+    for (blob,) in rows:
+        text = zstd_decompress_text(blob)
+        for start in range(0, len(text), piece_chars):
+            samples.append(text[start:start + piece_chars].encode("utf-8"))
+    return samples
+
+def train_zstd_dictionaries(conn: sqlite3.Connection, cfg: dict, kinds: tuple[str, ...] = ("chunks", "docs")) -> dict:
+    comp_cfg = cfg.get("compression", {}) or {}
+    dict_size = int(comp_cfg.get("dict_size_kb", 112)) * 1024
+    train_samples = int(comp_cfg.get("train_samples", 20000))
+    level = int(comp_cfg.get("level", 6))
+    report: dict = {}
+
+    load_zstd_dictionaries(conn, cfg)
+    for kind in kinds:
+        samples = sample_archive_texts(conn, kind, train_samples if kind == "chunks" else max(1, train_samples // 20))
+        if len(samples) < 100:
+            log.warning("[ZSTD] not enough samples to train kind=%s samples=%d", kind, len(samples))
+            continue
+        t0 = time.perf_counter()
+        d = train_zstd_dictionary(samples, dict_size=dict_size, level=level)
+        dict_id = int(d.dict_id())
+        data = d.as_bytes()
+        cur = conn.cursor()
+        try:
+            cur.execute("BEGIN IMMEDIATE")
+            cur.execute("UPDATE zstd_dictionaries SET is_active=0 WHERE kind=?", (kind,))
+            cur.execute(
+                """
+                INSERT INTO zstd_dictionaries(dict_id, kind, dict_data, dict_size, samples, is_active)
+                VALUES (?, ?, ?, ?, ?, 1)
+                ON CONFLICT(dict_id) DO UPDATE SET is_active=1
+                """,
+                (dict_id, kind, data, len(data), len(samples)),
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        register_zstd_dictionary(dict_id, data, kind=kind, active=dictionary_enabled(cfg))
+        report[kind] = {"dict_id": dict_id, "dict_size": len(data), "samples": len(samples), "seconds": time.perf_counter() - t0}
+        log.info("[ZSTD] trained kind=%s dict_id=%d size=%d samples=%d in %.1fs", kind, dict_id, len(data), len(samples), report[kind]["seconds"])
+    return report
+
+def recompress_archives(conn: sqlite3.Connection, cfg: dict, *, kinds: tuple[str, ...] = ("chunks", "docs"), batch_size: int = 1000) -> dict:
+    level = int((cfg.get("compression", {}) or {}).get("level", 6))
+    load_zstd_dictionaries(conn, cfg)
+    report: dict = {}
+
+    for kind in kinds:
+        table, id_col, blob_col, len_col = ARCHIVE_TABLES[kind]
+        target = ACTIVE_DICTIONARY.get(kind, 0)
+        rows_seen = rows_rewritten = bytes_before = bytes_after = raw_bytes = 0
+        last_id = 0
+        t0 = time.perf_counter()
+        cur = conn.cursor()
+
+        while True:
+            rows = cur.execute(
+                f"SELECT {id_col}, {blob_col} FROM {table} WHERE {blob_col} IS NOT NULL AND {id_col} > ? ORDER BY {id_col} LIMIT ?",
+                (last_id, int(batch_size)),
+            ).fetchall()
+            if not rows:
+                break
+            last_id = int(rows[-1][0])
+            updates = []
+            for row_id, blob in rows:
+                rows_seen += 1
+                if frame_dictionary_id(blob) == target:
+                    continue
+                text = zstd_decompress_text(blob)
+                new_blob = zstd_compress_text(text, level=level, dict_id=target)
+                bytes_before += len(blob)
+                bytes_after += len(new_blob)
+                raw_bytes += len(text.encode("utf-8"))
+                updates.append((new_blob, len(new_blob), row_id))
+            if updates:
+                try:
+                    cur.execute("BEGIN IMMEDIATE")
+                    cur.executemany(f"UPDATE {table} SET {blob_col}=?, {len_col}=? WHERE {id_col}=?", updates)
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+                rows_rewritten += len(updates)
+            if rows_seen % (batch_size * 20) == 0:
+                log.info("[ZSTD] recompress kind=%s seen=%d rewritten=%d", kind, rows_seen, rows_rewritten)
+
+        seconds = time.perf_counter() - t0
+        report[kind] = {
+            "dict_id": target,
+            "rows_seen": rows_seen,
+            "rows_rewritten": rows_rewritten,
+            "bytes_before": bytes_before,
+            "bytes_after": bytes_after,
+            "ratio_before": (bytes_before / raw_bytes) if raw_bytes else None,
+            "ratio_after": (bytes_after / raw_bytes) if raw_bytes else None,
+            "mb_per_s": (raw_bytes / 1e6) / max(seconds, 1e-9),
+            "seconds": seconds,
+        }
+        log.info("[ZSTD] recompress kind=%s dict_id=%d rewritten=%d/%d bytes %d -> %d (%.1f%% saved) %.1f MB/s", kind, target, rows_rewritten, rows_seen, bytes_before, bytes_after, (100.0 * (1 - bytes_after / bytes_before)) if bytes_before else 0.0, report[kind]["mb_per_s"])
+    return report
+
+def configured_embedding_dtype(cfg: dict | None) -> str | None:
+    raw = ((cfg or {}).get("compression", {}) or {}).get("embedding_dtype")
+    return normalize_vector_dtype(raw) if raw else None
+
+def resolve_embedding_dtype(conn: sqlite3.Connection, cfg: dict | None = None) -> str:
+    configured = configured_embedding_dtype(cfg)
+    stored = get_embedding_meta(conn, "embedding_dtype")
+    if stored is None:
+        has_embeddings = conn.execute("SELECT 1 FROM embeddings LIMIT 1").fetchone() is not None
+        stored = "float32" if has_embeddings or configured is None else configured
+        set_embedding_meta(conn, "embedding_dtype", stored)
+        log.info("[EMBED_DTYPE] recorded embedding_dtype=%s existing_embeddings=%s", stored, has_embeddings)
+    stored = normalize_vector_dtype(stored)
+    if configured and configured != stored:
+        log.warning("[EMBED_DTYPE] config asks for %s but embeddings are stored as %s; new rows keep %s until --EMBED_MIGRATE runs", configured, stored, stored)
+    return stored
+
+def migrate_embedding_dtype(conn: sqlite3.Connection, cfg: dict, *, dtype: str | None = None, batch_size: int = 2000) -> dict:
+    target = normalize_vector_dtype(dtype or configured_embedding_dtype(cfg) or "float32")
+    # Switch writers first; rows written while the rewrite runs already use the target layout.
+    set_embedding_meta(conn, "embedding_dtype", target)
+
+    rows_seen = rows_rewritten = bytes_before = bytes_after = 0
+    last_id = 0
+    t0 = time.perf_counter()
+    cur = conn.cursor()
+    while True:
+        rows = cur.execute("SELECT chunk_id, dims, vector FROM embeddings WHERE chunk_id > ? ORDER BY chunk_id LIMIT ?", (last_id, int(batch_size))).fetchall()
+        if not rows:
+            break
+        last_id = int(rows[-1][0])
+        updates = []
+        for chunk_id, dims, blob in rows:
+            rows_seen += 1
+            if vector_blob_dtype(len(blob), int(dims)) == target:
+                continue
+            new_blob = convert_vector_blob(blob, int(dims), target)
+            bytes_before += len(blob)
+            bytes_after += len(new_blob)
+            updates.append((new_blob, chunk_id))
+        if updates:
+            try:
+                cur.execute("BEGIN IMMEDIATE")
+                cur.executemany("UPDATE embeddings SET vector=? WHERE chunk_id=?", updates)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            rows_rewritten += len(updates)
+        if rows_seen % (batch_size * 20) == 0:
+            log.info("[EMBED_DTYPE] migrate seen=%d rewritten=%d", rows_seen, rows_rewritten)
+
+    report = {
+        "dtype": target,
+        "rows_seen": rows_seen,
+        "rows_rewritten": rows_rewritten,
+        "bytes_before": bytes_before,
+        "bytes_after": bytes_after,
+        "seconds": time.perf_counter() - t0,
+    }
+    log.info("[EMBED_DTYPE] migrate to %s rewritten=%d/%d bytes %d -> %d (%.1f%% saved); run VACUUM to return the freed pages to the filesystem", target, rows_rewritten, rows_seen, bytes_before, bytes_after, (100.0 * (1 - bytes_after / bytes_before)) if bytes_before else 0.0)
+    return report
+
+def compare_embedding_recall(conn: sqlite3.Connection, cfg: dict, *, dtype: str | None = None, queries: int = 200, k: int = 10, seed: int = 1337, batch_size: int = 20000) -> dict:
+    """Recall@k of exact cosine search over ``dtype``-encoded vectors against the stored vectors.
+
+    Queries are stored chunk vectors sampled at random with their own chunk
+    excluded from both result lists, so no query text or embedder is needed.
+    The corpus is streamed in blocks and never held in memory at once.
+    """
+    target = normalize_vector_dtype(dtype or configured_embedding_dtype(cfg) or "float32")
+    active_sql = """
+        SELECT e.chunk_id, e.dims, e.vector
+        FROM embeddings e
+        JOIN chunks c ON c.chunk_id = e.chunk_id
+        WHERE c.is_active=1
+    """
+    all_ids = np.fromiter((r[0] for r in conn.execute("SELECT e.chunk_id FROM embeddings e JOIN chunks c ON c.chunk_id = e.chunk_id WHERE c.is_active=1")), dtype=np.int64)
+    if all_ids.size < 2:
+        raise RuntimeError("[EMBED_DTYPE] not enough active embeddings to compare")
+
+    def unit(X: np.ndarray) -> np.ndarray:
+        return X / np.maximum(np.linalg.norm(X, axis=1, keepdims=True), 1e-12)
+
+    rng = np.random.default_rng(seed)
+    query_ids = np.sort(rng.choice(all_ids, size=min(int(queries), all_ids.size), replace=False))
+    placeholders = ",".join("?" for _ in query_ids)
+    qrows = conn.execute(active_sql + f" AND e.chunk_id IN ({placeholders}) ORDER BY e.chunk_id", [int(x) for x in query_ids]).fetchall()
+    dims = int(qrows[0][1])
+    Q = unit(decode_vectors([r[2] for r in qrows], dims))
+    k = max(1, min(int(k), all_ids.size - 1))
+
+    nq = Q.shape[0]
+    exact_ids = np.full((nq, k), -1, dtype=np.int64)
+    exact_scores = np.full((nq, k), -np.inf, dtype=np.float32)
+    exact_quant = np.zeros((nq, k), dtype=np.float32)
+    quant_ids = np.full((nq, k), -1, dtype=np.int64)
+    quant_scores = np.full((nq, k), -np.inf, dtype=np.float32)
+
+    def merge(best_ids, best_scores, ids, scores, extra_best=None, extra=None):
+        cand_ids = np.hstack([best_ids, np.broadcast_to(ids, (nq, ids.size))])
+        cand_scores = np.hstack([best_scores, scores])
+        top = np.argpartition(-cand_scores, k - 1, axis=1)[:, :k]
+        if extra is not None:
+            extra_best[:] = np.take_along_axis(np.hstack([extra_best, extra]), top, 1)
+        best_ids[:] = np.take_along_axis(cand_ids, top, 1)
+        best_scores[:] = np.take_along_axis(cand_scores, top, 1)
+
+    cur = conn.execute(active_sql + " ORDER BY e.chunk_id")
+    while True:
+        rows = cur.fetchmany(batch_size)
+        if not rows:
+            break
+        ids = np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+        block = decode_vectors([r[2] for r in rows], dims)
+        se = Q @ unit(block).T
+        sq = Q @ unit(decode_vectors(encode_vectors(block, target), dims)).T
+        self_hit = query_ids[:, None] == ids[None, :]
+        se[self_hit] = -np.inf
+        sq[self_hit] = -np.inf
+        merge(exact_ids, exact_scores, ids, se, exact_quant, sq)
+        merge(quant_ids, quant_scores, ids, sq)
+
+    hits = sum(np.intersect1d(a, b).size for a, b in zip(exact_ids, quant_ids))
+    bytes_stored = {"float32": 4 * dims, "float16": 2 * dims, "int8": dims + 4}
+    report = {
+        "dtype": target,
+        "vectors": int(all_ids.size),
+        "queries": int(nq),
+        "k": k,
+        "recall_at_k": hits / max(nq * k, 1),
+        "mean_abs_score_error": float(np.abs(exact_scores - exact_quant).mean()),
+        "bytes_per_vector": bytes_stored[target],
+        "float32_bytes_per_vector": bytes_stored["float32"],
+    }
+    log.info("[EMBED_DTYPE] recall@%d %s vs stored=%.4f mean_abs_score_err=%.5f bytes/vector %d -> %d over %d queries", k, target, report["recall_at_k"], report["mean_abs_score_error"], bytes_stored["float32"], report["bytes_per_vector"], nq)
+    return report
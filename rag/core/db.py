@@ -112,11 +112,39 @@ CREATE TABLE IF NOT EXISTS splade_dirty_docs (
     marked_at TEXT DEFAULT CURRENT_TIMESTAMP
 );
 
+CREATE TABLE IF NOT EXISTS vector_dirty_log (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    chunk_id INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS vector_log_consumers (
+    name TEXT PRIMARY KEY,
+    last_seq INTEGER NOT NULL DEFAULT 0,
+    updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS vector_version (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    version INTEGER NOT NULL DEFAULT 0
+);
+
+INSERT OR IGNORE INTO vector_version(id, version) VALUES (1, 0);
+
 CREATE TABLE IF NOT EXISTS embedding_meta (
     key TEXT PRIMARY KEY,
     value TEXT NOT NULL
 );
 
+CREATE TABLE IF NOT EXISTS zstd_dictionaries (
+    dict_id INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,
+    dict_data BLOB NOT NULL,
+    dict_size INTEGER NOT NULL,
+    samples INTEGER NOT NULL,
+    is_active INTEGER NOT NULL DEFAULT 1,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+
 CREATE INDEX IF NOT EXISTS idx_docs_source ON docs(source);
 CREATE INDEX IF NOT EXISTS idx_chunks_doc_id ON chunks(doc_id);
 CREATE INDEX IF NOT EXISTS idx_docs_source_raw_hash ON docs(source, raw_hash);
@@ -133,6 +161,73 @@ CREATE INDEX IF NOT EXISTS idx_docs_version_ord ON docs(version_ord);
 CREATE INDEX IF NOT EXISTS idx_docs_source_version_ord ON docs(source, version_ord);
 CREATE INDEX IF NOT EXISTS idx_docs_published_at ON docs(published_at);
 
+CREATE TRIGGER IF NOT EXISTS trg_vector_log_embedding_insert
+AFTER INSERT ON embeddings
+WHEN EXISTS (SELECT 1 FROM vector_log_consumers)
+BEGIN
+    INSERT INTO vector_dirty_log(chunk_id) VALUES (NEW.chunk_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_vector_log_embedding_update
+AFTER UPDATE OF dims, vector ON embeddings
+WHEN EXISTS (SELECT 1 FROM vector_log_consumers)
+BEGIN
+    INSERT INTO vector_dirty_log(chunk_id) VALUES (NEW.chunk_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_vector_log_embedding_delete
+AFTER DELETE ON embeddings
+WHEN EXISTS (SELECT 1 FROM vector_log_consumers)
+BEGIN
+    INSERT INTO vector_dirty_log(chunk_id) VALUES (OLD.chunk_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_vector_log_chunk_active
+AFTER UPDATE OF is_active ON chunks
+WHEN OLD.is_active IS NOT NEW.is_active AND EXISTS (SELECT 1 FROM vector_log_consumers)
+BEGIN
+    INSERT INTO vector_dirty_log(chunk_id) VALUES (NEW.chunk_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_vector_log_doc_status
+AFTER UPDATE OF status ON docs
+WHEN OLD.status IS NOT NEW.status AND EXISTS (SELECT 1 FROM vector_log_consumers)
+BEGIN
+    INSERT INTO vector_dirty_log(chunk_id) SELECT chunk_id FROM chunks WHERE doc_id = NEW.doc_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_vector_version_embedding_insert
+AFTER INSERT ON embeddings
+BEGIN
+    UPDATE vector_version SET version = version + 1 WHERE id = 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_vector_version_embedding_update
+AFTER UPDATE OF dims, vector ON embeddings
+BEGIN
+    UPDATE vector_version SET version = version + 1 WHERE id = 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_vector_version_embedding_delete
+AFTER DELETE ON embeddings
+BEGIN
+    UPDATE vector_version SET version = version + 1 WHERE id = 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_vector_version_chunk_active
+AFTER UPDATE OF is_active ON chunks
+WHEN OLD.is_active IS NOT NEW.is_active
+BEGIN
+    UPDATE vector_version SET version = version + 1 WHERE id = 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_vector_version_doc_status
+AFTER UPDATE OF status ON docs
+WHEN OLD.status IS NOT NEW.status
+BEGIN
+    UPDATE vector_version SET version = version + 1 WHERE id = 1;
+END;
+
 CREATE VIEW IF NOT EXISTS v_docs_by_source AS
 SELECT
     source,
@@ -268,4 +363,45 @@ def connect(path: str) -> sqlite3.Connection:
     conn.row_factory = sqlite3.Row
     conn.execute("PRAGMA foreign_keys=ON;")
     log.info(f"[DB] Connected to sqlite db at {p}")
-    return conn
\ No newline at end of file
+    return conn
+
+def get_embedding_meta(conn: sqlite3.Connection, key: str) -> str | None:
+    row = conn.execute("SELECT value FROM embedding_meta WHERE key=?", (key,)).fetchone()
+    return None if row is None else str(row[0])
+
+def set_embedding_meta(conn: sqlite3.Connection, key: str, value: str) -> None:
+    conn.execute(
+        """
+        INSERT INTO embedding_meta(key, value) VALUES (?, ?)
+        ON CONFLICT(key) DO UPDATE SET value=excluded.value
+        """,
+        (key, str(value)),
+    )
+
+def load_document_validators(conn: sqlite3.Connection, source: str) -> dict[str, tuple[str | None, str | None]]:
+    rows = conn.execute(
+        """
+        SELECT d.url, d.etag, d.last_modified
+        FROM docs d
+        WHERE d.source=? AND d.status=1
+        AND EXISTS (SELECT 1 FROM chunks c WHERE c.doc_id=d.doc_id AND c.is_active=1)
+        """,
+        (source,),
+    ).fetchall()
+    return {str(url): (etag, last_modified) for url, etag, last_modified in rows}
+
+def load_document_state(conn: sqlite3.Connection) -> dict[str, tuple[str, bool]]:
+    rows = conn.execute(
+        """
+        SELECT
+            d.url,
+            d.raw_hash,
+            COUNT(c.chunk_id) AS active_chunks,
+            SUM(CASE WHEN c.chunk_id IS NOT NULL AND e.chunk_id IS NULL THEN 1 ELSE 0 END) AS missing_embeddings
+        FROM docs d
+        LEFT JOIN chunks c ON c.doc_id = d.doc_id AND c.is_active = 1
+        LEFT JOIN embeddings e ON e.chunk_id = c.chunk_id
+        GROUP BY d.doc_id
+        """
+    ).fetchall()
+    return {str(url): (str(raw_hash), int(active or 0) > 0 and int(missing or 0) == 0) for url, raw_hash, active, missing in rows}
@@ -3,7 +3,11 @@ import struct
 import time
 import threading
 import logging
-from typing import Literal, Any
+from typing import Literal, Any, Callable
+
+import numpy as np
+
+from utils.codec import encode_vector
 
 log = logging.getLogger(__name__)
 thread_local=threading.local()
@@ -41,21 +45,31 @@ def auto_embedding_profile(model_name: str) -> str:
 
     return "none"
 
-def apply_embedding_prompt(cfg: dict, text_or_texts: str | list[str] | tuple[str,...], *, mode: str, backend: str | None = None, title: str | list[str] | tuple[str,...] | None=None) -> str | list[str]:   
+def resolve_embedding_profile(cfg: dict, backend: str | None = None) -> tuple[str, dict]:
     prompt_cfg = cfg.get("embedding_prompts", {}) or {}
-
     enabled = str(prompt_cfg.get("enabled", True)).strip().lower() in ("1", "true", "yes", "y", "on")
     if not enabled:
-        return text_or_texts
+        return "disabled", {}
 
-    model_name = embedding_model_name(cfg, backend)
     profile_name = str(prompt_cfg.get("profile", "auto")).strip().lower()
-
     if profile_name == "auto":
-        profile_name = auto_embedding_profile(model_name)
+        profile_name = auto_embedding_profile(embedding_model_name(cfg, backend))
 
     profiles = prompt_cfg.get("profiles", {}) or {}
-    profile = profiles.get(profile_name, profiles.get("none", {})) or {}
+    return profile_name, profiles.get(profile_name, profiles.get("none", {})) or {}
+
+def embedding_signature(cfg: dict, backend: str | None = None) -> str:
+    profile_name, _ = resolve_embedding_profile(cfg, backend)
+    return f"{embedding_model_name(cfg, backend)}|{profile_name}"
+
+def passage_prompt_uses_title(cfg: dict, backend: str | None = None) -> bool:
+    _, profile = resolve_embedding_profile(cfg, backend)
+    return "{title}" in str(profile.get("passage_prefix", ""))
+
+def apply_embedding_prompt(cfg: dict, text_or_texts: str | list[str] | tuple[str,...], *, mode: str, backend: str | None = None, title: str | list[str] | tuple[str,...] | None=None) -> str | list[str]:   
+    profile_name, profile = resolve_embedding_profile(cfg, backend)
+    if profile_name == "disabled":
+        return text_or_texts
 
     if mode == "query":
         prefix = str(profile.get("query_prefix", ""))
@@ -89,8 +103,10 @@ def apply_embedding_prompt(cfg: dict, text_or_texts: str | list[str] | tuple[str
     single_title = title[0] if isinstance(title, (list, tuple)) and title else title
     return one(str(text_or_texts) ,str(single_title or ""))
 
-def pack_vec(vec: list[float]) -> tuple[bytes, int]:
-    return struct.pack(f"<{len(vec)}f", *vec), len(vec)
+def pack_vec(vec: list[float], dtype: str = "float32") -> tuple[bytes, int]:
+    if dtype == "float32":
+        return struct.pack(f"<{len(vec)}f", *vec), len(vec)
+    return encode_vector(np.asarray(vec, dtype=np.float32), dtype), len(vec)
 
 def get_session() -> requests.Session:
     session = getattr(thread_local, "session", None)
@@ -158,39 +174,51 @@ def embed_llamacpp(base_url: str, model: str, text_or_texts, timeout: int):
         return pack_vec(rows[0])
     return [pack_vec(vec) for vec in rows]
 
-def embed(cfg: dict, text_or_texts, backend: str | None = None, retries: int=10, backoff_s: float=1.0, mode: Literal["passage", "query"] = "passage", title: str | list[str] | tuple[str,...] | None = None):
+def embed_once(cfg: dict, provider: str | None, text_or_texts):
+    if provider ==  "ollama":
+        ollama = cfg["ollama"]
+        return embed_ollama(
+            ollama["base_url"],
+            ollama["embedding_model"],
+            text_or_texts,
+            ollama.get("embed_keep_alive", "15s"),
+            int(ollama.get("timeout", "180"))
+        )
+
+    if provider == "llamacpp":
+        llamacpp = cfg["llamacpp"]
+        return embed_llamacpp(
+            llamacpp["embedding_url"],
+            llamacpp["embedding_model"],
+            text_or_texts,
+            int(llamacpp.get("timeout", "180"))
+        )
+
+    raise RuntimeError(f"Unknown embedding provider: {provider}")
+
+def embed(cfg: dict, text_or_texts, backend: str | None = None, retries: int=10, backoff_s: float=1.0, mode: Literal["passage", "query"] = "passage", title: str | list[str] | tuple[str,...] | None = None, observer: Callable[[int | None, float, BaseException | None], None] | None = None, backoff: Callable[[float], None] | None = None):
     runtime = cfg.get("runtime", {})
     provider = normalize_backend_name(backend if backend is not None else runtime.get("embedding_provider", "ollama"))
     text_or_texts = apply_embedding_prompt(cfg, text_or_texts, mode=mode, backend=backend, title=title)
     last_err =  None
     for attempt in range(retries):
+        t0 = time.perf_counter()
         try:
-            if provider ==  "ollama":
-                ollama = cfg["ollama"]
-                return embed_ollama(
-                    ollama["base_url"],
-                    ollama["embedding_model"],
-                    text_or_texts,
-                    ollama.get("embed_keep_alive", "15s"),
-                    int(ollama.get("timeout", "180"))
-                )
-            
-            if provider == "llamacpp":
-                llamacpp = cfg["llamacpp"]
-                return embed_llamacpp(
-                    llamacpp["embedding_url"],
-                    llamacpp["embedding_model"],
-                    text_or_texts,
-                    int(llamacpp.get("timeout", "180"))
-                )
-            
-            raise RuntimeError(f"Unknown embedding provider: {provider}")
+            result = embed_once(cfg, provider, text_or_texts)
+            if observer is not None:
+                observer(200, time.perf_counter() - t0, None)
+            return result
         
         except NonRetryableEmbedError:
+            if observer is not None:
+                observer(400, time.perf_counter() - t0, None)
             raise
         except (requests.RequestException, KeyError, ValueError, RuntimeError) as e:
+            if observer is not None:
+                response = getattr(e, "response", None)
+                observer(getattr(response, "status_code", None), time.perf_counter() - t0, e)
             last_err = str(e)
-            time.sleep(backoff_s * (2 ** attempt))
+            (backoff or time.sleep)(backoff_s * (2 ** attempt))
             log.warning("Embedding failed attempt=%d/%d err=%s", attempt + 1, retries, last_err)
     
     raise RuntimeError(f"{provider} embeddings failed after {retries} retries. Last error: {last_err}")
\ No newline at end of file
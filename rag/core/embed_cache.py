@@ -0,0 +1,160 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from .embed import apply_embedding_prompt, embedding_model_name, resolve_embedding_profile
+from .paths import resolve_embedding_cache_path
+
+log = logging.getLogger(__name__)
+
+QUERY = """
+PRAGMA journal_mode=WAL;
+PRAGMA synchronous=NORMAL;
+
+CREATE TABLE IF NOT EXISTS embedding_cache (
+    cache_key TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    profile TEXT NOT NULL,
+    dims INTEGER NOT NULL,
+    vector BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    last_used_at REAL NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_embedding_cache_last_used ON embedding_cache(last_used_at);
+"""
+
+class EmbeddingCache:
+    def __init__(self, path: Path, cfg: dict, *, backend: str | None = None, max_bytes: int = 2 * 1024 ** 3):
+        self.path = Path(path)
+        self.cfg = cfg
+        self.backend = backend
+        self.max_bytes = int(max_bytes)
+        self.model = embedding_model_name(cfg, backend)
+        self.profile, _ = resolve_embedding_profile(cfg, backend)
+        self.hits = self.misses = self.stores = self.evictions = 0
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+        self.conn: sqlite3.Connection | None = sqlite3.connect(str(self.path), timeout=60.0, check_same_thread=False)
+        with self._lock:
+            self.conn.executescript(QUERY)
+            self.conn.commit()
+            row = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM embedding_cache").fetchone()
+            self.entries, self.total_bytes = int(row[0]), int(row[1])
+        log.info("[EMBED_CACHE] opened %s model=%s profile=%s entries=%d size=%.1f MB max=%.1f MB", self.path, self.model, self.profile, self.entries, self.total_bytes / 1e6, self.max_bytes / 1e6)
+
+    def _require_connection(self) -> sqlite3.Connection:
+        if self.conn is None:
+            raise RuntimeError("EmbeddingCache is already closed")
+        return self.conn
+
+    def key_for(self, text: str, title: str | None = None, mode: str = "passage") -> str:
+        prepared = apply_embedding_prompt(self.cfg, text or "", mode=mode, backend=self.backend, title=title)
+        h = hashlib.sha256()
+        for part in (self.model, self.profile, mode, prepared):
+            h.update(str(part).encode("utf-8"))
+            h.update(b"\x1f")
+        return h.hexdigest()
+
+    def get_many(self, keys: list[str]) -> dict[str, tuple[bytes, int]]:
+        if not keys:
+            return {}
+        unique = list(dict.fromkeys(keys))
+        found: dict[str, tuple[bytes, int]] = {}
+        with self._lock:
+            conn = self._require_connection()
+            for start in range(0, len(unique), 500):
+                part = unique[start:start + 500]
+                placeholders = ",".join("?" for _ in part)
+                for cache_key, vec, dims in conn.execute(f"SELECT cache_key, vector, dims FROM embedding_cache WHERE cache_key IN ({placeholders})", part):
+                    found[str(cache_key)] = (bytes(vec), int(dims))
+            if found:
+                now = time.time()
+                conn.executemany("UPDATE embedding_cache SET last_used_at=? WHERE cache_key=?", [(now, k) for k in found])
+                conn.commit()
+            self.hits += sum(1 for k in keys if k in found)
+            self.misses += sum(1 for k in keys if k not in found)
+        return found
+
+    def put_many(self, items: list[tuple[str, bytes, int]]) -> None:
+        items = list({k: (k, vec, dims) for k, vec, dims in items if vec is not None and dims is not None}.values())
+        if not items:
+            return
+        now = time.time()
+        with self._lock:
+            conn = self._require_connection()
+            keys = [k for k, _, _ in items]
+            placeholders = ",".join("?" for _ in keys)
+            existing = {str(k): int(size) for k, size in conn.execute(f"SELECT cache_key, size FROM embedding_cache WHERE cache_key IN ({placeholders})", keys)}
+            conn.executemany(
+                """
+                INSERT OR REPLACE INTO embedding_cache(cache_key, model, profile, dims, vector, size, created_at, last_used_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                [(k, self.model, self.profile, int(dims), vec, len(vec), now, now) for k, vec, dims in items],
+            )
+            for k, vec, _ in items:
+                if k in existing:
+                    self.total_bytes -= existing[k]
+                else:
+                    self.entries += 1
+                self.total_bytes += len(vec)
+            self.stores += len(items)
+            self._evict_locked()
+            conn.commit()
+
+    def _evict_locked(self) -> None:
+        if self.total_bytes <= self.max_bytes:
+            return
+        target = int(self.max_bytes * 0.9)
+        conn = self._require_connection()
+        while self.total_bytes > target:
+            rows = conn.execute("SELECT cache_key, size FROM embedding_cache ORDER BY last_used_at ASC LIMIT 2000").fetchall()
+            if not rows:
+                self.total_bytes = self.entries = 0
+                break
+            victims = []
+            for cache_key, size in rows:
+                victims.append((cache_key,))
+                self.total_bytes -= int(size)
+                if self.total_bytes <= target:
+                    break
+            conn.executemany("DELETE FROM embedding_cache WHERE cache_key=?", victims)
+            self.entries -= len(victims)
+            self.evictions += len(victims)
+        log.info("[EMBED_CACHE] evicted total=%d entries=%d size=%.1f MB", self.evictions, self.entries, self.total_bytes / 1e6)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "entries": self.entries,
+            "bytes": self.total_bytes,
+        }
+
+    def log_stats(self, label: str = "") -> None:
+        st = self.stats()
+        log.info("[EMBED_CACHE] %s hits=%d misses=%d hit_rate=%.1f%% stores=%d evictions=%d entries=%d size=%.1f MB", label, st["hits"], st["misses"], st["hit_rate"] * 100.0, st["stores"], st["evictions"], st["entries"], st["bytes"] / 1e6)
+
+    def close(self) -> None:
+        with self._lock:
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
+
+def open_embedding_cache(cfg: dict, backend: str | None = None) -> EmbeddingCache | None:
+    cache_cfg = cfg.get("embedding_cache", {}) or {}
+    if not str(cache_cfg.get("enabled", False)).strip().lower() in ("1", "true", "yes", "y", "on"):
+        return None
+    max_mb = float(cache_cfg.get("max_mb", 2048))
+    return EmbeddingCache(resolve_embedding_cache_path(cfg), cfg, backend=backend, max_bytes=int(max_mb * 1024 * 1024))
@@ -0,0 +1,151 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, TypeVar
+
+import requests
+
+from .embed import normalize_backend_name
+
+log = logging.getLogger(__name__)
+
+OVERLOAD_STATUS = {408, 429, 503, 504}
+
+T = TypeVar("T")
+
+class AimdLimiter:
+    def __init__(self, *, initial: float, minimum: float, maximum: float, target_latency_s: float, increase: float = 1.0, decrease: float = 0.5, cooldown_s: float = 2.0):
+        self.minimum = max(1.0, float(minimum))
+        self.maximum = max(self.minimum, float(maximum))
+        self.limit = min(self.maximum, max(self.minimum, float(initial)))
+        self.target_latency_s = float(target_latency_s)
+        self.increase = float(increase)
+        self.decrease = float(decrease)
+        self.cooldown_s = float(cooldown_s)
+        self.inflight = 0
+        self.last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    def acquire(self) -> None:
+        with self._cond:
+            while self.inflight >= int(self.limit):
+                self._cond.wait()
+            self.inflight += 1
+
+    def release(self) -> None:
+        with self._cond:
+            self.inflight -= 1
+            self._cond.notify_all()
+
+    def observe(self, latency_s: float, overloaded: bool) -> None:
+        with self._cond:
+            now = time.monotonic()
+            if overloaded or latency_s > self.target_latency_s * 2.0:
+                if now - self.last_decrease >= self.cooldown_s:
+                    self.limit = max(self.minimum, self.limit * self.decrease)
+                    self.last_decrease = now
+            elif latency_s <= self.target_latency_s:
+                self.limit = min(self.maximum, self.limit + self.increase / max(self.limit, 1.0))
+            self._cond.notify_all()
+
+class AdaptiveEmbedClient:
+    def __init__(self, embed_fn: Callable, cfg: dict, *, backend: str | None = None, max_concurrency: int = 2):
+        client_cfg = cfg.get("embedding_client", {}) or {}
+        self.embed_fn = embed_fn
+        self.backend = normalize_backend_name(backend or (cfg.get("runtime", {}) or {}).get("embedding_provider", "ollama")) or "ollama"
+        self.limiter = AimdLimiter(
+            initial=float(client_cfg.get("initial_concurrency", 1)),
+            minimum=float(client_cfg.get("min_concurrency", 1)),
+            maximum=float(client_cfg.get("max_concurrency", max_concurrency)),
+            target_latency_s=float(client_cfg.get("target_latency_s", 4.0)),
+            increase=float(client_cfg.get("aimd_increase", 1.0)),
+            decrease=float(client_cfg.get("aimd_decrease", 0.5)),
+        )
+        self.report_every_s = float(client_cfg.get("report_every_s", 30.0))
+        self.vectors = self.requests = self.throttled = self.failed = 0
+        self.busy_s = 0.0
+        self.started = time.monotonic()
+        self.last_report = self.started
+        self._lock = threading.Lock()
+
+    def observe(self, status: int | None, latency_s: float, error: BaseException | None = None) -> None:
+        # Only the server pushing back counts; client-side errors (bad payloads, KeyError) have no response either.
+        overloaded = status in OVERLOAD_STATUS or (status is None and isinstance(error, (requests.ConnectionError, requests.Timeout)))
+        if overloaded:
+            with self._lock:
+                self.throttled += 1
+        self.limiter.observe(latency_s, overloaded)
+
+    def backoff(self, delay_s: float) -> None:
+        # Give the slot back while waiting to retry so other workers can use it.
+        self.limiter.release()
+        try:
+            time.sleep(delay_s)
+        finally:
+            self.limiter.acquire()
+
+    def __call__(self, text_or_texts, title=None, mode: str = "passage"):
+        n = len(text_or_texts) if isinstance(text_or_texts, (list, tuple)) else 1
+        self.limiter.acquire()
+        t0 = time.perf_counter()
+        ok = False
+        try:
+            result = self.embed_fn(text_or_texts, mode=mode, title=title, observer=self.observe, backoff=self.backoff)
+            ok = True
+            return result
+        finally:
+            self.limiter.release()
+            elapsed = time.perf_counter() - t0
+            with self._lock:
+                self.requests += 1
+                self.busy_s += elapsed
+                if ok:
+                    self.vectors += n
+                else:
+                    self.failed += 1
+            self.maybe_report()
+
+    def stats(self) -> dict:
+        with self._lock:
+            wall = max(time.monotonic() - self.started, 1e-9)
+            return {
+                "backend": self.backend,
+                "vectors": self.vectors,
+                "requests": self.requests,
+                "failed": self.failed,
+                "throttled": self.throttled,
+                "vectors_per_s": self.vectors / wall,
+                "avg_latency_s": self.busy_s / max(self.requests, 1),
+                "concurrency_limit": self.limiter.limit,
+            }
+
+    def maybe_report(self, force: bool = False) -> None:
+        now = time.monotonic()
+        if not force and now - self.last_report < self.report_every_s:
+            return
+        self.last_report = now
+        st = self.stats()
+        log.info("[EMBED_CLIENT] backend=%s vectors=%d requests=%d failed=%d throttled=%d %.1f vectors/s avg_latency=%.2fs limit=%.2f", st["backend"], st["vectors"], st["requests"], st["failed"], st["throttled"], st["vectors_per_s"], st["avg_latency_s"], st["concurrency_limit"])
+
+def pack_length_buckets(items: list[T], length: Callable[[T], int], *, max_items: int, max_chars: int, bucket_bounds: list[int]) -> list[list[T]]:
+    buckets: dict[int, list[T]] = {}
+    for item in sorted(items, key=length):
+        buckets.setdefault(bisect_left(bucket_bounds, length(item)), []).append(item)
+
+    batches: list[list[T]] = []
+    for _, bucket in sorted(buckets.items()):
+        batch: list[T] = []
+        chars = 0
+        for item in bucket:
+            n = length(item)
+            if batch and (len(batch) >= max_items or (max_chars > 0 and chars + n > max_chars)):
+                batches.append(batch)
+                batch, chars = [], 0
+            batch.append(item)
+            chars += n
+        if batch:
+            batches.append(batch)
+    return batches
@@ -0,0 +1,208 @@
+from __future__ import annotations
+
+import logging
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from .vector_store import ACTIVE_EMBEDDINGS_SQL, VectorStore, dirty_log_high_water, iter_blob_batches, vector_store_is_current
+
+log = logging.getLogger(__name__)
+
+def unit_rows(X: np.ndarray) -> np.ndarray:
+    X = np.array(X, dtype=np.float32)
+    X /= np.maximum(np.linalg.norm(X, axis=1, keepdims=True), 1e-12)
+    return X
+
+def exact_top_k(X: np.ndarray, Q: np.ndarray, k: int, *, ids: np.ndarray | None = None, block_rows: int = 65536) -> tuple[np.ndarray, np.ndarray]:
+    """Top-``k`` rows of ``X`` by inner product with each row of ``Q``, best first.
+
+    ``X`` is scored ``block_rows`` at a time and every block is cut to its own
+    top-k with ``argpartition`` before merging, so memory stays at
+    ``len(Q) * (block_rows + k)`` scores. Returns ``(labels, scores)``; labels
+    are row numbers, or ``ids[row]`` when ``ids`` is given.
+    """
+    Q = np.ascontiguousarray(np.atleast_2d(Q), dtype=np.float32)
+    nq, n = Q.shape[0], X.shape[0]
+    k = min(int(k), n)
+    if k <= 0:
+        return np.empty((nq, 0), dtype=np.int64), np.empty((nq, 0), dtype=np.float32)
+
+    best_rows = np.empty((nq, 0), dtype=np.int64)
+    best_scores = np.empty((nq, 0), dtype=np.float32)
+    for start in range(0, n, block_rows):
+        scores = Q @ X[start:start + block_rows].T
+        rows = np.broadcast_to(np.arange(start, start + scores.shape[1], dtype=np.int64), scores.shape)
+        if scores.shape[1] > k:
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            scores, rows = np.take_along_axis(scores, top, 1), start + top
+        cand_rows = np.hstack([best_rows, rows])
+        cand_scores = np.hstack([best_scores, scores])
+        if cand_scores.shape[1] > k:
+            top = np.argpartition(-cand_scores, k - 1, axis=1)[:, :k]
+            cand_rows, cand_scores = np.take_along_axis(cand_rows, top, 1), np.take_along_axis(cand_scores, top, 1)
+        best_rows, best_scores = cand_rows, cand_scores
+
+    order = np.argsort(-best_scores, axis=1, kind="stable")
+    best_rows = np.take_along_axis(best_rows, order, 1)
+    best_scores = np.take_along_axis(best_scores, order, 1)
+    return (ids[best_rows] if ids is not None else best_rows), best_scores
+
+def read_vector_version(conn: sqlite3.Connection) -> int | None:
+    # Bumped by triggers on every embeddings write and active-set change; None on databases created before the counter.
+    try:
+        row = conn.execute("SELECT version FROM vector_version WHERE id = 1").fetchone()
+    except sqlite3.OperationalError:
+        return None
+    return int(row[0]) if row else None
+
+def active_fingerprint(conn: sqlite3.Connection) -> tuple:
+    row = conn.execute(f"SELECT COUNT(*), COALESCE(MAX(chunk_id), 0), COALESCE(SUM(chunk_id), 0) FROM ({ACTIVE_EMBEDDINGS_SQL})").fetchone()
+    return tuple(int(x) for x in row)
+
+def dirty_log_consumers(conn: sqlite3.Connection) -> int:
+    try:
+        return int(conn.execute("SELECT COUNT(*) FROM vector_log_consumers").fetchone()[0])
+    except sqlite3.OperationalError:
+        return 0
+
+def load_active_matrix(conn: sqlite3.Connection, store: VectorStore | None = None, *, batch: int = 4096) -> tuple[np.ndarray, np.ndarray]:
+    if store is not None and vector_store_is_current(conn, store):
+        ids = np.array(store.sorted_ids, dtype=np.int64)
+        X = np.empty((ids.size, store.dims), dtype=np.float32)
+        offset = 0
+        for _, vectors, norms in store.iter_active():
+            X[offset:offset + norms.size] = vectors
+            X[offset:offset + norms.size] /= np.maximum(norms, 1e-12)[:, None]
+            offset += norms.size
+        return ids, X
+
+    id_parts: list[np.ndarray] = []
+    vec_parts: list[np.ndarray] = []
+    for ids, vectors in iter_blob_batches(conn.execute(ACTIVE_EMBEDDINGS_SQL + " ORDER BY e.chunk_id"), batch):
+        if vec_parts and vectors.shape[1] != vec_parts[0].shape[1]:
+            raise RuntimeError(f"[EXACT] mixed embedding dims: expected={vec_parts[0].shape[1]} got={vectors.shape[1]}")
+        id_parts.append(ids)
+        vec_parts.append(unit_rows(vectors))
+    if not id_parts:
+        return np.empty(0, dtype=np.int64), np.empty((0, 0), dtype=np.float32)
+    return np.concatenate(id_parts), np.vstack(vec_parts)
+
+def fetch_active_rows(conn: sqlite3.Connection, chunk_ids: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    id_parts: list[np.ndarray] = []
+    vec_parts: list[np.ndarray] = []
+    for start in range(0, chunk_ids.size, 900):
+        part = [int(x) for x in chunk_ids[start:start + 900]]
+        placeholders = ",".join("?" for _ in part)
+        for ids, vectors in iter_blob_batches(conn.execute(ACTIVE_EMBEDDINGS_SQL + f" AND e.chunk_id IN ({placeholders})", part), len(part)):
+            id_parts.append(ids)
+            vec_parts.append(unit_rows(vectors))
+    if not id_parts:
+        return np.empty(0, dtype=np.int64), np.empty((0, 0), dtype=np.float32)
+    return np.concatenate(id_parts), np.vstack(vec_parts)
+
+class ExactSearchIndex:
+    """Every active embedding as one L2-normalized float32 matrix, searched exactly.
+
+    The matrix is loaded once (from the vector store when it is current,
+    otherwise from SQLite) and kept sorted by chunk_id. ``refresh`` first reads
+    the ``vector_version`` counter and returns at once when nothing was written
+    since. Otherwise it replays the embedding dirty log since the last load and
+    re-reads only the chunks it names; when the log was pruned past that point,
+    or no log consumer was registered for the whole interval so the log has
+    gaps, it falls back to a full reload. Updates build new arrays and swap
+    them in, so searches running on other threads always see a consistent
+    snapshot.
+    """
+
+    def __init__(self, ids: np.ndarray, vectors: np.ndarray, *, last_seq: int = 0, version: int | None = None, logged: bool = False, fingerprint: tuple | None = None, block_rows: int = 65536):
+        self.snapshot = (np.asarray(ids, dtype=np.int64), np.asarray(vectors, dtype=np.float32))
+        self.last_seq = int(last_seq)
+        self.version = version
+        self.logged = bool(logged)
+        self.fingerprint = fingerprint
+        self.block_rows = int(block_rows)
+        self.lock = threading.Lock()
+
+    @classmethod
+    def load(cls, conn: sqlite3.Connection, store: VectorStore | None = None, *, block_rows: int = 65536) -> "ExactSearchIndex":
+        t0 = time.perf_counter()
+        # Read the change markers first; anything written during the load is picked up by the next refresh.
+        version = read_vector_version(conn)
+        logged = dirty_log_consumers(conn) > 0
+        last_seq = dirty_log_high_water(conn)
+        fingerprint = active_fingerprint(conn) if version is None else None
+        ids, X = load_active_matrix(conn, store)
+        log.info("[EXACT] loaded vectors=%d dims=%d (%.1f MB) in %.2fs", ids.size, X.shape[1] if X.ndim == 2 else 0, X.nbytes / 1e6, time.perf_counter() - t0)
+        return cls(ids, X, last_seq=last_seq, version=version, logged=logged, fingerprint=fingerprint, block_rows=block_rows)
+
+    @property
+    def count(self) -> int:
+        return int(self.snapshot[0].size)
+
+    @property
+    def dims(self) -> int:
+        return int(self.snapshot[1].shape[1]) if self.count else 0
+
+    def reload(self, conn: sqlite3.Connection, store: VectorStore | None = None, *, reason: str) -> None:
+        fresh = ExactSearchIndex.load(conn, store, block_rows=self.block_rows)
+        self.snapshot, self.last_seq, self.version, self.logged, self.fingerprint = fresh.snapshot, fresh.last_seq, fresh.version, fresh.logged, fresh.fingerprint
+        log.info("[EXACT] full reload (%s)", reason)
+
+    def apply(self, chunk_ids: np.ndarray, new_ids: np.ndarray, new_vectors: np.ndarray) -> None:
+        ids, X = self.snapshot
+        keep = ~np.isin(ids, chunk_ids)
+        if new_ids.size and self.count and new_vectors.shape[1] != X.shape[1]:
+            raise RuntimeError(f"[EXACT] embedding dims changed {X.shape[1]} -> {new_vectors.shape[1]}")
+        merged_ids = np.concatenate([ids[keep], new_ids])
+        merged_X = np.vstack([X[keep], new_vectors]) if new_ids.size else X[keep]
+        order = np.argsort(merged_ids, kind="stable")
+        self.snapshot = (merged_ids[order], np.ascontiguousarray(merged_X[order]))
+
+    def refresh(self, conn: sqlite3.Connection, store: VectorStore | None = None) -> bool:
+        """Bring the matrix up to date with SQLite; returns True when anything changed."""
+        with self.lock:
+            version = read_vector_version(conn)
+            if version is not None and version == self.version:
+                return False
+            consumers = dirty_log_consumers(conn)
+            try:
+                hi = dirty_log_high_water(conn)
+            except sqlite3.OperationalError:
+                hi = 0
+
+            if not (consumers and self.logged):
+                if version is None:
+                    fingerprint = active_fingerprint(conn)
+                    if fingerprint == self.fingerprint:
+                        return False
+                reason = "no dirty log consumer" if not consumers else "dirty log consumer registered after load"
+                self.reload(conn, store, reason=f"{reason}; vectors changed")
+                return True
+
+            if hi <= self.last_seq:
+                self.version = version
+                return False
+            logged = int(conn.execute("SELECT COUNT(*) FROM vector_dirty_log WHERE seq > ? AND seq <= ?", (self.last_seq, hi)).fetchone()[0])
+            if logged < hi - self.last_seq:
+                self.reload(conn, store, reason=f"dirty log pruned past seq={self.last_seq}")
+                return True
+
+            dirty = np.fromiter((r[0] for r in conn.execute("SELECT DISTINCT chunk_id FROM vector_dirty_log WHERE seq > ? AND seq <= ?", (self.last_seq, hi))), dtype=np.int64)
+            new_ids, new_vectors = fetch_active_rows(conn, dirty)
+            try:
+                self.apply(dirty, new_ids, new_vectors)
+            except RuntimeError as e:
+                self.reload(conn, store, reason=str(e))
+                return True
+            self.last_seq = hi
+            self.version = version
+            log.info("[EXACT] applied dirty_chunks=%d live=%d seq=%d", dirty.size, self.count, hi)
+            return True
+
+    def search(self, query_vecs: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+        """Exact top-k chunk_ids and cosine scores for a batch of (normalized) query vectors."""
+        ids, X = self.snapshot
+        return exact_top_k(X, query_vecs, k, ids=ids, block_rows=self.block_rows)
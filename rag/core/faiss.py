@@ -3,14 +3,21 @@ from __future__ import annotations
 import json, time, logging, shutil, os
 import faiss
 
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing as mp
+
 from pathlib import Path
 import numpy as np
 
 from core.paths import resolve_db_path, resolve_faiss_dir
-from core.db import read_only_connect
+from core.db import read_only_connect, connect
+from core.vector_store import dirty_log_high_water, open_synced_vector_store, register_consumer, prune_dirty_log, vector_store_is_current
+from utils.codec import decode_vectors
 
 log = logging.getLogger(__name__)
 
+DIRTY_LOG_CONSUMER = "faiss"
+
 def atomic_promote(build_dir: Path, current_dir: Path):
     old = current_dir.with_name(current_dir.name + ".old")
     if old.exists():
@@ -20,55 +27,148 @@ def atomic_promote(build_dir: Path, current_dir: Path):
         current_dir.rename(old)
     build_dir.rename(current_dir)
 
-def build_faiss_from_sqlite(cfg: dict, *, batch: int = 5000, add_batch: int = 2000, log_every: int = 20000, threads: int | None = None, overwrite: bool = False) -> Path:
-    db_path = resolve_db_path(cfg)
-    faiss_root = resolve_faiss_dir(cfg)
-    current_dir = faiss_root / "current"
-    
-    if current_dir.exists() and not overwrite:
-        raise RuntimeError(f"[FAISS] {current_dir} exists; pass overwrite=True to rebuild")
-    
-    build_dir = faiss_root / f"tmp_build_{int(time.time())}"
-    build_dir.mkdir(parents=True, exist_ok=True)
+def iter_sqlite_batches(cur, d: int, batch: int):
+    last_id = 0
+    while True:
+        cur.execute("""
+            SELECT e.chunk_id AS chunk_id, e.dims AS dims, e.vector AS vector
+            FROM embeddings e
+            JOIN chunks c ON c.chunk_id = e.chunk_id
+            WHERE c.is_active=1 AND e.chunk_id > ?
+            ORDER BY e.chunk_id
+            LIMIT ?
+        """, (last_id, batch))
+        rows = cur.fetchall()
+        if not rows:
+            return
 
-    index_path = build_dir / "index.faiss"
-    ids_path = build_dir / "ids.npy"
-    meta_path = build_dir / "meta.json"
+        batch_ids: list[int] = []
+        blobs: list[bytes] = []
 
-    log.info("[FAISS] Building from db=%s into %s", db_path, build_dir)
+        for r in rows:
+            cid = int(r["chunk_id"])
+            dims = int(r["dims"])
+            blob = r["vector"]
 
-    conn = read_only_connect(str(db_path))
-    cur = conn.cursor()
+            if dims != d:
+                raise RuntimeError(f"[FAISS] dims mismatch chunk_id={cid}: {dims} != {d}")
 
-    cur.execute("""
-        SELECT e.dims AS dims
-        FROM embeddings e
-        JOIN chunks c ON c.chunk_id = e.chunk_id
-        WHERE c.is_active=1 LIMIT 1
-    """)
-    row = cur.fetchone()
-    if row is None:
-        raise RuntimeError("[FAISS] no active embeddings found (nothing to build)")
-    
-    d = int(row["dims"])
-    log.info("[FAISS] dims=%d", d)
-    
-    faiss_cfg = cfg.get("faiss", {}) or {}
-    index_mode = str(faiss_cfg.get("index_mode", "flat_ip")).strip().lower()
-    metric_name = str(faiss_cfg.get("metric", "cosine")).strip().lower()
+            batch_ids.append(cid)
+            blobs.append(blob)
+
+        try:
+            X = decode_vectors(blobs, d)
+        except ValueError as e:
+            raise RuntimeError(f"[FAISS] vector size mismatch in chunk_ids {batch_ids[0]}..{batch_ids[-1]}: {e}") from e
+
+        last_id = batch_ids[-1]
+        yield batch_ids, np.array(X, dtype=np.float32)
+
+def fetch_active_vectors(conn, chunk_ids: np.ndarray, d: int, store=None) -> tuple[np.ndarray, np.ndarray]:
+    if store is not None and vector_store_is_current(conn, store):
+        rows = store.find_rows(chunk_ids)
+        keep = rows >= 0
+        return chunk_ids[keep], np.array(store.vectors[rows[keep]], dtype=np.float32)
 
+    found_ids: list[np.ndarray] = []
+    found_vecs: list[np.ndarray] = []
+    for start in range(0, chunk_ids.size, 900):
+        part = [int(x) for x in chunk_ids[start:start + 900]]
+        placeholders = ",".join("?" for _ in part)
+        rows = conn.execute(f"""
+            SELECT e.chunk_id, e.dims, e.vector
+            FROM embeddings e
+            JOIN chunks c ON c.chunk_id = e.chunk_id
+            WHERE c.is_active=1 AND e.chunk_id IN ({placeholders})
+        """, part).fetchall()
+        if not rows:
+            continue
+        for r in rows:
+            if int(r[1]) != d:
+                raise RuntimeError(f"[FAISS] dims mismatch chunk_id={int(r[0])}: {int(r[1])} != {d}")
+        found_ids.append(np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows)))
+        found_vecs.append(decode_vectors([r[2] for r in rows], d))
+    if not found_ids:
+        return np.empty(0, dtype=np.int64), np.empty((0, d), dtype=np.float32)
+    return np.concatenate(found_ids), np.array(np.vstack(found_vecs), dtype=np.float32)
+
+def faiss_metric(faiss_cfg: dict) -> tuple[int, bool]:
+    metric_name = str(faiss_cfg.get("metric", "cosine")).strip().lower()
     if metric_name == "cosine":
-        metric_type = faiss.METRIC_INNER_PRODUCT
-        normalize = True
-    elif metric_name == "ip":
-        metric_type = faiss.METRIC_INNER_PRODUCT
-        normalize = False
-    elif metric_name == "l2":
-        metric_type = faiss.METRIC_L2
-        normalize = False
-    else:
-        raise RuntimeError(f"[FAISS] unsupported metric={metric_name}")
-    
+        return faiss.METRIC_INNER_PRODUCT, True
+    if metric_name == "ip":
+        return faiss.METRIC_INNER_PRODUCT, False
+    if metric_name == "l2":
+        return faiss.METRIC_L2, False
+    raise RuntimeError(f"[FAISS] unsupported metric={metric_name}")
+
+SQ_TYPES = {
+    "sq8": faiss.ScalarQuantizer.QT_8bit,
+    "sq6": faiss.ScalarQuantizer.QT_6bit,
+    "sq4": faiss.ScalarQuantizer.QT_4bit,
+    "sqfp16": faiss.ScalarQuantizer.QT_fp16,
+    "fp16": faiss.ScalarQuantizer.QT_fp16,
+}
+
+# Families that store codes instead of the vectors, so reconstruct() is approximate.
+COMPRESSED_FAMILIES = {"ivf_sq", "ivf_pq", "opq_ivf_pq", "hnsw_sq"}
+BUILD_PARAMS = ("nlist", "hnsw_m", "sq_type", "pq_m", "pq_nbits")
+SEARCH_PARAMS = ("nprobe", "hnsw_ef_search")
+
+def index_family(faiss_cfg: dict) -> tuple[str, str]:
+    index_mode = str(faiss_cfg.get("index_mode", "flat_ip")).strip().lower()
+    sq_type = str(faiss_cfg.get("sq_type") or "sq8").strip().lower()
+    if index_mode.startswith("ivf_sq") and index_mode != "ivf_sq":
+        return "ivf_sq", index_mode[len("ivf_"):]
+    if index_mode.startswith("hnsw_sq") and index_mode != "hnsw_sq":
+        return "hnsw_sq", index_mode[len("hnsw_"):]
+    return index_mode, sq_type
+
+def index_params(faiss_cfg: dict) -> dict:
+    family, sq_type = index_family(faiss_cfg)
+    params = {
+        "nlist": int(faiss_cfg.get("nlist", 256)),
+        "nprobe": int(faiss_cfg.get("nprobe", 16)),
+        "hnsw_m": int(faiss_cfg.get("hnsw_m", 32)),
+        "hnsw_ef_search": int(faiss_cfg.get("hnsw_ef_search", 64)),
+        "sq_type": sq_type,
+        "pq_m": int(faiss_cfg.get("pq_m", 64)),
+        "pq_nbits": int(faiss_cfg.get("pq_nbits", 8)),
+    }
+    keep = {"nprobe", "nlist"} if family.startswith("ivf") or family == "opq_ivf_pq" else set()
+    if family.startswith("hnsw"):
+        keep |= {"hnsw_m", "hnsw_ef_search"}
+    if family.endswith("_sq"):
+        keep.add("sq_type")
+    if family.endswith("_pq"):
+        keep |= {"pq_m", "pq_nbits"}
+    return {k: v for k, v in params.items() if k in keep}
+
+def tuned_faiss_cfg(cfg: dict, meta: dict | None) -> dict:
+    faiss_cfg = dict(cfg.get("faiss", {}) or {})
+    tuned = (meta or {}).get("autotune") or {}
+    if tuned and tuned.get("index_mode") == str(faiss_cfg.get("index_mode", "flat_ip")).strip().lower():
+        faiss_cfg.update(tuned.get("params", {}))
+    return faiss_cfg
+
+def tuned_search_params(meta: dict) -> dict:
+    tuned = meta.get("autotune") or {}
+    if tuned.get("index_mode") != meta.get("faiss_index"):
+        return {}
+    return {k: v for k, v in (tuned.get("params") or {}).items() if k in SEARCH_PARAMS}
+
+def make_faiss_index(faiss_cfg: dict, d: int):
+    index_mode, sq_type = index_family(faiss_cfg)
+    metric_type, _ = faiss_metric(faiss_cfg)
+
+    if sq_type not in SQ_TYPES:
+        raise RuntimeError(f"[FAISS] unsupported sq_type={sq_type}")
+
+    def ivf_quantizer():
+        if metric_type ==  faiss.METRIC_INNER_PRODUCT:
+            return faiss.IndexFlatIP(d)
+        return faiss.IndexFlatL2(d)
+
     if index_mode == "flat_ip":
         if metric_type == faiss.METRIC_INNER_PRODUCT:
             index = faiss.IndexFlatIP(d)
@@ -76,21 +176,59 @@ def build_faiss_from_sqlite(cfg: dict, *, batch: int = 5000, add_batch: int = 20
             index = faiss.IndexFlatL2(d)
     elif index_mode == "flat_l2":
         index = faiss.IndexFlatL2(d)
-    elif index_mode == "hnsw":
+    elif index_mode in ("hnsw", "hnsw_sq"):
         hnsw_m = int(faiss_cfg.get("hnsw_m", 32))
-        index = faiss.IndexHNSWFlat(d, hnsw_m, metric_type)
+        if index_mode == "hnsw":
+            index = faiss.IndexHNSWFlat(d, hnsw_m, metric_type)
+        else:
+            index = faiss.IndexHNSWSQ(d, SQ_TYPES[sq_type], hnsw_m, metric_type)
         index.hnsw.efConstruction = int(faiss_cfg.get("hnsw_ef_construction", 200))
         index.hnsw.efSearch = int(faiss_cfg.get("hnsw_ef_search", 64))
-    elif index_mode == "ivf_flat":
+    elif index_mode in ("ivf_flat", "ivf_sq", "ivf_pq", "opq_ivf_pq"):
         nlist = int(faiss_cfg.get("nlist", 256))
-        if metric_type ==  faiss.METRIC_INNER_PRODUCT:
-            quantizer = faiss.IndexFlatIP(d)
+        pq_m = int(faiss_cfg.get("pq_m", 64))
+        pq_nbits = int(faiss_cfg.get("pq_nbits", 8))
+        if index_mode.endswith("_pq") and d % pq_m:
+            raise RuntimeError(f"[FAISS] pq_m={pq_m} must divide dims={d}")
+
+        if index_mode == "ivf_flat":
+            index = faiss.IndexIVFFlat(ivf_quantizer(), d, nlist, metric_type)
+        elif index_mode == "ivf_sq":
+            index = faiss.IndexIVFScalarQuantizer(ivf_quantizer(), d, nlist, SQ_TYPES[sq_type], metric_type)
         else:
-            quantizer = faiss.IndexFlatL2(d)
-        index = faiss.IndexIVFFlat(quantizer, d, nlist, metric_type)
+            index = faiss.IndexIVFPQ(ivf_quantizer(), d, nlist, pq_m, pq_nbits, metric_type)
+            if index_mode == "opq_ivf_pq":
+                index = faiss.IndexPreTransform(faiss.OPQMatrix(d, pq_m), index)
     else:
         raise RuntimeError(f"[FAISS] unsupported index_mode={index_mode}")
 
+    # Labels are chunk_ids so incremental updates can add and remove by id.
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.set_direct_map_type(faiss.DirectMap.Hashtable)
+        return index
+    return faiss.IndexIDMap2(index)
+
+def training_size(faiss_cfg: dict) -> tuple[int, int]:
+    index_mode, _ = index_family(faiss_cfg)
+    nlist = int(faiss_cfg.get("nlist", 256))
+    minimum = 1
+    if index_mode.startswith("ivf") or index_mode == "opq_ivf_pq":
+        minimum = nlist
+    if index_mode.endswith("_pq"):
+        minimum = max(minimum, 1 << int(faiss_cfg.get("pq_nbits", 8)))
+    return max(10000, nlist * 40) if minimum > 1 else 10000, minimum
+
+def apply_search_params(index, params: dict) -> None:
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None and params.get("nprobe"):
+        ivf.nprobe = int(params["nprobe"])
+    if params.get("hnsw_ef_search"):
+        inner = faiss.downcast_index(index.index) if isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)) else index
+        if hasattr(inner, "hnsw"):
+            inner.hnsw.efSearch = int(params["hnsw_ef_search"])
+
+def set_faiss_threads(threads: int | None) -> None:
     max_threads = faiss.omp_get_max_threads()
     
     if threads is None:
@@ -105,127 +243,399 @@ def build_faiss_from_sqlite(cfg: dict, *, batch: int = 5000, add_batch: int = 20
     except Exception:
         log.warning("[FAISS] Could not set OMP threads")
 
+def ivf_list_imbalance(index) -> float | None:
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is None:
+        return None
+    sizes = np.fromiter((ivf.invlists.list_size(i) for i in range(ivf.nlist)), dtype=np.int64, count=ivf.nlist)
+    return float(sizes.max() / max(sizes.mean(), 1e-9))
+
+def ivf_drift_reason(index, meta: dict, faiss_cfg: dict) -> str | None:
+    imbalance = ivf_list_imbalance(index)
+    if imbalance is None:
+        return None
+    churn = int(meta.get("churn_since_train", 0))
+    trained_on = max(int(meta.get("trained_count", 0) or meta.get("count", 0)), 1)
+    retrain_drift = float(faiss_cfg.get("retrain_drift", 0.3))
+    if churn / trained_on > retrain_drift:
+        return f"churn {churn}/{trained_on} > {retrain_drift:.2f}"
+    baseline = float(meta.get("list_imbalance") or imbalance)
+    growth = float(faiss_cfg.get("retrain_imbalance_growth", 1.5))
+    if imbalance > baseline * growth:
+        return f"list imbalance {imbalance:.2f} > {baseline:.2f}x{growth:.2f}"
+    return None
+
+def self_test(index, ids: np.ndarray, d: int) -> None:
+    if index.ntotal > 0:
+        pick = int(ids[min(123, index.ntotal - 1)])
+        q = np.zeros((1, d), dtype=np.float32)
+        index.reconstruct(pick, q[0])
+        D, I = index.search(q, 5)
+        log.info("[FAISS] self-test pick=%d top=%d score=%.4f", pick, int(I[0,0]), float(D[0,0]))
+
+def faiss_meta(cfg: dict, db_path: Path, index, ids: np.ndarray, d: int, **extra) -> dict:
+    faiss_cfg = cfg.get("faiss", {}) or {}
+    meta = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "dims": d,
+        "count": int(index.ntotal),
+        "metric": "cosine",
+        "faiss_index": str(faiss_cfg.get("index_mode", "flat_ip")).strip().lower(),
+        "normalized": True,
+        "db_path": str(db_path),
+        "embedding_backend": cfg.get("runtime", {}).get("embedding_provider", "unknown"),
+        "embedding_model": (cfg.get("ollama", {}).get("embedding_model") if cfg.get("runtime", {}).get("embedding_provider") == "ollama" else cfg.get("llamacpp", {}).get("embedding_model", "unknown")),
+        "id_map": True,
+    }
+    meta.update(extra)
+    return meta
+
+def write_generation(faiss_root: Path, index, ids: np.ndarray, meta: dict) -> Path:
+    current_dir = faiss_root / "current"
+    build_dir = faiss_root / f"tmp_build_{int(time.time() * 1000)}"
+    build_dir.mkdir(parents=True, exist_ok=True)
+
+    index_path = build_dir / "index.faiss"
+    ids_path = build_dir / "ids.npy"
+    meta_path = build_dir / "meta.json"
+
+    faiss.write_index(index, str(index_path))
+    log.info("[FAISS] Index written at %s", str(index_path))
+    np.save(str(ids_path), np.asarray(ids, dtype=np.int64))
+    log.info("[FAISS] Index ids written at %s", str(ids_path))
+    meta_path.write_text(json.dumps(meta, indent=2), encoding="utf-8")
+    log.info("[FAISS] JSON written at %s", str(meta_path))
+
+    atomic_promote(build_dir, current_dir)
+    log.info("[FAISS] promoted generation=%s -> %s", meta.get("generation"), current_dir)
+    return current_dir
+
+def build_faiss_from_sqlite(cfg: dict, *, batch: int = 5000, add_batch: int = 2000, log_every: int = 20000, threads: int | None = None, overwrite: bool = False) -> Path:
+    db_path = resolve_db_path(cfg)
+    faiss_root = resolve_faiss_dir(cfg)
+    current_dir = faiss_root / "current"
+    
+    if current_dir.exists() and not overwrite:
+        raise RuntimeError(f"[FAISS] {current_dir} exists; pass overwrite=True to rebuild")
+
+
+    log.info("[FAISS] Building from db=%s into %s", db_path, faiss_root)
+
+    # Register before the snapshot is read so every later change lands in the dirty log. An existing
+    # position is left alone until the new generation is written, so a failed build loses no log rows.
+    wconn = connect(str(db_path))
+    try:
+        dirty_log_seq = dirty_log_high_water(wconn)
+        if wconn.execute("SELECT 1 FROM vector_log_consumers WHERE name=?", (DIRTY_LOG_CONSUMER,)).fetchone() is None:
+            register_consumer(wconn, DIRTY_LOG_CONSUMER, dirty_log_seq)
+    finally:
+        wconn.close()
+
+    conn = read_only_connect(str(db_path))
+    cur = conn.cursor()
+
+    cur.execute("""
+        SELECT e.dims AS dims
+        FROM embeddings e
+        JOIN chunks c ON c.chunk_id = e.chunk_id
+        WHERE c.is_active=1 LIMIT 1
+    """)
+    row = cur.fetchone()
+    if row is None:
+        raise RuntimeError("[FAISS] no active embeddings found (nothing to build)")
+    
+    d = int(row["dims"])
+    log.info("[FAISS] dims=%d", d)
+    
+    previous = json.loads((current_dir / "meta.json").read_text(encoding="utf-8")) if (current_dir / "meta.json").exists() else None
+    faiss_cfg = tuned_faiss_cfg(cfg, previous)
+    _, normalize = faiss_metric(faiss_cfg)
+    index = make_faiss_index(faiss_cfg, d)
+    train_target, train_minimum = training_size(faiss_cfg)
+    set_faiss_threads(threads)
+
     ids: list[int] = []
     total = 0
     t0 = time.time()
-    offset = 0
 
     train_vecs: list[np.ndarray] = []
     train_ids: list[list[int]] = []
-    trained = not isinstance(index, faiss.IndexIVF)
+    trained = bool(index.is_trained)
 
-    while True:
-        cur.execute("""
-            SELECT e.chunk_id AS chunk_id, e.dims AS dims, e.vector AS vector
-            FROM embeddings e
-            JOIN chunks c ON c.chunk_id = e.chunk_id
-            WHERE c.is_active=1
-            ORDER BY e.chunk_id
-            LIMIT ? OFFSET ?
-        """, (batch, offset))
-        rows = cur.fetchall()
-        if not rows:
-            break
+    def add_chunk(X: np.ndarray, batch_ids: list[int]) -> None:
+        nonlocal total
+        n = X.shape[0]
+        start = 0
+        while start < n:
+            end = min(start + add_batch, n)
+            index.add_with_ids(X[start:end], np.asarray(batch_ids[start:end], dtype=np.int64))
+            ids.extend(batch_ids[start:end])
+            total += (end - start)
+            start = end
 
-        batch_ids: list[int] = []
-        vecs: list[np.ndarray] = []
+    def train_and_flush() -> None:
+        nonlocal trained
+        Xtrain = np.vstack(train_vecs)
+        log.info("[FAISS] training %s index on %d vectors", faiss_cfg.get("index_mode"), Xtrain.shape[0])
+        index.train(Xtrain)
+        trained = True
 
-        for r in rows:
-            cid = int(r["chunk_id"])
-            dims = int(r["dims"])
-            blob = r["vector"]
+        for buffered_X, buffered_ids in zip(train_vecs, train_ids):
+            add_chunk(buffered_X, buffered_ids)
 
-            if dims != d:
-                raise RuntimeError(f"[FAISS] dims mismatch chunk_id={cid}: {dims} != {d}")
-            
-            v = np.frombuffer(blob, dtype=np.float32)
-            if v.size != d:
-                raise RuntimeError(f"[FAISS] vector size mismatch chunk_id={cid}: {v.size} != {d}")
+        train_vecs.clear()
+        train_ids.clear()
 
-            batch_ids.append(cid)
-            vecs.append(v)
-        
-        X = np.stack(vecs, axis=0).astype(np.float32, copy=False)
+    store = open_synced_vector_store(cfg)
+    if store is not None:
+        if store.dims != d:
+            raise RuntimeError(f"[FAISS] vector store dims {store.dims} != sqlite dims {d}")
+        log.info("[FAISS] reading %d vectors from vector store %s", store.count, store.current)
+        batches = ((batch_ids.tolist(), np.array(vecs, dtype=np.float32)) for batch_ids, vecs, _ in store.iter_active(batch))
+    else:
+        batches = iter_sqlite_batches(cur, d, batch)
+
+    for batch_ids, X in batches:
         if normalize:
             faiss.normalize_L2(X)
 
-        if isinstance(index, faiss.IndexIVF) and not trained:
+        if not trained:
             train_vecs.append(X)
             train_ids.append(batch_ids)
-            total_train = sum(arr.shape[0] for arr in train_vecs)
-            nlist = int(faiss_cfg.get("nlist", 256))
-
-            if total_train >= max(10000, nlist * 40):
-                Xtrain = np.vstack(train_vecs)
-                log.info("[FAISS] training IVF index on %d vectors", Xtrain.shape[0])
-                index.train(Xtrain)
-                trained = True
-
-                for buffered_X, buffered_ids in zip(train_vecs, train_ids):
-                    bn = buffered_X.shape[0]
-                    start = 0
-                    while start < bn:
-                        end = min(start + add_batch, bn)
-                        index.add(buffered_X[start:end])
-                        ids.extend(buffered_ids[start:end])
-                        total += (end - start)
-                        start = end
-
-                train_vecs.clear()
-                train_ids.clear()
-                offset += len(rows)
-                continue
-
-            offset += len(rows)
+            if sum(arr.shape[0] for arr in train_vecs) >= train_target:
+                train_and_flush()
             continue
 
-        n = X.shape[0]
-        start = 0
-        while start < n:
-            end = min(start + add_batch, n)
-            index.add(X[start:end])
-            ids.extend(batch_ids[start:end])
-            total += (end - start)
-            start = end
-
-        offset += len(rows)
+        add_chunk(X, batch_ids)
 
         if total and total % log_every == 0:
             dt = time.time() - t0
             rate = total / max(dt, 1e-9)
             log.info("[FAISS] indexed=%d rate=%.0f vec/s", total, rate)
     
+    if store is not None:
+        store.close()
+    conn.close()
 
-    if isinstance(index, faiss.IndexIVF):
-        if not trained:
-            raise RuntimeError("[FAISS] IVF index never got enough training vectors")
-        index.nprobe = int(faiss_cfg.get("nprobe", 16))
-    
-    faiss.write_index(index, str(index_path))
-    log.info("[FAISS] Index written at %s", str(index_path))
-    np.save(str(ids_path), np.asarray(ids, dtype=np.int64))
-    log.info("[FAISS] Index ids written at %s", str(ids_path))
+    if not trained:
+        buffered = sum(arr.shape[0] for arr in train_vecs)
+        if buffered < train_minimum:
+            raise RuntimeError(f"[FAISS] {faiss_cfg.get('index_mode')} index never got enough training vectors ({buffered} < {train_minimum})")
+        log.warning("[FAISS] only %d vectors to train on (wanted %d)", buffered, train_target)
+        train_and_flush()
+    apply_search_params(index, index_params(faiss_cfg))
 
-    meta = {
-        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
-        "dims": d,
-        "count": int(index.ntotal),
-        "metric": "cosine",
-        "faiss_index": index_mode,
-        "normalized": True,
-        "db_path": str(db_path),
-        "embedding_backend": cfg.get("runtime", {}).get("embedding_provider", "unknown"),
-        "embedding_model": (cfg.get("ollama", {}).get("embedding_model") if cfg.get("runtime", {}).get("embedding_provider") == "ollama" else cfg.get("llamacpp", {}).get("embedding_model", "unknown")),
+    ids_arr = np.asarray(ids, dtype=np.int64)
+    meta = faiss_meta(
+        cfg, db_path, index, ids_arr, d,
+        generation=int((previous or {}).get("generation", 0)) + 1,
+        dirty_log_seq=dirty_log_seq,
+        trained_count=int(index.ntotal),
+        churn_since_train=0,
+        list_imbalance=ivf_list_imbalance(index),
+        compressed=index_family(faiss_cfg)[0] in COMPRESSED_FAMILIES,
+        params=index_params(faiss_cfg),
+    )
+    if previous and previous.get("autotune"):
+        meta["autotune"] = previous["autotune"]
+    self_test(index, ids_arr, d)
+    out = write_generation(faiss_root, index, ids_arr, meta)
+    wconn = connect(str(db_path))
+    try:
+        register_consumer(wconn, DIRTY_LOG_CONSUMER, dirty_log_seq)
+        prune_dirty_log(wconn)
+    finally:
+        wconn.close()
+    return out
+
+def update_faiss_from_sqlite(cfg: dict, *, batch: int = 5000, threads: int | None = None) -> Path:
+    db_path = resolve_db_path(cfg)
+    faiss_root = resolve_faiss_dir(cfg)
+    current_dir = faiss_root / "current"
+    meta_path = current_dir / "meta.json"
+    index_mode = str((cfg.get("faiss", {}) or {}).get("index_mode", "flat_ip")).strip().lower()
+
+    def rebuild(reason: str) -> Path:
+        log.info("[FAISS] full rebuild: %s", reason)
+        return build_faiss_from_sqlite(cfg, batch=batch, threads=threads, overwrite=True)
+
+    if not meta_path.exists():
+        return rebuild("no current index")
+    meta = json.loads(meta_path.read_text(encoding="utf-8"))
+    if not meta.get("id_map"):
+        return rebuild("current index has positional ids")
+    if meta.get("faiss_index") != index_mode:
+        return rebuild(f"index_mode changed {meta.get('faiss_index')} -> {index_mode}")
+    faiss_cfg = tuned_faiss_cfg(cfg, meta)
+    wanted = {k: v for k, v in index_params(faiss_cfg).items() if k in BUILD_PARAMS}
+    built = {k: v for k, v in (meta.get("params") or {}).items() if k in BUILD_PARAMS}
+    if wanted != built:
+        return rebuild(f"build params changed {built} -> {wanted}")
+
+    conn = connect(str(db_path))
+    try:
+        registered = conn.execute("SELECT last_seq FROM vector_log_consumers WHERE name=?", (DIRTY_LOG_CONSUMER,)).fetchone()
+        if registered is None:
+            return rebuild("faiss is not registered on the dirty log")
+
+        lo = int(meta.get("dirty_log_seq", 0))
+        hi = dirty_log_high_water(conn)
+        if hi <= lo:
+            log.info("[FAISS] up to date at seq=%d", lo)
+            return current_dir
+        logged = int(conn.execute("SELECT COUNT(*) FROM vector_dirty_log WHERE seq > ? AND seq <= ?", (lo, hi)).fetchone()[0])
+        if logged < hi - lo:
+            return rebuild(f"dirty log has gaps after seq={lo} ({logged}/{hi - lo} rows)")
+        if index_family(faiss_cfg)[0].startswith("hnsw"):
+            return rebuild("hnsw graphs cannot remove vectors")
+
+        dirty = np.fromiter(
+            (r[0] for r in conn.execute("SELECT DISTINCT chunk_id FROM vector_dirty_log WHERE seq > ? AND seq <= ? ORDER BY chunk_id", (lo, hi))),
+            dtype=np.int64,
+        )
+        d = int(meta["dims"])
+        log.info("[FAISS] applying %d dirty chunks from seq %d..%d", dirty.size, lo + 1, hi)
+
+        store = open_synced_vector_store(cfg)
+        try:
+            add_ids, X = fetch_active_vectors(conn, dirty, d, store)
+        finally:
+            if store is not None:
+                store.close()
+
+        set_faiss_threads(threads)
+        index = faiss.read_index(str(current_dir / "index.faiss"))
+        ids = np.load(str(current_dir / "ids.npy"))
+
+        present = np.isin(dirty, ids)
+        try:
+            removed = int(index.remove_ids(np.ascontiguousarray(dirty[present]))) if present.any() else 0
+        except RuntimeError as e:
+            return rebuild(f"{index_mode} does not support remove_ids ({e})")
+
+        _, normalize = faiss_metric(faiss_cfg)
+        if normalize and X.shape[0]:
+            faiss.normalize_L2(X)
+        if X.shape[0]:
+            index.add_with_ids(X, add_ids)
+
+        ids = np.concatenate([ids[~np.isin(ids, dirty)], add_ids])
+        churn = int(meta.get("churn_since_train", 0)) + removed + int(add_ids.size)
+        meta.update(
+            created_at=time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            count=int(index.ntotal),
+            generation=int(meta.get("generation", 0)) + 1,
+            dirty_log_seq=hi,
+            churn_since_train=churn,
+        )
+
+        reason = ivf_drift_reason(index, meta, faiss_cfg)
+        if reason is not None:
+            return rebuild(f"IVF drift ({reason})")
+
+        log.info("[FAISS] removed=%d added=%d total=%d", removed, int(add_ids.size), int(index.ntotal))
+        self_test(index, ids, d)
+        out = write_generation(faiss_root, index, ids, meta)
+        register_consumer(conn, DIRTY_LOG_CONSUMER, hi)
+        prune_dirty_log(conn)
+        return out
+    finally:
+        conn.close()
+
+def faiss_load_mode(cfg: dict) -> str:
+    mode = str((cfg.get("faiss", {}) or {}).get("load_mode", "memory")).strip().lower()
+    return "mmap" if mode in ("mmap", "mmap_ro", "shared") else "memory"
+
+def read_faiss_bundle(current_dir: Path, *, load_mode: str = "memory"):
+    index_path = current_dir / "index.faiss"
+    ids_path = current_dir / "ids.npy"
+    if load_mode != "mmap":
+        return faiss.read_index(str(index_path)), np.load(str(ids_path))
+
+    # MMAP_IFC maps flat codes and HNSW storage too; older builds only map IVF lists.
+    flags = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+    try:
+        index = faiss.read_index(str(index_path), flags)
+    except RuntimeError as e:
+        log.warning("[FAISS] %s cannot be memory-mapped (%s); loading into RAM", index_path, e)
+        index = faiss.read_index(str(index_path))
+    return index, np.load(str(ids_path), mmap_mode="r")
+
+def process_memory_mb() -> dict:
+    try:
+        status = Path("/proc/self/status").read_text(encoding="utf-8")
+    except OSError:
+        return {}
+    out = {}
+    for line in status.splitlines():
+        key, _, value = line.partition(":")
+        if key in ("VmRSS", "RssAnon", "RssFile"):
+            out[key] = int(value.split()[0]) / 1024
+    return out
+
+def load_probe(current_dir: str, load_mode: str, queries: int) -> dict:
+    set_faiss_threads(1)
+    before = process_memory_mb()
+    t0 = time.perf_counter()
+    index, ids = read_faiss_bundle(Path(current_dir), load_mode=load_mode)
+    load_s = time.perf_counter() - t0
+    loaded = process_memory_mb()
+
+    rng = np.random.default_rng(os.getpid())
+    Q = rng.standard_normal((max(1, queries), index.d)).astype(np.float32)
+    faiss.normalize_L2(Q)
+    t0 = time.perf_counter()
+    index.search(Q[:1], 10)
+    first_search_s = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    for i in range(1, Q.shape[0]):
+        index.search(Q[i:i + 1], 10)
+    search_s = (time.perf_counter() - t0) / max(Q.shape[0] - 1, 1)
+    after = process_memory_mb()
+
+    return {
+        "pid": os.getpid(),
+        "load_ms": load_s * 1000,
+        "first_search_ms": first_search_s * 1000,
+        "search_ms": search_s * 1000,
+        "index_type": type(index).__name__,
+        "ids_mapped": isinstance(ids, np.memmap),
+        "private_mb_loaded": loaded.get("RssAnon", 0.0) - before.get("RssAnon", 0.0),
+        "private_mb": after.get("RssAnon", 0.0) - before.get("RssAnon", 0.0),
+        "shared_mb": after.get("RssFile", 0.0) - before.get("RssFile", 0.0),
+        "rss_mb": after.get("VmRSS", 0.0),
     }
-    meta_path.write_text(json.dumps(meta, indent=2), encoding="utf-8")
-    log.info("[FAISS] JSON written at %s", str(meta_path))
-    if index.ntotal > 0:
-        pick = min(123, index.ntotal - 1)
-        q = np.zeros((1, d), dtype=np.float32)
-        index.reconstruct(pick, q[0])
-        D, I = index.search(q, 5)
-        log.info("[FAISS] self-test pick=%d top=%d score=%.4f", pick, int(I[0,0]), float(D[0,0]))
 
-    atomic_promote(build_dir, current_dir)
-    log.info("[FAISS] promoted -> %s", current_dir)
-    return current_dir
\ No newline at end of file
+def benchmark_faiss_load(cfg: dict, *, workers: int = 4, queries: int = 50, modes: tuple[str, ...] = ("memory", "mmap")) -> dict:
+    """Start ``workers`` fresh processes per load mode at once and report what each one paid to load and search the current index.
+
+    ``private_mb`` is anonymous memory the process owns; ``shared_mb`` is
+    file-backed page cache, mapped once and shared by every worker.
+    """
+    current_dir = resolve_faiss_dir(cfg) / "current"
+    if not (current_dir / "index.faiss").exists():
+        raise RuntimeError(f"[FAISS] no index under {current_dir}; run FAISS migrate first")
+    meta = json.loads((current_dir / "meta.json").read_text(encoding="utf-8"))
+    ctx = mp.get_context("spawn")
+    report = {"faiss_index": meta.get("faiss_index"), "count": meta.get("count"), "index_mb": (current_dir / "index.faiss").stat().st_size / 1e6, "modes": {}}
+
+    for mode in modes:
+        pools = [ProcessPoolExecutor(max_workers=1, mp_context=ctx) for _ in range(workers)]
+        try:
+            futures = [pool.submit(load_probe, str(current_dir), mode, queries) for pool in pools]
+            rows = [f.result() for f in futures]
+        finally:
+            for pool in pools:
+                pool.shutdown()
+
+        summary = {
+            key: float(np.median([row[key] for row in rows]))
+            for key in ("load_ms", "first_search_ms", "search_ms", "private_mb", "shared_mb", "rss_mb")
+        }
+        report["modes"][mode] = {"workers": rows, "median": summary}
+        log.info(
+            "[FAISS_LOAD] %s %s n=%s workers=%d load=%.1fms first_search=%.2fms search=%.3fms private=%.1fMB shared=%.1fMB rss=%.1fMB (per process, median)",
+            mode, meta.get("faiss_index"), meta.get("count"), workers,
+            summary["load_ms"], summary["first_search_ms"], summary["search_ms"], summary["private_mb"], summary["shared_mb"], summary["rss_mb"],
+        )
+    return report
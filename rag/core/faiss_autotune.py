@@ -0,0 +1,215 @@
+from __future__ import annotations
+
+import json, time, logging
+import faiss
+
+from pathlib import Path
+import numpy as np
+
+from core.db import read_only_connect
+from core.embed import embed
+from core.exact_search import exact_top_k
+from core.faiss import BUILD_PARAMS, apply_search_params, faiss_metric, fetch_active_vectors, index_family, index_params, make_faiss_index, set_faiss_threads, training_size
+from core.paths import resolve_db_path, resolve_faiss_dir
+from core.vector_store import open_synced_vector_store
+from utils.codec import decode_vector
+
+log = logging.getLogger(__name__)
+
+def load_query_texts(path: Path, limit: int, rng: np.random.Generator) -> list[str]:
+    texts: list[str] = []
+    with path.open("r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            row = json.loads(line)
+            text = str(row.get("query") or row.get("question") or "").strip()
+            if text:
+                texts.append(text)
+    texts = sorted(set(texts))
+    if len(texts) > limit:
+        texts = [texts[i] for i in sorted(rng.choice(len(texts), size=limit, replace=False))]
+    return texts
+
+def embed_queries(cfg: dict, texts: list[str], d: int, *, backend: str | None = None, batch: int = 32) -> np.ndarray:
+    out: list[np.ndarray] = []
+    for start in range(0, len(texts), batch):
+        for blob, dims in embed(cfg, texts[start:start + batch], backend=backend, mode="query"):
+            if int(dims) != d:
+                raise RuntimeError(f"[FAISS_TUNE] query dims {dims} != index dims {d}")
+            out.append(decode_vector(blob, d))
+    return np.vstack(out).astype(np.float32)
+
+def candidate_grid(faiss_cfg: dict, tune_cfg: dict, n_full: int) -> list[dict]:
+    family, _ = index_family(faiss_cfg)
+    base = index_params(faiss_cfg)
+    if family.startswith("ivf") or family == "opq_ivf_pq":
+        nlists = [int(x) for x in tune_cfg.get("nlist", [base["nlist"]]) if int(x) * 39 <= n_full]
+        return [{**base, "nlist": nlist, "nprobe": nprobe} for nlist in nlists for nprobe in tune_cfg.get("nprobe", [base["nprobe"]]) if int(nprobe) <= nlist]
+    if family.startswith("hnsw"):
+        return [{**base, "hnsw_m": int(m), "hnsw_ef_search": int(ef)} for m in tune_cfg.get("hnsw_m", [base["hnsw_m"]]) for ef in tune_cfg.get("ef_search", [base["hnsw_ef_search"]])]
+    return [base]
+
+def measure(index, Q: np.ndarray, truth: np.ndarray, k: int) -> dict:
+    latencies = np.empty(Q.shape[0], dtype=np.float64)
+    found = np.empty((Q.shape[0], k), dtype=np.int64)
+    for i in range(Q.shape[0]):
+        t0 = time.perf_counter()
+        _, I = index.search(Q[i:i + 1], k)
+        latencies[i] = time.perf_counter() - t0
+        found[i] = I[0]
+    hits = sum(np.intersect1d(a, b).size for a, b in zip(truth, found))
+    return {
+        "recall_at_k": hits / max(truth.size, 1),
+        "p50_ms": float(np.percentile(latencies, 50) * 1000),
+        "p95_ms": float(np.percentile(latencies, 95) * 1000),
+    }
+
+def autotune_faiss(cfg: dict, *, backend: str | None = None, threads: int | None = None, write: bool = True) -> dict:
+    """Pick FAISS build and search parameters for the configured ``index_mode``.
+
+    Every candidate in ``faiss.autotune`` is built over a sample of the active
+    embeddings and scored by recall@k against exact flat search on real query
+    embeddings, plus per-query latency and serialized index size. The fastest
+    candidate reaching ``target_recall`` is written to ``meta.json`` under
+    ``autotune``; builds and the retriever read it from there.
+    """
+    faiss_cfg = cfg.get("faiss", {}) or {}
+    tune_cfg = faiss_cfg.get("autotune", {}) or {}
+    k = int(tune_cfg.get("k", 10))
+    target_recall = float(tune_cfg.get("target_recall", 0.95))
+    rng = np.random.default_rng(int(tune_cfg.get("seed", 1337)))
+    index_mode = str(faiss_cfg.get("index_mode", "flat_ip")).strip().lower()
+    _, normalize = faiss_metric(faiss_cfg)
+    set_faiss_threads(threads)
+
+    db_path = resolve_db_path(cfg)
+    conn = read_only_connect(str(db_path))
+    store = open_synced_vector_store(cfg)
+    try:
+        all_ids = np.fromiter((r[0] for r in conn.execute("""
+            SELECT e.chunk_id
+            FROM embeddings e
+            JOIN chunks c ON c.chunk_id = e.chunk_id
+            WHERE c.is_active=1
+            ORDER BY e.chunk_id
+        """)), dtype=np.int64)
+        if all_ids.size <= k:
+            raise RuntimeError("[FAISS_TUNE] not enough active embeddings to tune")
+        d = int(conn.execute("SELECT dims FROM embeddings WHERE chunk_id=?", (int(all_ids[0]),)).fetchone()[0])
+
+        max_vectors = int(tune_cfg.get("max_vectors", 200000))
+        sample_ids = all_ids
+        if 0 < max_vectors < all_ids.size:
+            sample_ids = np.sort(rng.choice(all_ids, size=max_vectors, replace=False))
+        sample_ids, X = fetch_active_vectors(conn, sample_ids, d, store)
+
+        queries = int(tune_cfg.get("queries", 200))
+        queries_path = Path(str(tune_cfg.get("queries_path") or (cfg.get("lambdamart", {}) or {}).get("training_pairs", "")))
+        Q = None
+        query_source = "chunks"
+        if queries_path.is_file():
+            try:
+                texts = load_query_texts(queries_path, queries, rng)
+                if texts:
+                    Q = embed_queries(cfg, texts, d, backend=backend)
+                    query_source = str(queries_path)
+            except Exception as e:
+                log.warning("[FAISS_TUNE] could not embed queries from %s (%s: %s); using stored chunk vectors", queries_path, type(e).__name__, e)
+        else:
+            log.warning("[FAISS_TUNE] query file %s not found; using stored chunk vectors", queries_path)
+        if Q is None:
+            pool = np.setdiff1d(all_ids, sample_ids, assume_unique=True)
+            if pool.size == 0:
+                pool = sample_ids
+            query_ids = np.sort(rng.choice(pool, size=min(queries, pool.size), replace=False))
+            _, Q = fetch_active_vectors(conn, query_ids, d, store)
+    finally:
+        if store is not None:
+            store.close()
+        conn.close()
+
+    if normalize:
+        faiss.normalize_L2(X)
+        faiss.normalize_L2(Q)
+
+    n_full = int(all_ids.size)
+    n = int(X.shape[0])
+    scale = n / n_full
+    log.info("[FAISS_TUNE] index_mode=%s vectors=%d/%d queries=%d (%s) k=%d", index_mode, n, n_full, Q.shape[0], query_source, k)
+
+    labels = np.arange(n, dtype=np.int64)
+    if faiss_metric(faiss_cfg)[0] == faiss.METRIC_INNER_PRODUCT:
+        truth, _ = exact_top_k(X, Q, k)
+        exact_bytes = X.nbytes
+    else:
+        exact = make_faiss_index({**faiss_cfg, "index_mode": "flat_l2"}, d)
+        exact.add_with_ids(X, labels)
+        _, truth = exact.search(Q, k)
+        exact_bytes = faiss.serialize_index(exact).nbytes
+        del exact
+
+    results: list[dict] = []
+    built: dict[tuple, tuple] = {}
+    for params in candidate_grid(faiss_cfg, tune_cfg, n_full):
+        # nlist is tuned at full scale; the sample gets the same vectors-per-list ratio.
+        build_key = tuple(params.get(key) for key in BUILD_PARAMS)
+        if build_key not in built:
+            built.clear()
+            sample_cfg = {**faiss_cfg, **params}
+            if "nlist" in params:
+                sample_cfg["nlist"] = max(1, int(round(params["nlist"] * scale)))
+            index = make_faiss_index(sample_cfg, d)
+            t0 = time.perf_counter()
+            if not index.is_trained:
+                train_target, _ = training_size(sample_cfg)
+                index.train(X[rng.permutation(n)[:train_target]] if n > train_target else X)
+            index.add_with_ids(X, labels)
+            built[build_key] = (index, time.perf_counter() - t0, faiss.serialize_index(index).nbytes)
+        index, build_s, nbytes = built[build_key]
+
+        apply_search_params(index, params)
+        row = {"params": params, **measure(index, Q, truth, k), "build_s": build_s, "bytes": int(nbytes), "bytes_per_vector": nbytes / n, "memory_ratio": nbytes / exact_bytes}
+        log.info("[FAISS_TUNE] %s recall@%d=%.4f p50=%.3fms p95=%.3fms size=%.1f MB (%.2fx flat)", params, k, row["recall_at_k"], row["p50_ms"], row["p95_ms"], nbytes / 1e6, row["memory_ratio"])
+        results.append(row)
+    built.clear()
+
+    if not results:
+        raise RuntimeError(f"[FAISS_TUNE] no candidates fit {n_full} vectors; lower faiss.autotune.nlist")
+
+    passing = [row for row in results if row["recall_at_k"] >= target_recall]
+    if passing:
+        best = min(passing, key=lambda row: (row["p50_ms"], row["bytes"]))
+    else:
+        best = max(results, key=lambda row: (row["recall_at_k"], -row["p50_ms"]))
+        log.warning("[FAISS_TUNE] no candidate reached recall@%d >= %.3f; taking the most accurate", k, target_recall)
+
+    report = {
+        "tuned_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "index_mode": index_mode,
+        "params": best["params"],
+        "k": k,
+        "target_recall": target_recall,
+        "recall_at_k": best["recall_at_k"],
+        "p50_ms": best["p50_ms"],
+        "bytes_per_vector": best["bytes_per_vector"],
+        "vectors": n_full,
+        "sampled_vectors": n,
+        "query_source": query_source,
+        "queries": int(Q.shape[0]),
+        "candidates": results,
+    }
+    log.info("[FAISS_TUNE] chose %s recall@%d=%.4f p50=%.3fms", best["params"], k, best["recall_at_k"], best["p50_ms"])
+
+    meta_path = resolve_faiss_dir(cfg) / "current" / "meta.json"
+    if write and meta_path.exists():
+        meta = json.loads(meta_path.read_text(encoding="utf-8"))
+        meta["autotune"] = report
+        tmp = meta_path.with_name(meta_path.name + ".tmp")
+        tmp.write_text(json.dumps(meta, indent=2), encoding="utf-8")
+        tmp.replace(meta_path)
+        log.info("[FAISS_TUNE] wrote parameters to %s; build params apply on the next FAISS migrate", meta_path)
+    elif write:
+        log.warning("[FAISS_TUNE] %s does not exist; run FAISS migrate first to keep the tuned parameters", meta_path)
+    return report
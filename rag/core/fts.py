@@ -41,6 +41,18 @@ def mark_fts_dirty_docs(conn: sqlite3.Connection, doc_id: int, reason: str = "ch
     """, (int(doc_id), reason))
     log.info("[FTS5] Marked dirty FTS5 docs with reasons %s", reason)
 
+def mark_fts_dirty_docs_many(conn: sqlite3.Connection, marks: list[tuple[int, str]]) -> None:
+    if not marks:
+        return
+    conn.executemany("""
+    INSERT INTO fts_dirty_docs(doc_id, reason, marked_at)
+    VALUES (?, ?, CURRENT_TIMESTAMP) ON CONFLICT(doc_id) DO
+    UPDATE SET 
+    reason=excluded.reason,
+    marked_at=CURRENT_TIMESTAMP
+    """, [(int(doc_id), reason) for doc_id, reason in marks])
+    log.info("[FTS5] Marked dirty FTS5 docs count=%d", len(marks))
+
 def mark_all_active_docs_dirty(conn: sqlite3.Connection, reason:str = "initial") -> int:
     cur = conn.cursor()
     cur.execute("""
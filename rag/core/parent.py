@@ -19,6 +19,22 @@ def mark_parent_dirty_doc(conn: sqlite3.Connection, doc_id: int, reason: str = "
     )
 
 
+def mark_parent_dirty_docs_many(conn: sqlite3.Connection, doc_ids: list[int], reason: str = "chunks_changed") -> None:
+    if not doc_ids:
+        return
+    log.info("[PARENT] Marking dirty parent docs count=%d", len(doc_ids))
+    conn.executemany(
+        """
+        INSERT INTO parent_dirty_docs(doc_id, reason, marked_at)
+        VALUES (?, ?, CURRENT_TIMESTAMP)
+        ON CONFLICT(doc_id) DO UPDATE SET
+            reason=excluded.reason,
+            marked_at=CURRENT_TIMESTAMP
+        """,
+        [(int(doc_id), reason) for doc_id in doc_ids],
+    )
+
+
 def mark_all_active_docs_parent_dirty(conn: sqlite3.Connection, reason: str = "initial_parent_build") -> int:
     cur = conn.cursor()
     cur.execute("""
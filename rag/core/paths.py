@@ -99,4 +99,39 @@ def resolve_cache_folder(cfg: dict) -> str | None:
         path = resolve_storage_root(cfg) / path
 
     path.mkdir(parents=True, exist_ok=True)
-    return str(path.resolve())
\ No newline at end of file
+    return str(path.resolve())
+
+def resolve_embedding_cache_path(cfg: dict) -> Path:
+    root = resolve_storage_root(cfg)
+    cache_cfg = cfg.get("embedding_cache", {}) or {}
+    raw_path = expand_path(Path(str(cache_cfg.get("path", "data/cache/embedding_cache.sqlite"))))
+    path = (raw_path if raw_path.is_absolute() else (root / raw_path).resolve())
+    path.parent.mkdir(parents=True, exist_ok=True)
+    log.info("[EMBED_CACHE] path resolved at %s", path)
+    return path
+
+def resolve_html_fixtures_dir(cfg: dict) -> Path:
+    root = resolve_storage_root(cfg)
+    html_cfg = cfg.get("html_extraction", {}) or {}
+    raw_path = expand_path(Path(str(html_cfg.get("fixtures_dir", "data/fixtures/html"))))
+    path = (raw_path if raw_path.is_absolute() else (root / raw_path).resolve())
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+def resolve_telemetry_path(cfg: dict) -> Path:
+    root = resolve_storage_root(cfg)
+    telemetry_cfg = cfg.get("telemetry", {}) or {}
+    fmt = str(telemetry_cfg.get("format", "jsonl")).lower()
+    default = "data/telemetry/ingest.prom" if fmt in ("prometheus", "prom", "textfile") else "data/telemetry/ingest.jsonl"
+    raw_path = expand_path(Path(str(telemetry_cfg.get("path") or default)))
+    path = (raw_path if raw_path.is_absolute() else (root / raw_path).resolve())
+    path.parent.mkdir(parents=True, exist_ok=True)
+    return path
+
+def resolve_vector_store_dir(cfg: dict) -> Path:
+    root = resolve_storage_root(cfg)
+    vs_cfg = cfg.get("vector_store", {}) or {}
+    raw_path = expand_path(Path(str(vs_cfg.get("path", "data/vectors"))))
+    path = (raw_path if raw_path.is_absolute() else (root / raw_path).resolve())
+    path.mkdir(parents=True, exist_ok=True)
+    return path
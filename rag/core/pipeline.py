@@ -1,18 +1,22 @@
 import logging
 import re
 import sqlite3
+import time
+from dataclasses import dataclass, field
 from datetime import datetime, timezone
+from functools import lru_cache
 from typing import Any
 from collections.abc import Callable
 
 from utils.hashing import sha256_text
-from utils.textproc import normalize, chunk_text
-from utils.codec import zstd_compress_text
+from utils.textproc import normalize, chunk_document_text
+from utils.codec import zstd_compress_text, convert_vector_blob
 from utils.clean_fandom import clean_fandom_text
 from utils.versioning import extract_version_signal
-from core.parent import mark_parent_dirty_doc
-from core.splade import mark_splade_dirty_doc
-from core.fts import mark_fts_dirty_docs
+from core.parent import mark_parent_dirty_docs_many
+from core.splade import mark_splade_dirty_docs_many
+from core.fts import mark_fts_dirty_docs_many
+from core.compression import resolve_embedding_dtype
 
 EmbedFn = Callable[[str], tuple[bytes, int]]
 
@@ -35,19 +39,73 @@ def defang_tables(s: str) -> str:
         s = s.replace("{{", " ").replace("}}", " ")
     return s
 
-def process_document(conn: sqlite3.Connection, embed_fn: EmbedFn, config: dict[str, Any], source: str, url: str, title: str, raw_text: str, *, tier: str = "primary", weight: float =1.0, do_embed: bool=True, last_modified: str | None = None, etag: str | None =None) -> list[tuple[int, str]]:
-    raw_text = str(raw_text or "").strip()
-
-    if not raw_text:
-        log.warning("[PIPELINE] Refusing empty documents: source: %s, url: %s", source, url)
-        return []
-
-    if (source == "game8" and len(raw_text) < 800):
-        log.warning("[GAME8] Refusing undersized document url: %s chars: %d", url, len(raw_text))
-        return []
-    
-    cur = conn.cursor()
-    source_cfg = next(
+@dataclass(frozen=True)
+class PreparedChunk:
+    chunk_index: int
+    text: str
+    text_zst: bytes
+    chunk_hash: str
+
+@dataclass(frozen=True)
+class PreparedDocument:
+    source: str
+    url: str
+    title: str
+    tier: str
+    weight: float
+    raw_hash: str
+    norm_hash: str
+    version_label: str | None
+    version_ord: int | None
+    last_modified: str | None
+    etag: str | None
+    raw_zst: bytes | None
+    raw_len: int | None
+    raw_zst_len: int | None
+    chunks: tuple[PreparedChunk, ...]
+    chunks_total: int
+    force_rebuild: bool = False
+    chunking_mode: str = "fixed"
+    unchanged: bool = False
+
+@dataclass
+class WriteOutcome:
+    url: str
+    title: str
+    status: str
+    doc_id: int | None = None
+    rows: list[tuple[int, str]] = field(default_factory=list)
+    chunks_written: int = 0
+    embeddings_reused: int = 0
+    fts_marks: list[tuple[int, str]] = field(default_factory=list)
+
+@dataclass
+class DocumentBatchReport:
+    outcomes: list[WriteOutcome]
+    seconds: float
+    lock_wait_s: float = 0.0
+
+    def count(self, status: str) -> int:
+        return sum(1 for outcome in self.outcomes if outcome.status == status)
+
+    @property
+    def chunks_written(self) -> int:
+        return sum(outcome.chunks_written for outcome in self.outcomes)
+
+    @property
+    def embeddings_reused(self) -> int:
+        return sum(outcome.embeddings_reused for outcome in self.outcomes)
+
+    @property
+    def docs_per_s(self) -> float:
+        return len(self.outcomes) / max(self.seconds, 1e-9)
+
+    @property
+    def chunks_per_s(self) -> float:
+        return self.chunks_written / max(self.seconds, 1e-9)
+
+def source_config(config: dict[str, Any], source: str) -> dict[str, Any]:
+    return next(
         (
             item
             for item in config.get("sources", [])
@@ -55,339 +113,548 @@ def process_document(conn: sqlite3.Connection, embed_fn: EmbedFn, config: dict[s
         ),
         {},
     )
-    force_rebuild = bool(source_cfg.get("force_rebuild", False))
-    try:
-        cur.execute("BEGIN IMMEDIATE")
-        raw_hash = sha256_text(raw_text)
-        version_label, version_ord = extract_version_signal(title, raw_text, config, source=source)
-        doc_changed = False
-        cur.execute("SELECT doc_id, raw_hash FROM docs WHERE url=?", (url,))
-        row = cur.fetchone()
-        if row is None and source in MOVED_URL_SOURCE:
-            cur.execute(
-                "SELECT doc_id, url, raw_hash FROM docs WHERE source=? AND raw_hash=? ORDER BY doc_id DESC LIMIT 1",
-                (source, raw_hash))
-            moved = cur.fetchone()
-            if moved:
-                doc_id_existing, old_url, old_hash_raw = moved
-                log.info("[INFO] URL moved detected: %s -> %s", old_url, url)
-                cur.execute("DELETE FROM docs WHERE url=? AND doc_id<>?", (url, doc_id_existing))
-                log.info("[INFO] DELETED DUPLICATE RECORDS url=%s and keep_doc_id=%s", url, doc_id_existing)
-                cur.execute(
-                    """
-                    UPDATE docs
-                    SET url=?,
-                        title=?,
-                        fetched_at=?,
-                        tier=?,
-                        weight=?,
-                        last_modified=?,
-                        etag=?,
-                        version_label=?,
-                        version_ord=?
-                    WHERE doc_id=?
-                    """,
-                    (url, title, datetime.now(timezone.utc).isoformat(), tier, weight, last_modified, etag, version_label, version_ord, doc_id_existing),
-                )
-                mark_fts_dirty_docs(conn, doc_id_existing, reason="url_moved_metadata")
-                row = (doc_id_existing, old_hash_raw)
-        if row:
-            doc_id_existing, old_raw_hash = row
-            if (old_raw_hash == raw_hash and not force_rebuild):
-                cur.execute("SELECT COUNT(*) FROM chunks WHERE doc_id=? AND is_active=1", (doc_id_existing,))
-                active_chunks = int(cur.fetchone()[0] or 0)
-                if active_chunks > 0:
-                    cur.execute(
-                        """
-                        SELECT COUNT(*)
-                        FROM chunks c
-                        LEFT JOIN embeddings e ON e.chunk_id = c.chunk_id
-                        WHERE c.doc_id=? AND c.is_active=1 AND e.chunk_id IS NULL
-                        """,
-                        (doc_id_existing,),
-                    )
-                    missing_emb = int(cur.fetchone()[0] or 0)
-                    if missing_emb == 0:
-                        cur.execute(
-                            """
-                            UPDATE docs
-                            SET title=?, fetched_at=?, tier=?, weight=?, last_modified=?, etag=?, version_label=?, version_ord=?
-                            WHERE doc_id=?
-                            """,
-                            (title, datetime.now(timezone.utc).isoformat(), tier, weight, last_modified, etag, version_label, version_ord, doc_id_existing))
-                        mark_fts_dirty_docs(conn, doc_id_existing, reason="metadata_refresh")
-                        conn.commit()
-                        log.info("SKIP %s (doc+chunks+embeddings already complete)", url)
-                        return []
-                    log.warning("Embeddings missing for %d chunks, embedding-only pass for %s", missing_emb, url)
-
-                    MAX_EMBED_CHARS = int(config.get("pipeline", {}).get("max_embed_chars", 1800))
-                    MIN_EMBED_CHARS = int(config.get("pipeline", {}).get("min_embed_chars", 800))
-                    cur.execute(
-                        """
-                        SELECT c.chunk_id, c.text
-                        FROM chunks c
-                        LEFT JOIN embeddings e ON e.chunk_id = c.chunk_id
-                        WHERE c.doc_id=? AND c.is_active=1 AND e.chunk_id IS NULL
-                        ORDER BY c.chunk_index
-                        """,
-                        (doc_id_existing,),
-                    )
-                    rows = cur.fetchall()
-                    if not do_embed:
-                        conn.commit()
-                        return rows
-                    for cid, txt in rows:
-                        safe_txt = txt[:MAX_EMBED_CHARS] if len(txt) > MAX_EMBED_CHARS else txt
-                        safe_txt = defang_tables(safe_txt)
-                        vec = dims = None
-                        last_err = None
-                        for attempt in range(6):
-                            try:
-                                vec, dims = embed_fn(safe_txt, title=title)
-                                break
-                            except Exception as e:
-                                last_err = e
-                                log.exception("Embed retry %d/6 chunk_id=%s", attempt + 1, cid)
-                                if len(safe_txt) <= MIN_EMBED_CHARS:
-                                    break
-                                safe_txt = safe_txt[: max(MIN_EMBED_CHARS, len(safe_txt) // 4)]
-
-                        if vec is None or dims is None:
-                            log.warning("embed failed chunk_id=%s final_len=%d err=%s", cid, len(safe_txt), last_err)
-                            continue
-                        cur.execute(
-                            "INSERT OR REPLACE INTO embeddings(chunk_id, dims, vector) VALUES(?, ?, ?)",
-                            (cid, dims, vec),
-                        )
-                    conn.commit()
-                    return []
-                log.warning("REBUILD %s (unchanged raw, but no active chunks)", url)
-                doc_changed = True
-            elif(old_raw_hash == raw_hash and force_rebuild):
-                log.warning("[REBUILD] forced source=%s url=%s", source, url)
-                doc_changed = True
-            else:
-                log.warning("[WARN] REBUILD %s (content changed)", url)
-                doc_changed = True
-        log.info("Processing document title=%s url=%s", title, url)
-
-        cleaned = raw_text
-        if source in ("genshin_wiki", "fandom_api", "wiki"):
-            cleaned = clean_fandom_text(raw_text)
-
-        norm = normalize(cleaned)
-        norm_hash = sha256_text(norm)
-
-        if source == "game8":
-            cur.execute(
-                """
-                SELECT
-                    doc_id,
-                    url,
-                    title
-                FROM docs
-                WHERE source = 'game8'
-                AND norm_hash = ?
-                AND url <> ?
-                AND status = 1
-                LIMIT 1
-                """,
-                (norm_hash, url,),)
-
-            duplicate = cur.fetchone()
-            if duplicate is not None:
-                duplicate_doc_id = int(duplicate[0])
-                duplicate_url = str(duplicate[1])
-                duplicate_title = str(duplicate[2] or "")
-                log.warning("[GAME8] Rejecting duplicate body " "url=%s duplicate_doc_id=%d " "duplicate_url=%s " "duplicate_title=%r", url, duplicate_doc_id, duplicate_url, duplicate_title,)
-                conn.rollback()
-                return []
-            
-        chunks = chunk_text(norm, config["pipeline"]["chunk_size"], config["pipeline"]["chunk_overlap"])
-
-        global_filter_cfg = config.get("filters", {}) or {}
-        global_deny_pattern = (global_filter_cfg.get("chunk_deny_text_regex") or global_filter_cfg.get("deny_text_regex"))
-
-        source_cfg = next(
-            (
-                source_cfg
-                for source_cfg in config.get("sources", [])
-                if source_cfg.get("name") == source
-            ),
-            {},
-        )
-        source_deny_pattern = (source_cfg.get("chunk_deny_text_regex") or source_cfg.get("deny_text_regex"))
-        deny_patterns = [pattern for pattern in (global_deny_pattern, source_deny_pattern) if pattern]
-
-        deny_text_re = (
-            re.compile(
-                "|".join(
-                    f"(?:{pattern})"
-                    for pattern in deny_patterns
-                ),
-                re.IGNORECASE,
-            )
-            if deny_patterns
-            else None
-        )
 
-        original_chunk_count = len(chunks)
-        filtered_chunks: list[tuple[int, str]] = []
-
-        for original_index, chunk in enumerate(chunks):
-            chunk_value = str(chunk or "").strip()
-
-            if not chunk_value:
-                continue
-
-            if (deny_text_re is not None and deny_text_re.search(chunk_value)):
-                log.debug("[CHUNK_FILTER] rejected source=%s url=%s chunk_index=%d preview=%r", source, url, original_index, chunk_value[:160],)
-                continue
+@lru_cache(maxsize=64)
+def compile_deny_text_re(patterns: tuple[str, ...]) -> re.Pattern | None:
+    if not patterns:
+        return None
+    return re.compile(
+        "|".join(
+            f"(?:{pattern})"
+            for pattern in patterns
+        ),
+        re.IGNORECASE,
+    )
 
-            filtered_chunks.append((original_index, chunk_value))
+def deny_text_re_for_source(config: dict[str, Any], source: str) -> re.Pattern | None:
+    global_filter_cfg = config.get("filters", {}) or {}
+    global_deny_pattern = (global_filter_cfg.get("chunk_deny_text_regex") or global_filter_cfg.get("deny_text_regex"))
+    source_cfg = source_config(config, source)
+    source_deny_pattern = (source_cfg.get("chunk_deny_text_regex") or source_cfg.get("deny_text_regex"))
+    return compile_deny_text_re(tuple(pattern for pattern in (global_deny_pattern, source_deny_pattern) if pattern))
 
-        chunks = filtered_chunks
+def prepare_document(config: dict[str, Any], source: str, url: str, title: str, raw_text: str, *, tier: str = "primary", weight: float = 1.0, last_modified: str | None = None, etag: str | None = None) -> PreparedDocument | None:
+    raw_text = str(raw_text or "").strip()
 
-        log.info("[CHUNK_FILTER] source=%s total=%d accepted=%d rejected=%d", source, original_chunk_count, len(chunks), original_chunk_count - len(chunks),)
+    if not raw_text:
+        log.warning("[PIPELINE] Refusing empty documents: source: %s, url: %s", source, url)
+        return None
 
-        archive_raw = bool(config.get("pipeline", {}).get("archive_raw", False))
-        raw_zst = raw_len = raw_zst_len = None
-        if archive_raw:
-            raw_len = len(raw_text)
-            raw_zst = zstd_compress_text(raw_text)
-            raw_zst_len = len(raw_zst)
+    if (source == "game8" and len(raw_text) < 800):
+        log.warning("[GAME8] Refusing undersized document url: %s chars: %d", url, len(raw_text))
+        return None
+
+    force_rebuild = bool(source_config(config, source).get("force_rebuild", False))
+    raw_hash = sha256_text(raw_text)
+    version_label, version_ord = extract_version_signal(title, raw_text, config, source=source)
+
+    cleaned = raw_text
+    if source in ("genshin_wiki", "fandom_api", "wiki"):
+        cleaned = clean_fandom_text(raw_text)
+
+    norm = normalize(cleaned)
+    norm_hash = sha256_text(norm)
+
+    chunking_mode = str(config["pipeline"].get("chunking_mode", "fixed") or "fixed").lower()
+    chunks = chunk_document_text(norm, config["pipeline"]["chunk_size"], config["pipeline"]["chunk_overlap"], mode=chunking_mode)
+    deny_text_re = deny_text_re_for_source(config, source)
+
+    prepared_chunks: list[PreparedChunk] = []
+    for original_index, chunk in enumerate(chunks):
+        chunk_value = str(chunk or "").strip()
+
+        if not chunk_value:
+            continue
+
+        if (deny_text_re is not None and deny_text_re.search(chunk_value)):
+            log.debug("[CHUNK_FILTER] rejected source=%s url=%s chunk_index=%d preview=%r", source, url, original_index, chunk_value[:160],)
+            continue
+
+        prepared_chunks.append(PreparedChunk(chunk_index=original_index, text=chunk_value, text_zst=zstd_compress_text(chunk_value, kind="chunks"), chunk_hash=sha256_text(chunk_value)))
+
+    archive_raw = bool(config.get("pipeline", {}).get("archive_raw", False))
+    raw_zst = raw_len = raw_zst_len = None
+    if archive_raw:
+        raw_len = len(raw_text)
+        raw_zst = zstd_compress_text(raw_text, kind="docs")
+        raw_zst_len = len(raw_zst)
+
+    return PreparedDocument(
+        source=source,
+        url=url,
+        title=title,
+        tier=tier,
+        weight=weight,
+        raw_hash=raw_hash,
+        norm_hash=norm_hash,
+        version_label=version_label,
+        version_ord=version_ord,
+        last_modified=last_modified,
+        etag=etag,
+        raw_zst=raw_zst,
+        raw_len=raw_len,
+        raw_zst_len=raw_zst_len,
+        chunks=tuple(prepared_chunks),
+        chunks_total=len(chunks),
+        force_rebuild=force_rebuild,
+        chunking_mode=chunking_mode,
+    )
 
-        if not chunks:
-            log.warning("[PIPELINE] No usable chunks producedm preserving previous document source=%s title=%s url=%s", source, title, url,)
-            conn.rollback()
-            return []
+def prepare_unchanged_document(config: dict[str, Any], source: str, url: str, title: str, raw_text: str, *, raw_hash: str, tier: str = "primary", weight: float = 1.0, last_modified: str | None = None, etag: str | None = None) -> PreparedDocument:
+    """Metadata-only document for a URL whose raw text is already stored and fully embedded.
+
+    Cleaning, chunking, compression and the norm hash are skipped; the writer
+    only refreshes the docs row from the title, validators and version signal.
+    """
+    version_label, version_ord = extract_version_signal(title, raw_text, config, source=source)
+    return PreparedDocument(
+        source=source,
+        url=url,
+        title=title,
+        tier=tier,
+        weight=weight,
+        raw_hash=raw_hash,
+        norm_hash="",
+        version_label=version_label,
+        version_ord=version_ord,
+        last_modified=last_modified,
+        etag=etag,
+        raw_zst=None,
+        raw_len=None,
+        raw_zst_len=None,
+        chunks=(),
+        chunks_total=0,
+        unchanged=True,
+    )
 
+def load_reusable_embeddings(cur: sqlite3.Cursor, doc_id: int) -> dict[str, tuple[int, int, bytes]]:
+    cur.execute(
+        """
+        SELECT c.chunk_id, c.chunk_hash, c.is_active, e.dims, e.vector
+        FROM chunks c
+        JOIN embeddings e ON e.chunk_id = c.chunk_id
+        WHERE c.doc_id=? AND c.chunk_hash IS NOT NULL
+        ORDER BY c.is_active ASC, c.chunk_id ASC
+        """,
+        (doc_id,),
+    )
+    return {str(chash): (int(cid), int(dims), vec) for cid, chash, _, dims, vec in cur.fetchall()}
+
+def upsert_chunks_by_hash(cur: sqlite3.Cursor, doc_id: int, chunks: tuple[PreparedChunk, ...]) -> int:
+    cur.execute("SELECT chunk_id, chunk_hash FROM chunks WHERE doc_id=? ORDER BY is_active DESC, chunk_id DESC", (doc_id,))
+    by_hash: dict[str, list[int]] = {}
+    replaced: list[int] = []
+    for cid, chash in cur.fetchall():
+        if chash is None:
+            replaced.append(int(cid))
+        else:
+            by_hash.setdefault(str(chash), []).append(int(cid))
+
+    kept: list[tuple[int, int]] = []
+    inserted: list[tuple] = []
+    for c in chunks:
+        ids = by_hash.get(c.chunk_hash)
+        if ids:
+            kept.append((c.chunk_index, ids.pop(0)))
+        else:
+            inserted.append((doc_id, c.chunk_index, c.text, c.text_zst, len(c.text), len(c.text_zst), c.chunk_hash))
+    replaced.extend(cid for ids in by_hash.values() for cid in ids)
+
+    # Rows no new chunk matched are gone for good; drop them with their vectors so rewrites do not accumulate rows.
+    cur.executemany("DELETE FROM embeddings WHERE chunk_id=?", [(cid,) for cid in replaced])
+    cur.executemany("DELETE FROM chunks WHERE chunk_id=?", [(cid,) for cid in replaced])
+    # Kept rows can trade positions, so clear them before assigning the new ones (UNIQUE allows many NULLs).
+    cur.executemany("UPDATE chunks SET chunk_index=NULL WHERE chunk_id=?", [(cid,) for _, cid in kept])
+    cur.executemany("UPDATE chunks SET chunk_index=?, is_active=1 WHERE chunk_id=?", kept)
+    cur.executemany(
+        """
+        INSERT INTO chunks(doc_id, chunk_index, text, text_zst, text_len, text_zst_len, chunk_hash, is_active)
+        VALUES (?, ?, ?, ?, ?, ?, ?, 1)
+        """,
+        inserted,
+    )
+    return len(kept)
+
+def apply_prepared_document(cur: sqlite3.Cursor, doc: PreparedDocument, *, reuse_embeddings: bool = False, reuse_requires_title: bool = False) -> WriteOutcome:
+    source, url, title = doc.source, doc.url, doc.title
+    fetched_at = datetime.now(timezone.utc).isoformat()
+    outcome = WriteOutcome(url=url, title=title, status="written")
+    doc_changed = False
+    reusable: dict[str, tuple[int, int, bytes]] = {}
+    cur.execute("SELECT doc_id, raw_hash, title FROM docs WHERE url=?", (url,))
+    row = cur.fetchone()
+    old_title = None if row is None else row[2]
+    row = None if row is None else (row[0], row[1])
+    if row is None and source in MOVED_URL_SOURCE:
         cur.execute(
-            """
-            INSERT INTO docs(source, url, title, fetched_at, raw_hash, norm_hash, tier, weight, last_modified, etag, version_label, version_ord, raw_zst, raw_len, raw_zst_len)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ON CONFLICT(url) DO UPDATE SET
-                title=excluded.title,
-                fetched_at=excluded.fetched_at,
-                raw_hash=excluded.raw_hash,
-                norm_hash=excluded.norm_hash,
-                tier=excluded.tier,
-                weight=excluded.weight,
-                last_modified=excluded.last_modified,
-                etag=excluded.etag,
-                version_label=excluded.version_label,
-                version_ord=excluded.version_ord,
-                raw_zst=excluded.raw_zst,
-                raw_len=excluded.raw_len,
-                raw_zst_len=excluded.raw_zst_len,
-                status=1
-            """,
-            (
-                source,
-                url,
-                title,
-                datetime.now(timezone.utc).isoformat(),
-                raw_hash,
-                norm_hash,
-                tier,
-                weight,
-                last_modified,
-                etag,
-                version_label,
-                version_ord,
-                raw_zst,
-                raw_len,
-                raw_zst_len,
-            ),
-        )
-        cur.execute("SELECT doc_id FROM docs WHERE url=?", (url,))
-        doc_id = cur.fetchone()[0]
-        cur.execute("UPDATE chunks SET is_active=0 WHERE doc_id=?", (doc_id,))
-        for i, c in chunks:
-            chash = sha256_text(c)
-            czst = zstd_compress_text(c)
-            clen = len(c)
-            czlen = len(czst)
+            "SELECT doc_id, url, raw_hash, title FROM docs WHERE source=? AND raw_hash=? ORDER BY doc_id DESC LIMIT 1",
+            (source, doc.raw_hash))
+        moved = cur.fetchone()
+        if moved:
+            doc_id_existing, old_url, old_hash_raw, old_title = moved
+            log.info("[INFO] URL moved detected: %s -> %s", old_url, url)
+            cur.execute("DELETE FROM docs WHERE url=? AND doc_id<>?", (url, doc_id_existing))
+            log.info("[INFO] DELETED DUPLICATE RECORDS url=%s and keep_doc_id=%s", url, doc_id_existing)
             cur.execute(
                 """
-                INSERT INTO chunks(doc_id, chunk_index, text, text_zst, text_len, text_zst_len, chunk_hash, is_active)
-                VALUES (?, ?, ?, ?, ?, ?, ?, 1)
-                ON CONFLICT(doc_id, chunk_index) DO UPDATE SET
-                    text=excluded.text,
-                    text_zst=excluded.text_zst,
-                    text_len=excluded.text_len,
-                    text_zst_len=excluded.text_zst_len,
-                    chunk_hash=excluded.chunk_hash,
-                    is_active=1
+                UPDATE docs
+                SET url=?,
+                    title=?,
+                    fetched_at=?,
+                    tier=?,
+                    weight=?,
+                    last_modified=?,
+                    etag=?,
+                    version_label=?,
+                    version_ord=?
+                WHERE doc_id=?
                 """,
-                (doc_id, i, c, czst, clen, czlen, chash),
+                (url, title, fetched_at, doc.tier, doc.weight, doc.last_modified, doc.etag, doc.version_label, doc.version_ord, doc_id_existing),
             )
-        mark_fts_dirty_docs(conn, doc_id, reason="chunks_changed")
-        mark_parent_dirty_doc(conn, doc_id, reason="chunks_changed")
-        mark_splade_dirty_doc(conn, doc_id, reason="chunks_changed")
-        if doc_changed:
-            cur.execute(
-                """
-                DELETE FROM embeddings
-                WHERE chunk_id IN (
-                    SELECT chunk_id
-                    FROM chunks
-                    WHERE doc_id=? AND is_active=1
+            outcome.fts_marks.append((doc_id_existing, "url_moved_metadata"))
+            row = (doc_id_existing, old_hash_raw)
+    if row:
+        doc_id_existing, old_raw_hash = row
+        if (old_raw_hash == doc.raw_hash and not doc.force_rebuild):
+            cur.execute("SELECT COUNT(*) FROM chunks WHERE doc_id=? AND is_active=1", (doc_id_existing,))
+            active_chunks = int(cur.fetchone()[0] or 0)
+            if active_chunks > 0:
+                cur.execute(
+                    """
+                    SELECT COUNT(*)
+                    FROM chunks c
+                    LEFT JOIN embeddings e ON e.chunk_id = c.chunk_id
+                    WHERE c.doc_id=? AND c.is_active=1 AND e.chunk_id IS NULL
+                    """,
+                    (doc_id_existing,),
                 )
-                """,
-                (doc_id,),
-            )
-            log.info("[INFO] Cleared stale embeddings for rebuilt doc_id=%s url=%s", doc_id, url)
-
+                missing_emb = int(cur.fetchone()[0] or 0)
+                outcome.doc_id = doc_id_existing
+                if missing_emb == 0:
+                    cur.execute(
+                        """
+                        UPDATE docs
+                        SET title=?, fetched_at=?, tier=?, weight=?, last_modified=?, etag=?, version_label=?, version_ord=?
+                        WHERE doc_id=?
+                        """,
+                        (title, fetched_at, doc.tier, doc.weight, doc.last_modified, doc.etag, doc.version_label, doc.version_ord, doc_id_existing))
+                    outcome.fts_marks.append((doc_id_existing, "metadata_refresh"))
+                    outcome.status = "skipped"
+                    log.info("SKIP %s (doc+chunks+embeddings already complete)", url)
+                    return outcome
+                log.warning("Embeddings missing for %d chunks, embedding-only pass for %s", missing_emb, url)
+                cur.execute(
+                    """
+                    SELECT c.chunk_id, c.text
+                    FROM chunks c
+                    LEFT JOIN embeddings e ON e.chunk_id = c.chunk_id
+                    WHERE c.doc_id=? AND c.is_active=1 AND e.chunk_id IS NULL
+                    ORDER BY c.chunk_index
+                    """,
+                    (doc_id_existing,),
+                )
+                outcome.rows = cur.fetchall()
+                outcome.status = "embed_only"
+                return outcome
+            log.warning("REBUILD %s (unchanged raw, but no active chunks)", url)
+            doc_changed = True
+        elif(old_raw_hash == doc.raw_hash and doc.force_rebuild):
+            log.warning("[REBUILD] forced source=%s url=%s", source, url)
+            doc_changed = True
+        else:
+            log.warning("[WARN] REBUILD %s (content changed)", url)
+            doc_changed = True
+        if reuse_embeddings and not doc.force_rebuild and not (reuse_requires_title and old_title != title):
+            reusable = load_reusable_embeddings(cur, doc_id_existing)
+    log.info("Processing document title=%s url=%s", title, url)
+
+    if source == "game8":
         cur.execute(
             """
-            SELECT c.chunk_id, c.text
-            FROM chunks c
-            LEFT JOIN embeddings e ON e.chunk_id = c.chunk_id
-            WHERE c.doc_id=? AND c.is_active=1 AND e.chunk_id IS NULL
-            ORDER BY c.chunk_index
+            SELECT
+                doc_id,
+                url,
+                title
+            FROM docs
+            WHERE source = 'game8'
+            AND norm_hash = ?
+            AND url <> ?
+            AND status = 1
+            LIMIT 1
+            """,
+            (doc.norm_hash, url,),)
+
+        duplicate = cur.fetchone()
+        if duplicate is not None:
+            duplicate_doc_id = int(duplicate[0])
+            duplicate_url = str(duplicate[1])
+            duplicate_title = str(duplicate[2] or "")
+            log.warning("[GAME8] Rejecting duplicate body " "url=%s duplicate_doc_id=%d " "duplicate_url=%s " "duplicate_title=%r", url, duplicate_doc_id, duplicate_url, duplicate_title,)
+            outcome.status = "rejected"
+            return outcome
+
+    log.info("[CHUNK_FILTER] source=%s total=%d accepted=%d rejected=%d", source, doc.chunks_total, len(doc.chunks), doc.chunks_total - len(doc.chunks),)
+
+    if not doc.chunks:
+        log.warning("[PIPELINE] No usable chunks producedm preserving previous document source=%s title=%s url=%s", source, title, url,)
+        outcome.status = "rejected"
+        return outcome
+
+    cur.execute(
+        """
+        INSERT INTO docs(source, url, title, fetched_at, raw_hash, norm_hash, tier, weight, last_modified, etag, version_label, version_ord, raw_zst, raw_len, raw_zst_len)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(url) DO UPDATE SET
+            title=excluded.title,
+            fetched_at=excluded.fetched_at,
+            raw_hash=excluded.raw_hash,
+            norm_hash=excluded.norm_hash,
+            tier=excluded.tier,
+            weight=excluded.weight,
+            last_modified=excluded.last_modified,
+            etag=excluded.etag,
+            version_label=excluded.version_label,
+            version_ord=excluded.version_ord,
+            raw_zst=excluded.raw_zst,
+            raw_len=excluded.raw_len,
+            raw_zst_len=excluded.raw_zst_len,
+            status=1
+        """,
+        (
+            source,
+            url,
+            title,
+            fetched_at,
+            doc.raw_hash,
+            doc.norm_hash,
+            doc.tier,
+            doc.weight,
+            doc.last_modified,
+            doc.etag,
+            doc.version_label,
+            doc.version_ord,
+            doc.raw_zst,
+            doc.raw_len,
+            doc.raw_zst_len,
+        ),
+    )
+    cur.execute("SELECT doc_id FROM docs WHERE url=?", (url,))
+    doc_id = cur.fetchone()[0]
+    # CDC keeps unchanged rows by chunk_hash and has already dropped the replaced ones, so their vectors stay valid
+    # unless reuse is off (e.g. the embedding signature changed), the rebuild is forced, or the passage prompt
+    # embeds a title that just changed.
+    cdc_vectors_kept = doc.chunking_mode == "cdc" and reuse_embeddings and not doc.force_rebuild and not (reuse_requires_title and old_title != title)
+    if doc.chunking_mode == "cdc":
+        kept = upsert_chunks_by_hash(cur, doc_id, doc.chunks)
+        log.info("[CHUNK_CDC] kept %d/%d chunk rows by chunk_hash doc_id=%s url=%s", kept, len(doc.chunks), doc_id, url)
+    else:
+        cur.execute("UPDATE chunks SET is_active=0 WHERE doc_id=?", (doc_id,))
+        cur.executemany(
+            """
+            INSERT INTO chunks(doc_id, chunk_index, text, text_zst, text_len, text_zst_len, chunk_hash, is_active)
+            VALUES (?, ?, ?, ?, ?, ?, ?, 1)
+            ON CONFLICT(doc_id, chunk_index) DO UPDATE SET
+                text=excluded.text,
+                text_zst=excluded.text_zst,
+                text_len=excluded.text_len,
+                text_zst_len=excluded.text_zst_len,
+                chunk_hash=excluded.chunk_hash,
+                is_active=1
+            """,
+            [(doc_id, c.chunk_index, c.text, c.text_zst, len(c.text), len(c.text_zst), c.chunk_hash) for c in doc.chunks],
+        )
+    if doc_changed and reusable:
+        cur.execute("SELECT chunk_id, chunk_hash FROM chunks WHERE doc_id=? AND is_active=1", (doc_id,))
+        stale: list[tuple[int]] = []
+        carried: list[tuple[int, int, bytes]] = []
+        for cid, chash in cur.fetchall():
+            hit = reusable.get(str(chash))
+            if hit is None:
+                stale.append((cid,))
+            elif hit[0] != cid:
+                carried.append((cid, hit[1], hit[2]))
+        cur.executemany("DELETE FROM embeddings WHERE chunk_id=?", stale)
+        cur.executemany("INSERT OR REPLACE INTO embeddings(chunk_id, dims, vector) VALUES(?, ?, ?)", carried)
+        outcome.embeddings_reused = len(doc.chunks) - len(stale)
+        log.info("[INFO] Reused %d/%d embeddings by chunk_hash for rebuilt doc_id=%s url=%s", outcome.embeddings_reused, len(doc.chunks), doc_id, url)
+    elif doc_changed and not cdc_vectors_kept:
+        cur.execute(
+            """
+            DELETE FROM embeddings
+            WHERE chunk_id IN (
+                SELECT chunk_id
+                FROM chunks
+                WHERE doc_id=? AND is_active=1
+            )
             """,
             (doc_id,),
         )
-        rows = cur.fetchall()
-
-        if not do_embed:
-            conn.commit()
-            return rows
+        log.info("[INFO] Cleared stale embeddings for rebuilt doc_id=%s url=%s", doc_id, url)
+
+    cur.execute(
+        """
+        SELECT c.chunk_id, c.text
+        FROM chunks c
+        LEFT JOIN embeddings e ON e.chunk_id = c.chunk_id
+        WHERE c.doc_id=? AND c.is_active=1 AND e.chunk_id IS NULL
+        ORDER BY c.chunk_index
+        """,
+        (doc_id,),
+    )
+    outcome.doc_id = doc_id
+    outcome.rows = cur.fetchall()
+    outcome.chunks_written = len(doc.chunks)
+    outcome.fts_marks.append((doc_id, "chunks_changed"))
+    return outcome
+
+def write_prepared_document(cur: sqlite3.Cursor, doc: PreparedDocument, *, reuse_embeddings: bool = False, reuse_requires_title: bool = False) -> WriteOutcome:
+    cur.execute("SAVEPOINT write_doc")
+    try:
+        outcome = apply_prepared_document(cur, doc, reuse_embeddings=reuse_embeddings, reuse_requires_title=reuse_requires_title)
+    except Exception:
+        cur.execute("ROLLBACK TO write_doc")
+        cur.execute("RELEASE write_doc")
+        raise
+    if outcome.status == "rejected":
+        cur.execute("ROLLBACK TO write_doc")
+        outcome.fts_marks = []
+        outcome.rows = []
+    cur.execute("RELEASE write_doc")
+    return outcome
+
+def write_document_batch(conn: sqlite3.Connection, docs: list[PreparedDocument], *, raise_errors: bool = False, reuse_embeddings: bool = False, reuse_requires_title: bool = False) -> DocumentBatchReport:
+    t0 = time.perf_counter()
+    outcomes: list[WriteOutcome] = []
+    cur = conn.cursor()
+    try:
+        cur.execute("BEGIN IMMEDIATE")
+        lock_wait_s = time.perf_counter() - t0
+        for doc in docs:
+            try:
+                outcomes.append(write_prepared_document(cur, doc, reuse_embeddings=reuse_embeddings, reuse_requires_title=reuse_requires_title))
+            except Exception:
+                if raise_errors:
+                    raise
+                log.exception("[WRITER] failed src=%s url=%s", doc.source, doc.url)
+                outcomes.append(WriteOutcome(url=doc.url, title=doc.title, status="failed"))
+
+        changed_doc_ids = [outcome.doc_id for outcome in outcomes if outcome.status == "written" and outcome.doc_id is not None]
+        mark_fts_dirty_docs_many(conn, [mark for outcome in outcomes for mark in outcome.fts_marks])
+        mark_parent_dirty_docs_many(conn, changed_doc_ids, reason="chunks_changed")
+        mark_splade_dirty_docs_many(conn, changed_doc_ids, reason="chunks_changed")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return DocumentBatchReport(outcomes=outcomes, seconds=time.perf_counter() - t0, lock_wait_s=lock_wait_s)
+
+def embed_chunk_rows(conn: sqlite3.Connection, embed_fn: EmbedFn, config: dict[str, Any], rows: list[tuple[int, str]], title: str | None = None) -> int:
+    MAX_EMBED_CHARS = int(config.get("pipeline", {}).get("max_embed_chars", 1800))
+    MIN_EMBED_CHARS = int(config.get("pipeline", {}).get("min_embed_chars", 800))
+
+    embedded: list[tuple[int, int, bytes]] = []
+    for cid, txt in rows:
+        safe_txt = txt[:MAX_EMBED_CHARS] if len(txt) > MAX_EMBED_CHARS else txt
+        safe_txt = defang_tables(safe_txt)
+        vec = dims = None
+        last_err = None
+
+        for attempt in range(8):
+            try:
+                vec, dims = embed_fn(safe_txt, title=title)
+                break
+            except Exception as e:
+                last_err = e
+                log.exception("Embed retry %d/8 chunk_id=%s", attempt + 1, cid)
+                if len(safe_txt) <= MIN_EMBED_CHARS:
+                    break
+                safe_txt = safe_txt[: max(MIN_EMBED_CHARS, len(safe_txt) // 4)]
+
+        if vec is None or dims is None:
+            log.warning("[INFO] embed failed chunk_id=%s orig_len=%d final_len=%d err=%s", cid, len(txt), len(safe_txt), last_err)
+            continue
+        embedded.append((cid, dims, vec))
+
+    if not embedded:
+        return 0
+    embed_dtype = resolve_embedding_dtype(conn, config)
+    if embed_dtype != "float32":
+        embedded = [(cid, dims, convert_vector_blob(vec, dims, embed_dtype)) for cid, dims, vec in embedded]
+    cur = conn.cursor()
+    try:
+        cur.execute("BEGIN IMMEDIATE")
+        cur.executemany(
+            "INSERT OR REPLACE INTO embeddings(chunk_id, dims, vector) VALUES(?, ?, ?)",
+            embedded,
+        )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return len(embedded)
 
-        MAX_EMBED_CHARS = int(config.get("pipeline", {}).get("max_embed_chars", 1800))
-        MIN_EMBED_CHARS = int(config.get("pipeline", {}).get("min_embed_chars", 800))
+def process_document(conn: sqlite3.Connection, embed_fn: EmbedFn, config: dict[str, Any], source: str, url: str, title: str, raw_text: str, *, tier: str = "primary", weight: float =1.0, do_embed: bool=True, last_modified: str | None = None, etag: str | None =None) -> list[tuple[int, str]]:
+    prepared = prepare_document(config, source, url, title, raw_text, tier=tier, weight=weight, last_modified=last_modified, etag=etag)
+    if prepared is None:
+        return []
 
-        for cid, txt in rows:
-            safe_txt = txt[:MAX_EMBED_CHARS] if len(txt) > MAX_EMBED_CHARS else txt
-            safe_txt = defang_tables(safe_txt)
-            vec = dims = None
-            last_err = None
+    report = write_document_batch(conn, [prepared], raise_errors=True)
+    rows = report.outcomes[0].rows
 
-            for attempt in range(8):
-                try:
-                    vec, dims = embed_fn(safe_txt, title=title)
-                    break
-                except Exception as e:
-                    last_err = e
-                    log.exception("Embed retry %d/8 chunk_id=%s", attempt + 1, cid)
-                    if len(safe_txt) <= MIN_EMBED_CHARS:
-                        break
-                    safe_txt = safe_txt[: max(MIN_EMBED_CHARS, len(safe_txt) // 4)]
-
-            if vec is None or dims is None:
-                log.warning("[INFO] embed failed chunk_id=%s orig_len=%d final_len=%d err=%s", cid, len(txt), len(safe_txt), last_err)
-                continue
+    if not do_embed:
+        return rows
 
-            cur.execute(
-                "INSERT OR REPLACE INTO embeddings(chunk_id, dims, vector) VALUES(?, ?, ?)",
-                (cid, dims, vec),
-            )
+    embed_chunk_rows(conn, embed_fn, config, rows, title=title)
+    return []
 
+def refresh_document_metadata(conn: sqlite3.Connection, docs: list[PreparedDocument]) -> int:
+    if not docs:
+        return 0
+    fetched_at = datetime.now(timezone.utc).isoformat()
+    cur = conn.cursor()
+    marks: list[tuple[int, str]] = []
+    try:
+        cur.execute("BEGIN IMMEDIATE")
+        for doc in docs:
+            row = cur.execute("SELECT doc_id, title FROM docs WHERE url=?", (doc.url,)).fetchone()
+            if row is None:
+                continue
+            if row[1] != doc.title:
+                marks.append((int(row[0]), "metadata_refresh"))
+        cur.executemany(
+            """
+            UPDATE docs
+            SET title=?, fetched_at=?, tier=?, weight=?, last_modified=?, etag=?, version_label=?, version_ord=?
+            WHERE url=?
+            """,
+            [(doc.title, fetched_at, doc.tier, doc.weight, doc.last_modified, doc.etag, doc.version_label, doc.version_ord, doc.url) for doc in docs],
+        )
+        mark_fts_dirty_docs_many(conn, marks)
         conn.commit()
-        return []
+    except Exception:
+        conn.rollback()
+        raise
+    return len(docs)
 
+def deactivate_documents(conn: sqlite3.Connection, source: str, urls: list[str], *, reason: str = "source_deleted") -> int:
+    if not urls:
+        return 0
+    cur = conn.cursor()
+    try:
+        cur.execute("BEGIN IMMEDIATE")
+        doc_ids = []
+        for url in urls:
+            row = cur.execute("SELECT doc_id FROM docs WHERE source=? AND url=? AND status=1", (source, url)).fetchone()
+            if row is not None:
+                doc_ids.append(int(row[0]))
+        cur.executemany("UPDATE docs SET status=0 WHERE doc_id=?", [(doc_id,) for doc_id in doc_ids])
+        cur.executemany("UPDATE chunks SET is_active=0 WHERE doc_id=?", [(doc_id,) for doc_id in doc_ids])
+        mark_fts_dirty_docs_many(conn, [(doc_id, reason) for doc_id in doc_ids])
+        mark_parent_dirty_docs_many(conn, doc_ids, reason=reason)
+        mark_splade_dirty_docs_many(conn, doc_ids, reason=reason)
+        conn.commit()
     except Exception:
         conn.rollback()
-        raise
\ No newline at end of file
+        raise
+    log.info("[PIPELINE] deactivated docs source=%s requested=%d deactivated=%d reason=%s", source, len(urls), len(doc_ids), reason)
+    return len(doc_ids)
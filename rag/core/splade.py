@@ -66,6 +66,20 @@ def mark_splade_dirty_doc(conn, doc_id: int, reason: str = "chunks_changed") ->
         (int(doc_id), reason),
     )
 
+def mark_splade_dirty_docs_many(conn, doc_ids: list[int], reason: str = "chunks_changed") -> None:
+    if not doc_ids:
+        return
+    conn.executemany(
+        """
+        INSERT INTO splade_dirty_docs(doc_id, reason, marked_at)
+        VALUES (?, ?, CURRENT_TIMESTAMP)
+        ON CONFLICT(doc_id) DO UPDATE SET
+            reason=excluded.reason,
+            marked_at=CURRENT_TIMESTAMP
+        """,
+        [(int(doc_id), reason) for doc_id in doc_ids],
+    )
+
 def get_splade_output_dimension(model: SparseEncoder) -> int:
     tokenizer = getattr(model, "tokenizer", None)
     if tokenizer is not None:
@@ -122,6 +136,22 @@ def encode_query_sparse(model: SparseEncoder, query: str, *, max_active_dims: in
     query_matrix.sum_duplicates()
     return query_matrix.indices.astype(np.int32, copy=False), query_matrix.data.astype(np.float32, copy=False), dimension
 
+def encode_queries_sparse(model: SparseEncoder, queries: list[str], *, max_active_dims: int | None) -> sparse.csr_matrix:
+    embedding = model.encode_query(queries, show_progress_bar=False, convert_to_tensor=True, convert_to_sparse_tensor=True, save_to_cpu=True, max_active_dims=max_active_dims)
+
+    if embedding.layout != torch.sparse_coo:
+        raise RuntimeError(f"Expected sparse COO queries, got layout={embedding.layout}")
+
+    if embedding.ndim != 2:
+        raise ValueError(f"Expected two-dimensional SPLADE query batch, got shape={tuple(embedding.shape)}")
+
+    embedding = embedding.coalesce()
+    rows, columns = embedding.indices().cpu().numpy()
+    values = embedding.values().float().cpu().numpy().astype(np.float32, copy=False)
+    query_matrix = sparse.coo_matrix((values, (rows, columns)), shape=tuple(embedding.shape), dtype=np.float32).tocsr()
+    query_matrix.sum_duplicates()
+    return query_matrix
+
 def save_csc_shard(shard_dir: Path, matrix: sparse.spmatrix, chunk_ids: np.ndarray) -> None:
     shard_dir.mkdir(parents=True, exist_ok=True)
 
@@ -197,6 +227,37 @@ def search_csc_shard(matrix: sparse.csc_matrix, chunk_ids: np.ndarray, query_ind
 
     return [(int(chunk_ids[row_index]), float(scores[row_index])) for row_index in selected]
 
+def search_csc_shard_batch(matrix: sparse.csc_matrix, chunk_ids: np.ndarray, query_matrix: sparse.csr_matrix, *, k: int) -> list[list[tuple[int, float]]]:
+    nq = query_matrix.shape[0]
+    if k <= 0 or query_matrix.nnz == 0:
+        return [[] for _ in range(nq)]
+
+    # Only the union of the queries' active terms is read from the shard.
+    columns = np.unique(query_matrix.indices)
+    columns = columns[(columns >= 0) & (columns < matrix.shape[1])]
+    if columns.size == 0:
+        return [[] for _ in range(nq)]
+
+    selected_columns = matrix[:, columns]
+    query_block = query_matrix[:, columns].toarray().T
+    scores = np.asarray(selected_columns @ query_block, dtype=np.float32)
+
+    out = []
+    for q in range(nq):
+        column = scores[:, q]
+        positive_rows = np.flatnonzero(column > 0.0)
+        if positive_rows.size == 0:
+            out.append([])
+            continue
+        effective_k = min(k, positive_rows.size)
+        if positive_rows.size > effective_k:
+            selected = positive_rows[np.argpartition(column[positive_rows], -effective_k)[-effective_k:]]
+        else:
+            selected = positive_rows
+        selected = selected[np.argsort(column[selected])[::-1]]
+        out.append([(int(chunk_ids[row_index]), float(column[row_index])) for row_index in selected])
+    return out
+
 def build_splade_from_sqlite(cfg: dict, *, overwrite: bool = False, limit: int | None = None) -> dict:
     splade_cfg = cfg.get("splade", {}) or {}
 
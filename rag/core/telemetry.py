@@ -0,0 +1,161 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterable, Iterator, TypeVar
+
+from .paths import resolve_telemetry_path
+
+log = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+class PipelineTelemetry:
+    def __init__(self, path: Path, *, fmt: str = "jsonl", interval_s: float = 10.0):
+        self.path = Path(path)
+        self.fmt = "prometheus" if str(fmt).lower() in ("prometheus", "prom", "textfile") else "jsonl"
+        self.interval_s = max(0.5, float(interval_s))
+        self.queues: dict[str, queue.Queue] = {}
+        self.counters: dict[str, int] = {}
+        self.timers: dict[str, list[float]] = {}
+        self.started_at = time.monotonic()
+        self.last_at = self.started_at
+        self.last_counters: dict[str, int] = {}
+        self.last_timers: dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+    def watch_queue(self, name: str, q: queue.Queue) -> None:
+        with self._lock:
+            self.queues[name] = q
+
+    def count(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + int(n)
+
+    def observe(self, name: str, seconds: float) -> None:
+        with self._lock:
+            timer = self.timers.setdefault(name, [0.0, 0, 0.0])
+            timer[0] += seconds
+            timer[1] += 1
+            timer[2] = max(timer[2], seconds)
+
+    @contextmanager
+    def timed(self, name: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - t0)
+
+    def timed_iter(self, name: str, items: Iterable[T]) -> Iterator[T]:
+        it = iter(items)
+        while True:
+            t0 = time.perf_counter()
+            try:
+                item = next(it)
+            except StopIteration:
+                return
+            self.observe(name, time.perf_counter() - t0)
+            yield item
+
+    def snapshot(self) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            interval = max(now - self.last_at, 1e-9)
+            queues = {name: {"depth": q.qsize(), "maxsize": q.maxsize} for name, q in self.queues.items()}
+            counters = {}
+            for name, total in self.counters.items():
+                counters[name] = {"total": total, "rate_s": (total - self.last_counters.get(name, 0)) / interval}
+            timers = {}
+            for name, (total_s, n, max_s) in self.timers.items():
+                timers[name] = {
+                    "count": int(n),
+                    "total_s": total_s,
+                    "avg_s": total_s / max(n, 1),
+                    "max_s": max_s,
+                    "busy": (total_s - self.last_timers.get(name, 0.0)) / interval,
+                }
+            self.last_counters = dict(self.counters)
+            self.last_timers = {name: timer[0] for name, timer in self.timers.items()}
+            self.last_at = now
+        return {"ts": time.time(), "uptime_s": now - self.started_at, "interval_s": interval, "queues": queues, "counters": counters, "timers": timers}
+
+    def write(self) -> dict:
+        snap = self.snapshot()
+        try:
+            if self.fmt == "prometheus":
+                tmp = self.path.with_name(self.path.name + ".tmp")
+                tmp.write_text(render_prometheus(snap), encoding="utf-8")
+                os.replace(tmp, self.path)
+            else:
+                with self.path.open("a", encoding="utf-8") as f:
+                    f.write(json.dumps(snap, sort_keys=True) + "\n")
+        except OSError:
+            log.exception("[TELEMETRY] failed to write %s", self.path)
+        return snap
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval_s):
+            snap = self.write()
+            depths = " ".join(f"{name}={q['depth']}/{q['maxsize']}" for name, q in snap["queues"].items())
+            busy = " ".join(f"{name}={t['busy']:.2f}" for name, t in sorted(snap["timers"].items()))
+            log.debug("[TELEMETRY] queues %s busy %s", depths, busy)
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="pipeline-telemetry", daemon=True)
+        self._thread.start()
+        log.info("[TELEMETRY] writing %s to %s every %.1fs", self.fmt, self.path, self.interval_s)
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.write()
+
+# Stages whose ``name:suffix`` suffix is a source name; any other suffix is a kind of work within the stage.
+SOURCE_STAGES = frozenset({"fetch", "produced", "doc_q_put_wait"})
+
+def prometheus_labels(name: str) -> str:
+    stage, _, suffix = name.partition(":")
+    if not suffix:
+        return f'stage="{stage}"'
+    label = "source" if stage in SOURCE_STAGES else "kind"
+    return f'stage="{stage}",{label}="{suffix}"'
+
+def render_prometheus(snap: dict) -> str:
+    lines = [
+        "# HELP rag_ingest_queue_depth Items waiting in an ingest pipeline queue.",
+        "# TYPE rag_ingest_queue_depth gauge",
+    ]
+    lines += [f'rag_ingest_queue_depth{{queue="{name}"}} {q["depth"]}' for name, q in snap["queues"].items()]
+    lines += ["# TYPE rag_ingest_queue_capacity gauge"]
+    lines += [f'rag_ingest_queue_capacity{{queue="{name}"}} {q["maxsize"]}' for name, q in snap["queues"].items()]
+    lines += ["# HELP rag_ingest_items_total Items handled by an ingest stage.", "# TYPE rag_ingest_items_total counter"]
+    lines += [f"rag_ingest_items_total{{{prometheus_labels(name)}}} {c['total']}" for name, c in snap["counters"].items()]
+    lines += ["# HELP rag_ingest_seconds Seconds spent in a timed ingest operation.", "# TYPE rag_ingest_seconds summary"]
+    for name, t in snap["timers"].items():
+        lines.append(f"rag_ingest_seconds_sum{{{prometheus_labels(name)}}} {t['total_s']:.6f}")
+        lines.append(f"rag_ingest_seconds_count{{{prometheus_labels(name)}}} {t['count']}")
+    lines += ["# TYPE rag_ingest_seconds_max gauge"]
+    lines += [f"rag_ingest_seconds_max{{{prometheus_labels(name)}}} {t['max_s']:.6f}" for name, t in snap["timers"].items()]
+    lines += ["# TYPE rag_ingest_uptime_seconds gauge", f"rag_ingest_uptime_seconds {snap['uptime_s']:.3f}"]
+    return "\n".join(lines) + "\n"
+
+def open_telemetry(cfg: dict) -> PipelineTelemetry | None:
+    telemetry_cfg = cfg.get("telemetry", {}) or {}
+    if not str(telemetry_cfg.get("enabled", False)).strip().lower() in ("1", "true", "yes", "y", "on"):
+        return None
+    return PipelineTelemetry(resolve_telemetry_path(cfg), fmt=str(telemetry_cfg.get("format", "jsonl")), interval_s=float(telemetry_cfg.get("interval_s", 10.0)))
@@ -10,6 +10,8 @@ import time
 import numpy as np
 
 from core.paths import resolve_db_path, resolve_turbovec_dir
+from core.vector_store import VectorStore, open_synced_vector_store
+from utils.codec import decode_vector
 
 log = logging.getLogger(__name__)
 
@@ -66,25 +68,7 @@ def embedding_model_from_cfg(cfg: dict, *, backend: str | None = None, source: s
 
     return str(cfg.get("ollama", {}).get("embedding_model", ""))
 
-def build_turbovec_from_sqlite(cfg: dict, *, overwrite: bool = False, backend: str | None = None) -> dict:
-    db_path = resolve_db_path(cfg)
-    tv_cfg = cfg.get("turbovec", {}) or {}
-    
-    out_dir = resolve_turbovec_dir(cfg)
-    current = out_dir / "current"
-    current.mkdir(parents=True, exist_ok=True)
-
-    index_path = current / "index.tvim"
-    meta_path = current / "meta.json"
-    ids_path = current / "ids.npy"
-
-    if index_path.exists() and not overwrite:
-        raise FileExistsError(f"TurboVec index already exists: {index_path}")
-    
-    bit_width = int(tv_cfg.get("bit_width", 4))
-    batch_size = int(tv_cfg.get("batch_size", 4096))
-    calibration_size = max(batch_size, int(tv_cfg.get("calibration_size", 50000)))
-
+def add_from_sqlite(db_path: Path, *, bit_width: int, batch_size: int, calibration_size: int) -> tuple[IdMapIndex, int, int, list[np.ndarray]]:
     conn = sqlite3.connect(str(db_path))
     conn.row_factory = sqlite3.Row
     try:
@@ -159,9 +143,10 @@ def build_turbovec_from_sqlite(cfg: dict, *, overwrite: bool = False, backend: s
             if d != dims:
                 raise RuntimeError(f"mixed embedding dims: expected={dims}, got={d}, chunk_id={cid}")
 
-            v = np.frombuffer(row["vector"], dtype=np.float32)
-            if v.size != dims:
-                raise RuntimeError(f"bad vector size chunk_id={cid}: expected={dims}, got={v.size}")
+            try:
+                v = decode_vector(row["vector"], dims)
+            except ValueError as e:
+                raise RuntimeError(f"bad vector size chunk_id={cid}: {e}") from e
 
             ids_batch.append(cid)
             vecs_batch.append(v)
@@ -173,7 +158,69 @@ def build_turbovec_from_sqlite(cfg: dict, *, overwrite: bool = False, backend: s
         flush_batch()
     finally:
         conn.close()
-        
+
+    return index, dims, added, added_id_batches
+
+def add_from_vector_store(store: VectorStore, *, bit_width: int, batch_size: int, calibration_size: int) -> tuple[IdMapIndex, int, int, list[np.ndarray]]:
+    total = store.count
+    if total == 0:
+        raise RuntimeError("No active embeddings found for TurboVec build")
+
+    log.info("[TURBOVEC] Build starting from vector store total=%d, dims=%d, bit_width=%d, batch_size=%d", total, store.dims, bit_width, batch_size)
+    index = IdMapIndex(dim=store.dims, bit_width=bit_width)
+    all_ids = store.sorted_ids
+
+    # Same pseudo-random calibration sample the SQLite path draws; the rest is added in storage order.
+    spread = (all_ids * 1103515245 + 12345) & 2147483647
+    calib = np.sort(np.argsort(spread, kind="stable")[:calibration_size])
+    taken = np.zeros(total, dtype=bool)
+    taken[calib] = True
+
+    added_id_batches: list[np.ndarray] = []
+    added = 0
+
+    def add(positions: np.ndarray) -> None:
+        nonlocal added
+        vectors, _ = store.gather(store.sorted_rows[positions])
+        ids = np.ascontiguousarray(all_ids[positions], dtype=np.uint64)
+        index.add_with_ids(normalize_vector_batch(np.array(vectors, dtype=np.float32)), ids)
+        added_id_batches.append(ids)
+        added += int(ids.size)
+        if added % (batch_size * 10) == 0 or added == total:
+            log.info("[TURBOVEC] added=%d/%d", added, total)
+
+    add(calib)
+    rest = np.flatnonzero(~taken)
+    for start in range(0, rest.size, batch_size):
+        add(rest[start:start + batch_size])
+    return index, store.dims, added, added_id_batches
+
+def build_turbovec_from_sqlite(cfg: dict, *, overwrite: bool = False, backend: str | None = None) -> dict:
+    db_path = resolve_db_path(cfg)
+    tv_cfg = cfg.get("turbovec", {}) or {}
+    
+    out_dir = resolve_turbovec_dir(cfg)
+    current = out_dir / "current"
+    current.mkdir(parents=True, exist_ok=True)
+
+    index_path = current / "index.tvim"
+    meta_path = current / "meta.json"
+    ids_path = current / "ids.npy"
+
+    if index_path.exists() and not overwrite:
+        raise FileExistsError(f"TurboVec index already exists: {index_path}")
+    
+    bit_width = int(tv_cfg.get("bit_width", 4))
+    batch_size = int(tv_cfg.get("batch_size", 4096))
+    calibration_size = max(batch_size, int(tv_cfg.get("calibration_size", 50000)))
+
+    store = open_synced_vector_store(cfg)
+    if store is not None:
+        index, dims, added, added_id_batches = add_from_vector_store(store, bit_width=bit_width, batch_size=batch_size, calibration_size=calibration_size)
+        store.close()
+    else:
+        index, dims, added, added_id_batches = add_from_sqlite(db_path, bit_width=bit_width, batch_size=batch_size, calibration_size=calibration_size)
+
     index.write(str(index_path))
     indexed_ids = np.concatenate(added_id_batches) if added_id_batches else np.empty(0, dtype=np.uint64)
 
@@ -0,0 +1,339 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import time
+from pathlib import Path
+from typing import Iterator
+
+import numpy as np
+
+from .db import connect
+from .paths import resolve_db_path, resolve_vector_store_dir
+from utils.codec import decode_vectors
+
+log = logging.getLogger(__name__)
+
+CONSUMER = "vector_store"
+FILES = {"vectors": "vectors.f32", "ids": "ids.i64", "norms": "norms.f32", "live": "live.u8"}
+ACTIVE_EMBEDDINGS_SQL = """
+    SELECT e.chunk_id, e.dims, e.vector
+    FROM embeddings e
+    JOIN chunks c ON c.chunk_id = e.chunk_id
+    JOIN docs d ON d.doc_id = c.doc_id
+    WHERE c.is_active = 1
+    AND COALESCE(d.status, 1) = 1
+"""
+
+def as_bool(x) -> bool:
+    return str(x).strip().lower() in ("1", "true", "yes", "y", "on")
+
+def vector_store_enabled(cfg: dict) -> bool:
+    return as_bool((cfg.get("vector_store", {}) or {}).get("enabled", False))
+
+def map_column(path: Path, dtype, shape: tuple[int, ...], mode: str = "r") -> np.ndarray:
+    if not shape[0]:
+        return np.empty(shape, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode=mode, shape=shape)
+
+def write_meta(directory: Path, meta: dict) -> None:
+    tmp = directory / "meta.json.tmp"
+    tmp.write_text(json.dumps(meta, indent=2), encoding="utf-8")
+    os.replace(tmp, directory / "meta.json")
+
+def promote(build_dir: Path, current_dir: Path) -> None:
+    old = current_dir.with_name(current_dir.name + ".old")
+    if old.exists():
+        shutil.rmtree(old)
+    if current_dir.exists():
+        current_dir.rename(old)
+    build_dir.rename(current_dir)
+    shutil.rmtree(old, ignore_errors=True)
+
+class VectorStore:
+    """Append-only float32 matrix of chunk embeddings with a chunk_id offset index.
+
+    Rows are never rewritten in place; a changed or deactivated chunk gets its
+    old row tombstoned in ``live.u8`` and, when it still has a vector, a new row
+    appended. Compaction rewrites the live rows in chunk_id order.
+    """
+
+    def __init__(self, root: Path, *, writable: bool = False):
+        self.root = Path(root)
+        self.current = self.root / "current"
+        self.meta = json.loads((self.current / "meta.json").read_text(encoding="utf-8"))
+        self.dims = int(self.meta["dims"])
+        self.rows = int(self.meta["rows"])
+        self.last_seq = int(self.meta.get("last_seq", 0))
+        self.writable = writable
+        if writable:
+            self._truncate_to_meta()
+        self._map()
+
+    def _truncate_to_meta(self) -> None:
+        widths = {"vectors": 4 * self.dims, "ids": 8, "norms": 4, "live": 1}
+        for key, width in widths.items():
+            path = self.current / FILES[key]
+            if path.exists() and path.stat().st_size > self.rows * width:
+                with path.open("r+b") as f:
+                    f.truncate(self.rows * width)
+                log.warning("[VECTORS] truncated unfinished append in %s", path)
+
+    def _map(self) -> None:
+        n, d = self.rows, self.dims
+        self.vectors = map_column(self.current / FILES["vectors"], np.float32, (n, d))
+        self.ids = map_column(self.current / FILES["ids"], np.int64, (n,))
+        self.norms = map_column(self.current / FILES["norms"], np.float32, (n,))
+        self.live = map_column(self.current / FILES["live"], np.uint8, (n,), mode="r+" if self.writable else "r")
+
+        live_rows = np.flatnonzero(self.live)
+        order = np.argsort(self.ids[live_rows], kind="stable")
+        self.sorted_ids = np.ascontiguousarray(self.ids[live_rows][order])
+        self.sorted_rows = np.ascontiguousarray(live_rows[order])
+        self.sequential = bool(self.sorted_rows.size == n and (n == 0 or (self.sorted_rows[0] == 0 and self.sorted_rows[-1] == n - 1)))
+
+    @property
+    def count(self) -> int:
+        return int(self.sorted_ids.size)
+
+    @property
+    def dead(self) -> int:
+        return self.rows - self.count
+
+    def close(self) -> None:
+        for name in ("vectors", "ids", "norms", "live"):
+            setattr(self, name, None)
+
+    def find_rows(self, chunk_ids: np.ndarray) -> np.ndarray:
+        chunk_ids = np.asarray(chunk_ids, dtype=np.int64)
+        if not self.count:
+            return np.full(chunk_ids.shape, -1, dtype=np.int64)
+        pos = np.minimum(np.searchsorted(self.sorted_ids, chunk_ids), self.count - 1)
+        return np.where(self.sorted_ids[pos] == chunk_ids, self.sorted_rows[pos], -1)
+
+    def gather(self, rows: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        if rows.size and rows[-1] - rows[0] == rows.size - 1:
+            return self.vectors[rows[0]:rows[-1] + 1], self.norms[rows[0]:rows[-1] + 1]
+        return self.vectors[rows], self.norms[rows]
+
+    def iter_active(self, batch: int = 65536) -> Iterator[tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        for start in range(0, self.count, batch):
+            rows = self.sorted_rows[start:start + batch]
+            vectors, norms = self.gather(rows)
+            yield self.sorted_ids[start:start + batch], vectors, norms
+
+    def matrix(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        if self.sequential:
+            return self.sorted_ids, self.vectors, self.norms
+        return self.sorted_ids, self.vectors[self.sorted_rows], self.norms[self.sorted_rows]
+
+    def append(self, chunk_ids: np.ndarray, vectors: np.ndarray) -> None:
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1).astype(np.float32)
+        columns = {
+            "vectors": vectors,
+            "ids": np.ascontiguousarray(chunk_ids, dtype=np.int64),
+            "norms": norms,
+            "live": np.ones(len(chunk_ids), dtype=np.uint8),
+        }
+        for key, values in columns.items():
+            with (self.current / FILES[key]).open("ab") as f:
+                f.write(values.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+        self.rows += len(chunk_ids)
+
+    def tombstone(self, rows: np.ndarray) -> None:
+        if rows.size:
+            self.live[rows] = 0
+            self.live.flush()
+
+    def commit(self, last_seq: int) -> None:
+        self.last_seq = int(last_seq)
+        self.meta.update({"rows": self.rows, "last_seq": self.last_seq, "updated_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())})
+        write_meta(self.current, self.meta)
+        self._map()
+
+def open_vector_store(cfg: dict) -> VectorStore | None:
+    if not vector_store_enabled(cfg):
+        return None
+    root = resolve_vector_store_dir(cfg)
+    if not (root / "current" / "meta.json").exists():
+        log.warning("[VECTORS] store enabled but not built yet at %s; falling back to SQLite", root)
+        return None
+    return VectorStore(root)
+
+def vector_store_is_current(conn: sqlite3.Connection, store: VectorStore) -> bool:
+    try:
+        registered = conn.execute("SELECT 1 FROM vector_log_consumers WHERE name=?", (CONSUMER,)).fetchone()
+        hi = int(conn.execute("SELECT COALESCE(MAX(seq), 0) FROM vector_dirty_log").fetchone()[0] or 0)
+    except sqlite3.OperationalError:
+        return False
+    return registered is not None and hi <= store.last_seq
+
+def register_consumer(conn: sqlite3.Connection, name: str, last_seq: int | None = None) -> int:
+    if last_seq is None:
+        last_seq = int(conn.execute("SELECT COALESCE(MAX(seq), 0) FROM vector_dirty_log").fetchone()[0] or 0)
+    conn.execute(
+        """
+        INSERT INTO vector_log_consumers(name, last_seq) VALUES (?, ?)
+        ON CONFLICT(name) DO UPDATE SET last_seq=excluded.last_seq, updated_at=CURRENT_TIMESTAMP
+        """,
+        (name, int(last_seq)),
+    )
+    return int(last_seq)
+
+def dirty_log_high_water(conn: sqlite3.Connection) -> int:
+    # sqlite_sequence keeps the last AUTOINCREMENT value even after the log is pruned.
+    row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name='vector_dirty_log'").fetchone()
+    return int(row[0]) if row else 0
+
+def prune_dirty_log(conn: sqlite3.Connection) -> int:
+    cur = conn.execute("DELETE FROM vector_dirty_log WHERE seq <= (SELECT MIN(last_seq) FROM vector_log_consumers)")
+    return int(cur.rowcount or 0)
+
+def iter_blob_batches(cur: sqlite3.Cursor, batch: int) -> Iterator[tuple[np.ndarray, np.ndarray]]:
+    while True:
+        rows = cur.fetchmany(batch)
+        if not rows:
+            return
+        d = int(rows[0][1])
+        if any(int(r[1]) != d for r in rows):
+            raise RuntimeError(f"[VECTORS] mixed embedding dims in batch, expected {d}")
+        ids = np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+        yield ids, decode_vectors([r[2] for r in rows], d)
+
+def rebuild_vector_store(conn: sqlite3.Connection, root: Path, *, batch: int = 4096) -> dict:
+    root = Path(root)
+    root.mkdir(parents=True, exist_ok=True)
+    last_seq = register_consumer(conn, CONSUMER)
+
+    build_dir = root / f"tmp_build_{int(time.time())}"
+    build_dir.mkdir(parents=True, exist_ok=True)
+    files = {key: (build_dir / name).open("wb") for key, name in FILES.items()}
+    rows, dims, t0 = 0, 0, time.time()
+    try:
+        cur = conn.execute(ACTIVE_EMBEDDINGS_SQL + " ORDER BY e.chunk_id")
+        for ids, vectors in iter_blob_batches(cur, batch):
+            if dims and vectors.shape[1] != dims:
+                raise RuntimeError(f"[VECTORS] mixed embedding dims: expected={dims} got={vectors.shape[1]}")
+            dims = vectors.shape[1]
+            files["vectors"].write(vectors.tobytes())
+            files["ids"].write(ids.tobytes())
+            files["norms"].write(np.linalg.norm(vectors, axis=1).astype(np.float32).tobytes())
+            files["live"].write(np.ones(ids.size, dtype=np.uint8).tobytes())
+            rows += int(ids.size)
+    finally:
+        for f in files.values():
+            f.close()
+
+    if not rows:
+        shutil.rmtree(build_dir, ignore_errors=True)
+        raise RuntimeError("[VECTORS] no active embeddings found (nothing to build)")
+
+    write_meta(build_dir, {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "dims": int(dims),
+        "rows": rows,
+        "dtype": "float32",
+        "last_seq": last_seq,
+    })
+    promote(build_dir, root / "current")
+    log.info("[VECTORS] rebuilt store rows=%d dims=%d in %.1fs at %s", rows, dims, time.time() - t0, root / "current")
+    return {"mode": "rebuild", "rows": rows, "appended": rows, "tombstoned": 0, "dirty_chunks": 0, "compacted": False}
+
+def compact_vector_store(store: VectorStore, *, batch: int = 65536) -> VectorStore:
+    build_dir = store.root / f"tmp_compact_{int(time.time())}"
+    build_dir.mkdir(parents=True, exist_ok=True)
+    with (build_dir / FILES["vectors"]).open("wb") as fv, (build_dir / FILES["ids"]).open("wb") as fi, (build_dir / FILES["norms"]).open("wb") as fn:
+        for ids, vectors, norms in store.iter_active(batch):
+            fv.write(np.ascontiguousarray(vectors).tobytes())
+            fi.write(ids.tobytes())
+            fn.write(np.ascontiguousarray(norms).tobytes())
+    (build_dir / FILES["live"]).write_bytes(np.ones(store.count, dtype=np.uint8).tobytes())
+    write_meta(build_dir, dict(store.meta, rows=store.count, compacted_at=time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())))
+
+    root, dropped = store.root, store.dead
+    store.close()
+    promote(build_dir, root / "current")
+    log.info("[VECTORS] compacted store dropped_rows=%d", dropped)
+    return VectorStore(root, writable=True)
+
+def sync_vector_store(conn: sqlite3.Connection, root: Path, *, batch: int = 4096, compact_ratio: float = 0.25) -> dict:
+    root = Path(root)
+    registered = conn.execute("SELECT last_seq FROM vector_log_consumers WHERE name=?", (CONSUMER,)).fetchone()
+    if registered is None or not (root / "current" / "meta.json").exists():
+        return rebuild_vector_store(conn, root, batch=batch)
+
+    store = VectorStore(root, writable=True)
+    hi = int(conn.execute("SELECT COALESCE(MAX(seq), 0) FROM vector_dirty_log").fetchone()[0] or 0)
+    report = {"mode": "incremental", "rows": store.rows, "appended": 0, "tombstoned": 0, "dirty_chunks": 0, "compacted": False}
+    if hi <= store.last_seq:
+        register_consumer(conn, CONSUMER, store.last_seq)
+        report["rows"] = store.count
+        return report
+
+    dirty = np.fromiter(
+        (r[0] for r in conn.execute("SELECT DISTINCT chunk_id FROM vector_dirty_log WHERE seq > ? AND seq <= ?", (store.last_seq, hi))),
+        dtype=np.int64,
+    )
+    report["dirty_chunks"] = int(dirty.size)
+
+    for start in range(0, dirty.size, 900):
+        part = dirty[start:start + 900]
+        placeholders = ",".join("?" for _ in part)
+        cur = conn.execute(ACTIVE_EMBEDDINGS_SQL + f" AND e.chunk_id IN ({placeholders})", [int(x) for x in part])
+        fetched_ids, fetched_vecs = np.empty(0, dtype=np.int64), np.empty((0, store.dims), dtype=np.float32)
+        for ids, vectors in iter_blob_batches(cur, len(part)):
+            if vectors.shape[1] != store.dims:
+                log.warning("[VECTORS] dims changed %d -> %d; rebuilding store", store.dims, vectors.shape[1])
+                store.close()
+                return rebuild_vector_store(conn, root, batch=batch)
+            fetched_ids, fetched_vecs = ids, vectors
+
+        old_rows = store.find_rows(part)
+        gone = old_rows[(old_rows >= 0) & ~np.isin(part, fetched_ids)]
+
+        prev = store.find_rows(fetched_ids)
+        unchanged = np.zeros(fetched_ids.size, dtype=bool)
+        has_prev = prev >= 0
+        if has_prev.any():
+            unchanged[has_prev] = np.all(store.vectors[prev[has_prev]] == fetched_vecs[has_prev], axis=1)
+
+        replaced = prev[has_prev & ~unchanged]
+        store.tombstone(np.concatenate([gone, replaced]))
+        if (~unchanged).any():
+            store.append(fetched_ids[~unchanged], fetched_vecs[~unchanged])
+        report["appended"] += int((~unchanged).sum())
+        report["tombstoned"] += int(gone.size + replaced.size)
+
+    store.commit(hi)
+    register_consumer(conn, CONSUMER, hi)
+    pruned = prune_dirty_log(conn)
+
+    if store.rows and store.dead / store.rows > float(compact_ratio):
+        store = compact_vector_store(store)
+        report["compacted"] = True
+    report["rows"] = store.count
+    log.info("[VECTORS] sync done dirty_chunks=%d appended=%d tombstoned=%d live=%d dead=%d pruned_log=%d", report["dirty_chunks"], report["appended"], report["tombstoned"], store.count, store.dead, pruned)
+    store.close()
+    return report
+
+def sync_vector_store_from_cfg(conn: sqlite3.Connection, cfg: dict) -> dict | None:
+    if not vector_store_enabled(cfg):
+        return None
+    vs_cfg = cfg.get("vector_store", {}) or {}
+    return sync_vector_store(conn, resolve_vector_store_dir(cfg), batch=int(vs_cfg.get("batch_size", 4096)), compact_ratio=float(vs_cfg.get("compact_ratio", 0.25)))
+
+def open_synced_vector_store(cfg: dict) -> VectorStore | None:
+    if not vector_store_enabled(cfg):
+        return None
+    conn = connect(str(resolve_db_path(cfg)))
+    try:
+        sync_vector_store_from_cfg(conn, cfg)
+    finally:
+        conn.close()
+    return open_vector_store(cfg)
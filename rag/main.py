@@ -7,13 +7,19 @@ import argparse
 from dotenv import load_dotenv
 from pathlib import Path
 
-from core.db import connect, ensure_db
+from core.db import connect, ensure_db, load_document_validators
 from core.embed import embed
-from core.paths import resolve_db_path
-from core.faiss import build_faiss_from_sqlite
+from core.embed_cache import open_embedding_cache
+from core.telemetry import open_telemetry
+from core.paths import resolve_db_path, resolve_html_fixtures_dir
+from core.faiss import build_faiss_from_sqlite, update_faiss_from_sqlite, benchmark_faiss_load
+from core.faiss_autotune import autotune_faiss
+from core.pipeline import deactivate_documents
+from core.compression import load_zstd_dictionaries, train_zstd_dictionaries, recompress_archives, compare_embedding_recall, migrate_embedding_dtype
 from core.fts import sync_dirty_chunks_fts, mark_all_active_docs_dirty, rebuild_chunks_fts
 from core.parent import rebuild_parent_map, sync_dirty_parent_docs, mark_all_active_docs_parent_dirty
 from core.turbovec import build_turbovec_from_sqlite
+from core.vector_store import sync_vector_store_from_cfg, vector_store_enabled
 from core.splade import build_splade_from_sqlite
 
 from graph.build_graph import build_graph
@@ -21,12 +27,14 @@ from graph.neo4j_client import Neo4jClient
 from graph.schema import ensure_schema
 
 from utils.filters import Filters
-from utils.audit import audit_integrity, audit_faiss_against_sqlite, audit_turbovec_against_sqlite
+from utils.audit import audit_integrity, audit_faiss_against_sqlite, audit_turbovec_against_sqlite, compression_stats, benchmark_html_extraction
 from utils.logging_setup import setup_logging
-from utils.thread import producer, ingest_consumer
+from utils.thread import producer, preprocess_worker, ingest_consumer
 from utils.repair import repair_database
 
-from adapters.kqm import load_kqm_tcl_docs
+from qna.search_bench import benchmark_batch_search
+
+from adapters.kqm import load_kqm_tcl_docs, record_kqm_commit
 from adapters.wiki import load_fandom_docs
 from adapters.html import crawl_site
 
@@ -45,6 +53,15 @@ def merge_regex(global_pat: str | None, source_pat: str | None) -> str | None:
         return s
     return None
 
+def log_compression_stats(stats) -> None:
+    log = logging.getLogger(__name__)
+    log.info("[ZSTD] docs rows=%d avg_raw=%s avg_zst=%s ratio=%s | chunks rows=%d avg_raw=%s avg_zst=%s ratio=%s", stats.docs_rows, stats.docs_avg_raw, stats.docs_avg_zst, stats.docs_ratio, stats.chunks_rows, stats.chunks_avg_raw, stats.chunks_avg_zst, stats.chunks_ratio)
+    for kind, bench in stats.benchmark.items():
+        for label in ("plain", "dict"):
+            if label in bench:
+                b = bench[label]
+                log.info("[ZSTD] %s %-5s dict_id=%d ratio=%.3f compress=%.1f MB/s decompress=%.1f MB/s samples=%d stored_dicts=%s", kind, label, b["dict_id"], b["ratio"], b["compress_mb_s"], b["decompress_mb_s"], bench["samples"], bench.get("stored_dict_ids"))
+
 def main():
     project_root = Path(__file__).resolve().parent.parent
     load_dotenv(project_root / ".env")
@@ -55,6 +72,10 @@ def main():
     ap.add_argument("--FAISS_MIGRATE", default="False")
     ap.add_argument("--FAISS_AUDIT", default="False")
     ap.add_argument("--FAISS_OVERWRITE", default="False")
+    ap.add_argument("--FAISS_UPDATE", default="False")
+    ap.add_argument("--FAISS_AUTOTUNE", default="False")
+    ap.add_argument("--FAISS_LOAD_BENCH", default="False")
+    ap.add_argument("--SEARCH_BENCH", default="False")
     ap.add_argument("--TURBOVEC_MIGRATE", default="False")
     ap.add_argument("--TURBOVEC_AUDIT", default="False")
     ap.add_argument("--TURBOVEC_OVERWRITE", default="False")
@@ -72,6 +93,12 @@ def main():
     ap.add_argument("--GRAPH_FORCE", default="False")
     ap.add_argument("--GRAPH_PRUNE", default="True")
     ap.add_argument("--GRAPH_LIMIT", type=int, default=None)
+    ap.add_argument("--ZSTD_TRAIN", default="False")
+    ap.add_argument("--ZSTD_RECOMPRESS", default="False")
+    ap.add_argument("--HTML_BENCH", default="False")
+    ap.add_argument("--VECTOR_SYNC", default="False")
+    ap.add_argument("--EMBED_RECALL", default="False")
+    ap.add_argument("--EMBED_MIGRATE", default="False")
     ap.add_argument("--BACKEND", default=None, choices=["ollama", "llamacpp", "llama.cpp"])
     args = ap.parse_args()
 
@@ -84,6 +111,10 @@ def main():
     do_turbovec_audit = parse_bool(args.TURBOVEC_AUDIT)
     do_db_repair = parse_bool(args.DB_REPAIR)
     faiss_overwrite = parse_bool(args.FAISS_OVERWRITE)
+    do_faiss_update = parse_bool(args.FAISS_UPDATE)
+    do_faiss_autotune = parse_bool(args.FAISS_AUTOTUNE)
+    do_faiss_load_bench = parse_bool(args.FAISS_LOAD_BENCH)
+    do_search_bench = parse_bool(args.SEARCH_BENCH)
     do_fts_sync = parse_bool(args.FTS_SYNC)
     do_fts_init = parse_bool(args.FTS_INIT)
     do_fts_rebuild = parse_bool(args.FTS_REBUILD)
@@ -95,6 +126,12 @@ def main():
     do_graph_sync = parse_bool(args.GRAPH_SYNC)
     graph_force = parse_bool(args.GRAPH_FORCE)
     graph_prune = parse_bool(args.GRAPH_PRUNE)
+    do_zstd_train = parse_bool(args.ZSTD_TRAIN)
+    do_zstd_recompress = parse_bool(args.ZSTD_RECOMPRESS)
+    do_html_bench = parse_bool(args.HTML_BENCH)
+    do_vector_sync = parse_bool(args.VECTOR_SYNC)
+    do_embed_recall = parse_bool(args.EMBED_RECALL)
+    do_embed_migrate = parse_bool(args.EMBED_MIGRATE)
 
     with open("rag/config.yaml") as f:
         cfg = yaml.safe_load(f)
@@ -108,9 +145,16 @@ def main():
     db_path = resolve_db_path(cfg)
     ensure_db(str(db_path))
     log.info("[INFO] Database init at %s", db_path)
+    conn = connect(str(db_path))
+    try:
+        load_zstd_dictionaries(conn, cfg)
+    finally:
+        conn.close()
+
+    def embed_fn(text_or_texts, mode: str = "passage", title=None, observer=None, backoff=None):
+        return embed(cfg, text_or_texts, backend=args.BACKEND, mode=mode, title=title, observer=observer, backoff=backoff)
 
-    def embed_fn(text_or_texts, mode: str = "passage", title=None):
-        return embed(cfg, text_or_texts, backend=args.BACKEND, mode=mode, title=title)
+    embed_cache = open_embedding_cache(cfg, args.BACKEND) if (do_crawl or do_db_repair) else None
     
     def make_source_filters(s: dict) -> Filters:
         merged_deny_url = merge_regex(cfg.get("filters", {}).get("deny_url_regex"), s.get("deny_url_regex"))
@@ -129,10 +173,30 @@ def main():
     log.info("[INFO] Setting up multi-threading: embed_queue=%d document_queue=%d workers=%d", embed_queue_size, document_queue_size, embed_workers)
     log.info("[INFO] runtime embedding_provider=%s qa_provider=%s accelerator=%s", cfg.get("runtime", {}).get("embedding_provider", "ollama"), cfg.get("runtime", {}).get("qa_provider", "ollama"), cfg.get("runtime", {}).get("accelerator", "auto"))
     
+    if do_zstd_train:
+        conn = connect(str(db_path))
+        try:
+            rep = train_zstd_dictionaries(conn, cfg)
+            log.info("[ZSTD] dictionary training done %s", {k: {"dict_id": v["dict_id"], "samples": v["samples"]} for k, v in rep.items()})
+        finally:
+            conn.close()
+
+    if do_html_bench:
+        fixtures_dir = resolve_html_fixtures_dir(cfg)
+        rep = benchmark_html_extraction(fixtures_dir)
+        if not rep["pages"]:
+            log.warning("[HTML_BENCH] no fixture pages found in %s", fixtures_dir)
+        else:
+            log.info("[HTML_BENCH] pages=%d reference=%.1f pages/s fast=%.1f pages/s speedup=%.2fx mismatches=%d", rep["pages"], rep["reference_pages_s"], rep["fast_pages_s"], rep["speedup"], len(rep["mismatches"]))
+            for url in rep["mismatches"][:20]:
+                log.warning("[HTML_BENCH] output differs url=%s", url)
+
     if do_crawl:
         q = queue.Queue(maxsize=document_queue_size)
+        telemetry = open_telemetry(cfg)
 
         producers = []
+        kqm_commits: list[tuple[str, str, str]] = []
         tier_map = {}
         weight_map = {}
 
@@ -148,14 +212,27 @@ def main():
             weight_map[name] = s.get("weight", 1.0)
 
             if kind == "github":
-                docs_iter = load_kqm_tcl_docs(s)
+                def deactivate_deleted(urls: list[str], source: str = name) -> None:
+                    conn = connect(str(db_path))
+                    try:
+                        deactivate_documents(conn, source, urls, reason="source_deleted")
+                    finally:
+                        conn.close()
+
+                s_resolved = {**s, "state_file": str(db_path.parent / f"{name}_last_commit.txt")}
+                docs_iter = load_kqm_tcl_docs(s_resolved, on_deleted=deactivate_deleted, on_complete=lambda head, source=name, state_file=s_resolved["state_file"]: kqm_commits.append((source, state_file, head)))
 
             elif kind == "fandom_api":
                 raw_max = s.get("max_pages", 200)
                 max_pages = int(raw_max) if raw_max is not None else None
                 rate = float(s.get("rate_limit_s", 1.0))
                 s_resolved = {**s, "state_file": str(db_path.parent / "fandom_last_run.txt")}
-                docs_iter = load_fandom_docs(s_resolved, rate_limit_s=rate, max_pages=max_pages)
+                conn = connect(str(db_path))
+                try:
+                    validators = load_document_validators(conn, name)
+                finally:
+                    conn.close()
+                docs_iter = load_fandom_docs(s_resolved, rate_limit_s=rate, max_pages=max_pages, validators=validators)
             
             elif kind in {"honey_html", "game8_html", "genshingg_html"}:
                 seeds = s.get("seeds", [])
@@ -171,16 +248,34 @@ def main():
                 for seed in seeds:
                     if not source_filters.url_allowed(seed):
                         raise RuntimeError(f"[CRAWLER_CONFIG] source={name} seed rejected by its own filters: {seed}")
-                docs_iter = crawl_site(base_url, seeds, source_filters.deny_url, source_filters.allow_url, rate_limit_s=rate, max_pages=max_pages, allowed_langs="EN")
+                validators = {}
+                if not s.get("force_rebuild"):
+                    conn = connect(str(db_path))
+                    try:
+                        validators = load_document_validators(conn, name)
+                    finally:
+                        conn.close()
+                frontier_path = str(db_path.parent / f"{name}_frontier.sqlite")
+                fixtures_dir = str(resolve_html_fixtures_dir(cfg)) if parse_bool((cfg.get("html_extraction", {}) or {}).get("capture_fixtures", False)) else None
+                docs_iter = crawl_site(base_url, seeds, source_filters.deny_url, source_filters.allow_url, rate_limit_s=rate, max_pages=max_pages, allowed_langs="EN", validators=validators, frontier_path=frontier_path, fixtures_dir=fixtures_dir)
             else:
                 log.warning(f"[WARN] Not implemented kind={kind}, skipping")
 
             if docs_iter is None:
                 continue
-            t = threading.Thread(target=producer, args=(name, docs_iter, q, source_filters))
+            t = threading.Thread(target=producer, args=(name, docs_iter, q, source_filters, telemetry))
             producers.append(t)
 
-        t_ingest = threading.Thread(target=ingest_consumer, args=(len(producers), q, str(db_path), embed_fn, cfg, filters, tier_map, weight_map, embed_workers, embed_queue_size))
+        prepared_q = queue.Queue(maxsize=document_queue_size)
+        if telemetry is not None:
+            telemetry.watch_queue("doc_q", q)
+            telemetry.watch_queue("prepared_q", prepared_q)
+            telemetry.start()
+        preprocess_report: dict = {}
+        ingest_report: dict = {}
+        t_preprocess = threading.Thread(target=preprocess_worker, args=(len(producers), q, prepared_q, cfg, filters, tier_map, weight_map), kwargs={"telemetry": telemetry, "report": preprocess_report, "db_path": str(db_path)})
+        t_ingest = threading.Thread(target=ingest_consumer, args=(len(producers), prepared_q, str(db_path), embed_fn, cfg, embed_workers, embed_queue_size, args.BACKEND, embed_cache, telemetry), kwargs={"report": ingest_report})
+        t_preprocess.start()
         t_ingest.start()
         for t in producers:
             t.start()
@@ -188,13 +283,25 @@ def main():
         for t in producers:
             t.join()
         q.join()
+        t_preprocess.join()
+        prepared_q.join()
         t_ingest.join()
+        if telemetry is not None:
+            telemetry.stop()
+
+        # A KQM commit is recorded only when every doc made it through; otherwise the next run diffs from the previous commit again.
+        ingest_clean = bool(preprocess_report.get("completed")) and not preprocess_report.get("failed") and bool(ingest_report.get("completed")) and not ingest_report.get("failed") and not ingest_report.get("embed_failed")
+        for source, state_file, head in kqm_commits:
+            if ingest_clean:
+                record_kqm_commit(state_file, head, source)
+            else:
+                log.warning("[KQM] %s not recording commit %s: preprocess_failed=%s ingest_failed=%s embed_failed=%s", source, head[:7], preprocess_report.get("failed", "n/a"), ingest_report.get("failed", "n/a"), ingest_report.get("embed_failed", "n/a"))
 
     if do_db_repair:
         conn = connect(str(db_path))
         log.info("[INFO] DB repair starting")
         try:
-            rep = repair_database(conn, embed_fn, cfg)
+            rep = repair_database(conn, embed_fn, cfg, embed_cache=embed_cache)
             log.info("[REPAIR] docs_no_active_chunks: found=%d repaired=%d | missing_embeddings: found=%d repaired=%d", rep["docs_no_active_chunks_found"], rep["docs_no_active_chunks_repaired"], rep["chunks_missing_embeddings_found"], rep["chunks_missing_embeddings_repaired"])
         except Exception:
             log.exception("[REPAIR] Database repair failed")
@@ -204,6 +311,9 @@ def main():
             except Exception:
                 pass
 
+    if embed_cache is not None:
+        embed_cache.close()
+
     if do_fts_rebuild:
         conn = connect(str(db_path))
         try:
@@ -240,6 +350,25 @@ def main():
         finally:
             conn.close()
 
+    if do_zstd_recompress:
+        conn = connect(str(db_path))
+        try:
+            log_compression_stats(compression_stats(conn, benchmark_sample=2000))
+            recompress_archives(conn, cfg)
+            log_compression_stats(compression_stats(conn, benchmark_sample=2000))
+        finally:
+            conn.close()
+
+    if do_embed_recall or do_embed_migrate:
+        conn = connect(str(db_path))
+        try:
+            comp_cfg = cfg.get("compression", {}) or {}
+            compare_embedding_recall(conn, cfg, queries=int(comp_cfg.get("embedding_recall_queries", 200)), k=int(comp_cfg.get("embedding_recall_k", 10)))
+            if do_embed_migrate:
+                migrate_embedding_dtype(conn, cfg)
+        finally:
+            conn.close()
+
     if do_db_audit:
         conn = connect(str(db_path))
         log.info("[INFO] Audit starting")
@@ -262,6 +391,7 @@ def main():
 
                 raise RuntimeError(f"[AUDIT] Audit failed: {len(report.failures)} problems")
             log.info("[AUDIT] SQLite integrity OK, all requested stages completed successfully")
+            log_compression_stats(compression_stats(conn, benchmark_sample=2000))
         except Exception:
             log.exception("[AUDIT] terminated due to audit/migrate failures")
             raise
@@ -292,9 +422,33 @@ def main():
         finally:
             conn.close()
     
+    if vector_store_enabled(cfg) and (do_vector_sync or do_crawl or do_db_repair):
+        conn = connect(str(db_path))
+        try:
+            rep = sync_vector_store_from_cfg(conn, cfg)
+            log.info("[VECTORS] %s sync done rows=%d appended=%d tombstoned=%d compacted=%s", rep["mode"], rep["rows"], rep["appended"], rep["tombstoned"], rep["compacted"])
+        finally:
+            conn.close()
+
     if do_faiss_migrate:
         log.info("[MIGRATE] FAISS migrate from SQLite3 starting")
         build_faiss_from_sqlite(cfg, overwrite=faiss_overwrite)
+    elif do_faiss_update:
+        log.info("[MIGRATE] FAISS incremental update from SQLite3 starting")
+        update_faiss_from_sqlite(cfg)
+
+    if do_faiss_autotune:
+        log.info("[FAISS_TUNE] autotune starting")
+        rep = autotune_faiss(cfg, backend=args.BACKEND)
+        log.info("[FAISS_TUNE] done index_mode=%s params=%s recall@%d=%.4f p50=%.3fms", rep["index_mode"], rep["params"], rep["k"], rep["recall_at_k"], rep["p50_ms"])
+
+    if do_faiss_load_bench:
+        log.info("[FAISS_LOAD] load benchmark starting")
+        benchmark_faiss_load(cfg)
+
+    if do_search_bench:
+        log.info("[SEARCH_BENCH] sequential vs batched search starting")
+        benchmark_batch_search(cfg)
 
     if do_turbovec_migrate:
         log.info("[TURBOVEC] migrate from SQLite3 starting")
@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, Callable
+
+from .resources import RESOURCES
+
+log = logging.getLogger(__name__)
+
+DEFAULT_CHANNEL_TIMEOUT_S = 30.0
+
+def channel_pool(workers: int) -> ThreadPoolExecutor:
+    return RESOURCES.get(("fusion_channels",), workers, lambda: ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fusion-channel"))
+
+def channel_timeouts(retrieval_cfg: dict) -> dict[str, float]:
+    raw = retrieval_cfg.get("channel_timeout_s", DEFAULT_CHANNEL_TIMEOUT_S)
+    if isinstance(raw, dict):
+        return {str(name): float(value) for name, value in raw.items()}
+    return {"default": float(raw)}
+
+def run_channels(tasks: dict[str, Callable[[], Any]], *, workers: int, timeouts: dict[str, float]) -> tuple[dict[str, Any], dict[str, float], dict[str, str]]:
+    """Run independent retrieval channels and return ``(results, wall_ms, errors)``.
+
+    Channels run on a shared pool of ``workers`` threads (inline when it is 1).
+    A channel that raises or outlives its timeout is left out of ``results``
+    and named in ``errors``; a timed-out search keeps its worker until it
+    returns, but its result is discarded.
+    """
+    results: dict[str, Any] = {}
+    wall_ms: dict[str, float] = {}
+    errors: dict[str, str] = {}
+
+    def timed(name: str, task: Callable[[], Any]):
+        t0 = time.perf_counter()
+        try:
+            return task()
+        finally:
+            wall_ms[name] = (time.perf_counter() - t0) * 1000
+
+    if workers <= 1 or len(tasks) <= 1:
+        for name, task in tasks.items():
+            try:
+                results[name] = timed(name, task)
+            except Exception as exc:
+                errors[name] = f"{type(exc).__name__}: {exc}"
+        return results, wall_ms, errors
+
+    pool = channel_pool(workers)
+    started = time.perf_counter()
+    futures = {name: pool.submit(timed, name, task) for name, task in tasks.items()}
+    for name, future in futures.items():
+        timeout_s = timeouts.get(name, timeouts.get("default", DEFAULT_CHANNEL_TIMEOUT_S))
+        try:
+            results[name] = future.result(timeout=max(0.0, started + timeout_s - time.perf_counter()))
+        except FutureTimeoutError:
+            future.cancel()
+            errors[name] = f"timeout after {timeout_s:.1f}s"
+            wall_ms.setdefault(name, timeout_s * 1000)
+        except Exception as exc:
+            errors[name] = f"{type(exc).__name__}: {exc}"
+    return results, dict(wall_ms), errors
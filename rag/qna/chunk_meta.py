@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+import logging
+import sqlite3
+import time
+from pathlib import Path
+
+import numpy as np
+
+from .resources import RESOURCES
+
+log = logging.getLogger(__name__)
+
+NO_VERSION = -1
+
+def database_generation(db_path: str | Path) -> tuple:
+    # In WAL mode a commit only touches the -wal file; a checkpoint touches the main file.
+    stamps = []
+    for path in (Path(db_path), Path(f"{db_path}-wal")):
+        try:
+            stat = path.stat()
+            stamps.append((stat.st_mtime_ns, stat.st_size))
+        except FileNotFoundError:
+            stamps.append(None)
+    return tuple(stamps)
+
+def factorize(values: list) -> tuple[np.ndarray, list]:
+    vocab: dict = {}
+    codes = np.fromiter((vocab.setdefault(v, len(vocab)) for v in values), dtype=np.int32, count=len(values))
+    return codes, list(vocab)
+
+class ChunkMetaCache:
+    """Query-time chunk and doc metadata as NumPy columns, sorted by chunk_id.
+
+    Chunk columns (``doc_id``, ``source``, ``tier``, ``weight``,
+    ``version_ord``, ``title``, ``chunk_index``, ``live``) are aligned with
+    ``chunk_ids``; ``source``, ``tier`` and ``title`` are codes into the
+    ``sources``, ``tiers`` and ``titles`` vocabularies, and a missing
+    ``version_ord`` is ``NO_VERSION``. ``live`` is the same active test
+    ``fetch_chunks`` applies. Doc-level columns back the per-request lookups
+    that only need ``docs``.
+    """
+
+    def __init__(self, conn: sqlite3.Connection):
+        t0 = time.perf_counter()
+        docs = conn.execute("""
+            SELECT doc_id, source, tier, weight, version_ord, version_label, title, fetched_at, COALESCE(status, 1) = 1
+            FROM docs
+            ORDER BY doc_id
+        """).fetchall()
+        self.doc_ids = np.fromiter((r[0] for r in docs), dtype=np.int64, count=len(docs))
+        doc_source, self.sources = factorize([r[1] or "" for r in docs])
+        doc_tier, self.tiers = factorize([r[2] or "" for r in docs])
+        doc_weight = np.fromiter((r[3] if r[3] is not None else np.nan for r in docs), dtype=np.float32, count=len(docs))
+        self.doc_version_ord = np.fromiter((r[4] if r[4] is not None else NO_VERSION for r in docs), dtype=np.int64, count=len(docs))
+        self.doc_version_label = [r[5] for r in docs]
+        doc_title, self.titles = factorize([(r[6] or "").strip() for r in docs])
+        self.doc_fetched_at = [r[7] or "" for r in docs]
+        self.doc_source = doc_source
+        self.doc_live = np.fromiter((bool(r[8]) for r in docs), dtype=bool, count=len(docs))
+        del docs
+
+        chunks = conn.execute("SELECT chunk_id, doc_id, COALESCE(chunk_index, -1), is_active = 1 FROM chunks ORDER BY chunk_id").fetchall()
+        self.chunk_ids = np.fromiter((r[0] for r in chunks), dtype=np.int64, count=len(chunks))
+        chunk_docs = np.fromiter((r[1] for r in chunks), dtype=np.int64, count=len(chunks))
+        self.chunk_index = np.fromiter((r[2] for r in chunks), dtype=np.int32, count=len(chunks))
+        chunk_live = np.fromiter((bool(r[3]) for r in chunks), dtype=bool, count=len(chunks))
+        del chunks
+
+        doc_rows = np.searchsorted(self.doc_ids, chunk_docs)
+        has_doc = doc_rows < self.doc_ids.size
+        has_doc[has_doc] = self.doc_ids[doc_rows[has_doc]] == chunk_docs[has_doc]
+        doc_rows = np.where(has_doc, doc_rows, 0)
+
+        def gather(column: np.ndarray, missing) -> np.ndarray:
+            if not column.size:
+                return np.full(chunk_docs.size, missing, dtype=column.dtype)
+            return np.where(has_doc, column[doc_rows], missing).astype(column.dtype)
+
+        self.doc_id = chunk_docs
+        self.source = gather(doc_source, -1)
+        self.tier = gather(doc_tier, -1)
+        self.weight = gather(doc_weight, np.nan)
+        self.version_ord = gather(self.doc_version_ord, NO_VERSION)
+        self.title = gather(doc_title, -1)
+        self.live = chunk_live & gather(self.doc_live, False)
+        log.info("[CHUNK_META] loaded chunks=%d docs=%d sources=%d in %.2fs", self.chunk_ids.size, self.doc_ids.size, len(self.sources), time.perf_counter() - t0)
+
+    def positions(self, chunk_ids) -> tuple[np.ndarray, np.ndarray]:
+        """Row of each chunk_id in the columns, and whether it was found."""
+        ids = np.asarray(chunk_ids, dtype=np.int64)
+        if not self.chunk_ids.size:
+            return np.zeros(ids.shape, dtype=np.int64), np.zeros(ids.shape, dtype=bool)
+        pos = np.minimum(np.searchsorted(self.chunk_ids, ids), self.chunk_ids.size - 1)
+        return pos, self.chunk_ids[pos] == ids
+
+    def source_codes(self, names) -> np.ndarray:
+        wanted = set(names)
+        return np.array([code for code, name in enumerate(self.sources) if name in wanted], dtype=np.int32)
+
+    def sources_of(self, chunk_ids) -> np.ndarray:
+        pos, found = self.positions(chunk_ids)
+        return np.where(found, self.source[pos], -1)
+
+    def kqm_news_baseline(self, max_version_ord: int) -> tuple[str | None, int | None]:
+        mask = self.doc_live & (self.doc_version_ord != NO_VERSION) & (self.doc_version_ord <= max_version_ord) & np.isin(self.doc_source, self.source_codes(["kqm_news"]))
+        rows = np.flatnonzero(mask)
+        if not rows.size:
+            return None, None
+        best = max(rows, key=lambda row: (int(self.doc_version_ord[row]), self.doc_fetched_at[row]))
+        return self.doc_version_label[best], int(self.doc_version_ord[best])
+
+def get_chunk_meta(conn: sqlite3.Connection, db_path: str | Path) -> ChunkMetaCache:
+    """Process-wide metadata cache for ``db_path``, rebuilt when the database generation changes."""
+    path = Path(db_path).expanduser().resolve()
+    return RESOURCES.get(("chunk_meta", str(path)), database_generation(path), lambda: ChunkMetaCache(conn))
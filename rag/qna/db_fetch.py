@@ -1,7 +1,14 @@
 from __future__ import annotations
 import sqlite3
 
-def fetch_chunks(conn: sqlite3.Connection, chunk_ids: list[int]) -> list[dict]:
+import numpy as np
+
+from .chunk_meta import NO_VERSION, ChunkMetaCache
+
+def new_fetch_stats() -> dict[str, int]:
+    return {"record_rows": 0, "fetched_rows": 0, "hydrate_calls": 0, "text_bytes": 0}
+
+def fetch_chunks(conn: sqlite3.Connection, chunk_ids: list[int], *, stats: dict | None = None) -> list[dict]:
     if not chunk_ids:
         return []
 
@@ -29,5 +36,71 @@ def fetch_chunks(conn: sqlite3.Connection, chunk_ids: list[int]) -> list[dict]:
     """, chunk_ids)
 
     rows = [dict(r) for r in cur.fetchall()]
+    if stats is not None:
+        stats["fetched_rows"] += len(rows)
+        stats["text_bytes"] += sum(len((r["text"] or "").encode("utf-8")) for r in rows)
     row_map = {int(r["chunk_id"]): r for r in rows}
-    return [row_map[cid] for cid in chunk_ids if cid in row_map]
\ No newline at end of file
+    return [row_map[cid] for cid in chunk_ids if cid in row_map]
+
+def fetch_chunk_records(meta: ChunkMetaCache, chunk_ids: list[int], *, stats: dict | None = None) -> list[dict]:
+    """Text-free candidate rows for ``chunk_ids``, built from the metadata cache.
+
+    Records carry the ranking columns of ``fetch_chunks`` (ids, ``chunk_index``,
+    ``source``, ``title``, ``tier``, ``weight`` and version) but no ``text``,
+    ``url`` or dates; ``hydrate_chunks`` fills those in for the rows that get
+    that far. Inactive chunks are skipped just as ``fetch_chunks`` skips them.
+    """
+    if not chunk_ids:
+        return []
+
+    pos, found = meta.positions(chunk_ids)
+    keep = np.flatnonzero(found & meta.live[pos])
+    pos = pos[keep]
+    doc_ids = meta.doc_id[pos]
+    doc_rows = np.searchsorted(meta.doc_ids, doc_ids).tolist()
+    records = [
+        {
+            "chunk_id": chunk_id,
+            "chunk_index": chunk_index if chunk_index >= 0 else None,
+            "doc_id": doc_id,
+            "source": meta.sources[source] if source >= 0 else None,
+            "title": meta.titles[title] if title >= 0 else None,
+            "tier": meta.tiers[tier] if tier >= 0 else None,
+            "weight": weight if weight == weight else None,
+            "version_label": meta.doc_version_label[doc_row],
+            "version_ord": version_ord if version_ord != NO_VERSION else None,
+        }
+        for chunk_id, chunk_index, doc_id, source, title, tier, weight, version_ord, doc_row in zip(
+            meta.chunk_ids[pos].tolist(), meta.chunk_index[pos].tolist(), doc_ids.tolist(), meta.source[pos].tolist(),
+            meta.title[pos].tolist(), meta.tier[pos].tolist(), meta.weight[pos].tolist(), meta.version_ord[pos].tolist(), doc_rows,
+        )
+    ]
+    if stats is not None:
+        stats["record_rows"] += len(records)
+    return records
+
+def hydrate_chunks(conn: sqlite3.Connection, rows: list[dict], *, limit: int | None = None, stats: dict | None = None) -> list[dict]:
+    """Fill ``rows[:limit]`` out to full ``fetch_chunks`` rows with one batched read.
+
+    Rows that already carry ``text`` are left as they are and the rest are
+    updated in place. A chunk deactivated since its record was built is
+    dropped, as ``fetch_chunks`` would have dropped it; rows past ``limit``
+    are returned untouched.
+    """
+    head = rows if limit is None else rows[:max(0, int(limit))]
+    missing = [int(row["chunk_id"]) for row in head if "text" not in row]
+    if not missing:
+        return rows
+
+    fetched = {int(row["chunk_id"]): row for row in fetch_chunks(conn, missing, stats=stats)}
+    if stats is not None:
+        stats["hydrate_calls"] += 1
+    hydrated = []
+    for row in head:
+        if "text" not in row:
+            full = fetched.get(int(row["chunk_id"]))
+            if full is None:
+                continue
+            row.update(full)
+        hydrated.append(row)
+    return hydrated + rows[len(head):]
@@ -2,16 +2,25 @@ from __future__ import annotations
 
 import logging
 import re
+import threading
+import time
+import numpy as np
 from pathlib import Path
 
 from core.embed import embed
-from core.paths import resolve_db_path, resolve_faiss_dir, resolve_storage_root, resolve_splade_dir
+from core.paths import resolve_db_path, resolve_faiss_dir, resolve_storage_root, resolve_splade_dir, resolve_vector_store_dir
+from core.vector_store import VectorStore, vector_store_enabled
+from core.exact_search import ExactSearchIndex
+from core.faiss import faiss_load_mode
 from core.hyde import generate_hyde_document
 from .utils import normalize_query_vec, is_broad_question, chunk_batch, rerank_chunks, dedupe_chunks, detect_intent, filter_by_intent_source, as_bool, get_kqm_news_fetch_version_baseline, prefer_entity_seed_chunks, expected_model_from_cfg, make_intent_fts5_query, get_bm25_weights, detect_build_subtypes, extract_lookup_entity, make_retrieval_cache_key, retrieval_result_from_cache, retrieval_result_to_cache, build_weighted_rrf_signal, build_grounded_answer_prompt, merge_context_preserving_seeds, trim_chunks_to_context_budget, normalized_phrase, extract_lookup_target, normalize_model_name, resolve_lookup_entity_from_chunks, normalize_title_key, extract_build_entity, extract_entity_terms, is_build_recommendation_question
+from .pre_retrieval import PreRetrieval
+from .chunk_meta import get_chunk_meta
+from .channel_executor import channel_timeouts, run_channels
 from .retrievers import FaissRetriever, SqliteEmbeddingRetriever, BM25Retriever, TurboVecRetriever, SpladeRetriever
 from .retrieval_cache import RetrievalCache
 from .resources import RESOURCES, path_signature
-from .db_fetch import fetch_chunks
+from .db_fetch import fetch_chunk_records, fetch_chunks, hydrate_chunks, new_fetch_stats
 from .prompts import build_context, summarize_chunk_group, synthesize_final_answer
 from .generators import generate
 from .cross_encoder import cross_encoder_rerank
@@ -105,6 +114,9 @@ def retrieve_question_context_uncached(cfg: dict, question: str, *, retriever_na
 
     hyde_document_cache: str | None = None
     q_vec_cache: dict[tuple[str, str, int], object] = {}
+    q_vec_lock = threading.Lock()
+    fusion_channel_runs: list[dict] = []
+    pre_retrieval: PreRetrieval | None = None
     log.info("[RESOURCE] process cache status=%s", RESOURCES.status())
     hyde_used_for_request = False
     hyde_fallback_reason: str | None = None
@@ -125,17 +137,33 @@ def retrieve_question_context_uncached(cfg: dict, question: str, *, retriever_na
         model_key = normalize_model_name(getattr(ret, "model", "")) or "runtime"
         cache_key = (effective_query, model_key, int(ret.dims))
 
-        if cache_key in q_vec_cache:
-            return q_vec_cache[cache_key]
+        # FAISS and TurboVec channels may ask for the same vector from two threads.
+        with q_vec_lock:
+            if cache_key in q_vec_cache:
+                return q_vec_cache[cache_key]
 
-        q_blob, q_dims = embed(cfg, effective_query, backend=backend, mode="query",)
+            q_blob, q_dims = embed(cfg, effective_query, backend=backend, mode="query",)
 
-        if q_dims != ret.dims:
-            raise RuntimeError(f"query embedding dims mismatch: query={q_dims} retriever={ret.dims}")
+            if q_dims != ret.dims:
+                raise RuntimeError(f"query embedding dims mismatch: query={q_dims} retriever={ret.dims}")
 
-        query_vector = normalize_query_vec(q_blob, q_dims,)
-        q_vec_cache[cache_key] = query_vector
-        return query_vector
+            query_vector = normalize_query_vec(q_blob, q_dims,)
+            q_vec_cache[cache_key] = query_vector
+            return query_vector
+
+    def get_q_vecs(ret, query_texts: list[str]) -> np.ndarray:
+        model_key = normalize_model_name(getattr(ret, "model", "")) or "runtime"
+        effective_queries = [query_text.strip() for query_text in query_texts]
+        with q_vec_lock:
+            missing = list(dict.fromkeys(q for q in effective_queries if (q, model_key, int(ret.dims)) not in q_vec_cache))
+
+            if missing:
+                for query_text, (q_blob, q_dims) in zip(missing, embed(cfg, missing, backend=backend, mode="query")):
+                    if q_dims != ret.dims:
+                        raise RuntimeError(f"query embedding dims mismatch: query={q_dims} retriever={ret.dims}")
+                    q_vec_cache[(query_text, model_key, int(ret.dims))] = normalize_query_vec(q_blob, q_dims)
+
+            return np.vstack([q_vec_cache[(q, model_key, int(ret.dims))] for q in effective_queries])
 
     expected_faiss_model = expected_model_from_cfg(cfg, backend=backend)
     faiss_mismatch_policy = str(retrieval_cfg.get("faiss_model_mismatch", "error")).strip().lower()
@@ -189,7 +217,21 @@ def retrieve_question_context_uncached(cfg: dict, question: str, *, retriever_na
                 faiss_dir,
                 expected_model=expected_faiss_model,
                 mismatch_policy=faiss_mismatch_policy,
+                load_mode=faiss_load_mode(cfg),
             ))
+    def get_vector_store():
+        if not vector_store_enabled(cfg):
+            return None
+        store_dir = resolve_vector_store_dir(cfg)
+        if not (store_dir / "current" / "meta.json").exists():
+            log.warning("[QNA] vector store enabled but not built; using SQLite rows")
+            return None
+        return RESOURCES.get(("vector_store", str(store_dir)), path_signature(store_dir, ("current/meta.json",)), lambda: VectorStore(store_dir))
+
+    def get_exact_index():
+        # Loaded once per process; SqliteEmbeddingRetriever refreshes it from the dirty log on every request.
+        return RESOURCES.get(("exact_search", str(db_path)), str(db_path), lambda: ExactSearchIndex.load(conn, get_vector_store()))
+
     def get_lambdamart_ranker():
         lcfg=cfg.get("lambdamart",{}) or {}
         raw=Path(str(lcfg.get("model_path","data/models/lambdamart.txt")))
@@ -204,7 +246,10 @@ def retrieve_question_context_uncached(cfg: dict, question: str, *, retriever_na
         
         faiss_ret = get_faiss_ret()
         if hyde_document_cache is None:
-            hyde_document_cache = generate_hyde_document(cfg, question)
+            if pre_retrieval is not None and "hyde" in pre_retrieval:
+                hyde_document_cache = pre_retrieval.result("hyde")
+            else:
+                hyde_document_cache = generate_hyde_document(cfg, question)
         
         if not hyde_document_cache:
             return []
@@ -332,16 +377,15 @@ def retrieve_question_context_uncached(cfg: dict, question: str, *, retriever_na
     def search_splade(k: int, query_text: str | None = None) -> list[tuple[int, float]]:
         return get_splade_ret().search((query_text or question).strip(), k)
     
-    def search_hybrid_fusion_decomposed(name: str, k: int, *, force_hyde: bool = False, force_reason: str | None = None):
+    def search_hybrid_fusion_decomposed(name: str, k: int, *, force_hyde: bool = False, force_reason: str | None = None, original: tuple | None = None):
         decomp_cfg = cfg.get("query_decomposition", {}) or {}
         expansion_cfg = cfg.get("query_expansion", {}) or {}
-        original_results, original_signals = search_hybrid_fusion(name, k, question, force_hyde=force_hyde, force_reason=force_reason)
+        original_results, original_signals = original or search_hybrid_fusion(name, k, question, force_hyde=force_hyde, force_reason=force_reason)
 
         if decomposition_subqueries:
             runs = [(question, original_results, original_signals, float(decomp_cfg.get("original_weight", 1.0)))]
             subquery_k = min(k, int(decomp_cfg.get("candidate_k_per_subquery", 300)))
-            for subquery in decomposition_subqueries:
-                sub_results, sub_signals = search_hybrid_fusion(name, subquery_k, subquery)
+            for subquery, (sub_results, sub_signals) in zip(decomposition_subqueries, search_hybrid_fusion_batch(name, subquery_k, decomposition_subqueries)):
                 runs.append((subquery, sub_results, sub_signals, float(decomp_cfg.get("subquery_weight", 0.8))))
 
             merged_results, merged_signals = merge_query_runs(runs, rrf_k=rrf_k, rrf_scale=float(retrieval_cfg.get("rrf_scale", 10.0)), max_total_candidates=int(decomp_cfg.get("max_total_candidates", 1800)))
@@ -352,8 +396,7 @@ def retrieve_question_context_uncached(cfg: dict, question: str, *, retriever_na
             runs = [(question, original_results, original_signals, float(expansion_cfg.get("original_weight", 1.0)))]
             expansion_k = min(k, int(expansion_cfg.get("candidate_k_per_expansion", 300)))
             expansion_weight = float(expansion_cfg.get("expansion_weight", 0.70))
-            for expanded_query in expanded_queries:
-                expansion_results, expansion_signals = search_hybrid_fusion(name, expansion_k, expanded_query)
+            for expanded_query, (expansion_results, expansion_signals) in zip(expanded_queries, search_hybrid_fusion_batch(name, expansion_k, expanded_queries)):
                 runs.append((expanded_query, expansion_results, expansion_signals, expansion_weight))
 
             merged_results, merged_signals = merge_query_runs(runs, rrf_k=int(expansion_cfg.get("rrf_k", rrf_k)), rrf_scale=float(retrieval_cfg.get("rrf_scale", 10.0)), max_total_candidates=int(expansion_cfg.get("max_total_candidates", 1800)))
@@ -385,7 +428,7 @@ def retrieve_question_context_uncached(cfg: dict, question: str, *, retriever_na
         faiss_chunk_ids = [int(chunk_id) for chunk_id, _ in faiss_results[:top_n]]
         bm25_chunk_ids = [int(chunk_id) for chunk_id, _ in bm25_results[:top_n]]
         top_chunk_ids = list(dict.fromkeys(faiss_chunk_ids + bm25_chunk_ids))
-        rows = fetch_chunks(conn, top_chunk_ids)
+        rows = fetch_chunk_records(chunk_meta, top_chunk_ids, stats=fetch_stats)
         chunk_to_doc = {int(row["chunk_id"]): int(row["doc_id"]) for row in rows}
         faiss_doc_ids = {chunk_to_doc[chunk_id] for chunk_id in faiss_chunk_ids if chunk_id in chunk_to_doc}
         bm25_doc_ids = {chunk_to_doc[chunk_id] for chunk_id in bm25_chunk_ids if chunk_id in chunk_to_doc}
@@ -397,6 +440,71 @@ def retrieve_question_context_uncached(cfg: dict, question: str, *, retriever_na
 
         return (False, f"normal_retrieval_sufficient: shared_docs={len(shared_doc_ids)}")
     
+    def check_turbovec_matches_faiss(faiss_ret, tv_ret) -> None:
+        faiss_model = normalize_model_name(faiss_ret.model)
+        tv_model = normalize_model_name(tv_ret.model)
+
+        if faiss_ret.dims != tv_ret.dims:
+            raise RuntimeError(f"FAISS/TurboVec dimension mismatch: faiss={faiss_ret.dims} turbovec={tv_ret.dims}")
+
+        if faiss_model and tv_model and faiss_model != tv_model:
+            raise RuntimeError(f"FAISS/TurboVec model mismatch: faiss={faiss_ret.model!r} turbovec={tv_ret.model!r}")
+
+    def run_fusion_channels(name: str, queries: list[str], tasks: dict) -> dict:
+        started = time.perf_counter()
+        results, wall_ms, errors = run_channels(tasks, workers=int(retrieval_cfg.get("channel_workers", 4)), timeouts=channel_timeouts(retrieval_cfg))
+        total_ms = (time.perf_counter() - started) * 1000
+        fusion_channel_runs.append({"queries": list(queries), "channel_ms": {channel: round(ms, 3) for channel, ms in wall_ms.items()}, "wall_ms": round(total_ms, 3), "failed": errors})
+        log.info("[FUSION] retriever=%s queries=%d channels %s wall=%.1fms", name, len(queries), " ".join(f"{channel}={ms:.1f}ms" for channel, ms in wall_ms.items()), total_ms)
+
+        for channel, error in errors.items():
+            log.warning("[FUSION] retriever=%s channel=%s failed (%s); fusing without it", name, channel, error)
+        if not results:
+            raise RuntimeError(f"[FUSION] every channel failed for retriever={name}: {errors}")
+        return results
+
+    def fuse_channels(name: str, effective_query: str, channels: dict[str, list[tuple[int, float]]], weights: dict[str, float]):
+        signals = build_weighted_rrf_signal(channels, weights=weights, rrf_k=rrf_k, rrf_scale=float(retrieval_cfg.get("rrf_scale", 10.0)))
+        results = sorted(((cid, signal["rrf_score"]) for cid, signal in signals.items()), key=lambda item: item[1], reverse=True)
+        counts = " ".join(f"{channel}={len(values)}" for channel, values in channels.items())
+        log.info("[FUSION] retriever=%s query=%r %s fused=%d", name, effective_query, counts, len(results))
+        return results, signals
+
+    def search_hybrid_fusion_batch(name: str, k: int, query_texts: list[str]):
+        """Fuse several non-original queries with one batched search per channel."""
+        if len(query_texts) <= 1 or question.strip() in (q.strip() for q in query_texts):
+            return [search_hybrid_fusion(name, k, query_text) for query_text in query_texts]
+
+        spec = HYBRID_FUSION_SPECS[name]
+        effective_queries = [(query_text or question).strip() for query_text in query_texts]
+        tasks = {"bm25": lambda: [search_bm25(k, q) for q in effective_queries]}
+        weights = {"bm25": float(retrieval_cfg.get("bm25_rrf_weight", 1.0))}
+
+        faiss_ret = None
+        if "faiss" in spec:
+            faiss_ret = get_faiss_ret()
+            tasks["faiss"] = lambda: faiss_ret.search_batch(get_q_vecs(faiss_ret, effective_queries), k)
+            weights["faiss"] = float(retrieval_cfg.get("faiss_rrf_weight", 1.0))
+
+        if "turbovec" in spec:
+            tv_ret = get_turbovec_ret()
+            if faiss_ret is not None:
+                check_turbovec_matches_faiss(faiss_ret, tv_ret)
+            tv_k = min(k, int(tv_cfg.get("candidate_k", k)))
+            tasks["turbovec"] = lambda: tv_ret.search_batch(get_q_vecs(tv_ret, effective_queries), tv_k)
+            weights["turbovec"] = float(tv_cfg.get("rrf_weight", 0.5 if "faiss" in spec else 1.0))
+
+        if "splade" in spec:
+            splade_cfg = cfg.get("splade", {}) or {}
+            splade_k = min(k, int(splade_cfg.get("candidate_k", 300)))
+            splade_ret = get_splade_ret()
+            tasks["splade"] = lambda: splade_ret.search_batch(effective_queries, splade_k)
+            weights["splade"] = float(splade_cfg.get("rrf_weight", 0.75))
+
+        channel_results = run_fusion_channels(name, effective_queries, tasks)
+        per_query = [{channel: hits[i] for channel, hits in channel_results.items()} for i in range(len(effective_queries))]
+        return [fuse_channels(name, q, channels, weights) for q, channels in zip(effective_queries, per_query)]
+
     def search_hybrid_fusion(name: str, k: int, query_text: str | None = None, *, force_hyde: bool = False, force_reason: str | None = None):
         nonlocal hyde_used_for_request, hyde_fallback_reason, hyde_error
 
@@ -406,43 +514,37 @@ def retrieve_question_context_uncached(cfg: dict, question: str, *, retriever_na
         weights: dict[str, float] = {}
 
         faiss_ret = None
-        faiss_results: list[tuple[int, float]] = []
-        bm25_results = search_bm25(k, effective_query)
-
-        channels["bm25"] = bm25_results
+        tasks = {"bm25": lambda: search_bm25(k, effective_query)}
         weights["bm25"] = float(retrieval_cfg.get("bm25_rrf_weight", 1.0))
 
+        # Retrievers load here so configuration errors still raise; only the searches run on the pool.
         if "faiss" in spec:
             faiss_ret = get_faiss_ret()
-            faiss_results = faiss_ret.search(get_q_vec(faiss_ret, effective_query), k)
-            channels["faiss"] = faiss_results
+            tasks["faiss"] = lambda: faiss_ret.search(get_q_vec(faiss_ret, effective_query), k)
             weights["faiss"] = float(retrieval_cfg.get("faiss_rrf_weight", 1.0))
 
         if "turbovec" in spec:
             tv_ret = get_turbovec_ret()
 
             if faiss_ret is not None:
-                faiss_model = normalize_model_name(faiss_ret.model)
-                tv_model = normalize_model_name(tv_ret.model)
-
-                if faiss_ret.dims != tv_ret.dims:
-                    raise RuntimeError(f"FAISS/TurboVec dimension mismatch: faiss={faiss_ret.dims} turbovec={tv_ret.dims}")
-
-                if faiss_model and tv_model and faiss_model != tv_model:
-                    raise RuntimeError(f"FAISS/TurboVec model mismatch: faiss={faiss_ret.model!r} turbovec={tv_ret.model!r}")
+                check_turbovec_matches_faiss(faiss_ret, tv_ret)
 
             tv_k = min(k, int(tv_cfg.get("candidate_k", k)))
-            tv_results = tv_ret.search(get_q_vec(tv_ret, effective_query), tv_k)
-            channels["turbovec"] = tv_results
+            tasks["turbovec"] = lambda: tv_ret.search(get_q_vec(tv_ret, effective_query), tv_k)
             default_tv_weight = 0.5 if "faiss" in spec else 1.0
             weights["turbovec"] = float(tv_cfg.get("rrf_weight", default_tv_weight))
 
         if "splade" in spec:
             splade_cfg = cfg.get("splade", {}) or {}
             splade_k = min(k, int(splade_cfg.get("candidate_k", 300)))
-            channels["splade"] = search_splade(splade_k, effective_query)
+            splade_ret = get_splade_ret()
+            tasks["splade"] = lambda: splade_ret.search(effective_query, splade_k)
             weights["splade"] = float(splade_cfg.get("rrf_weight", 0.75))
 
+        channels.update(run_fusion_channels(name, [effective_query], tasks))
+        bm25_results = channels.get("bm25", [])
+        faiss_results = channels.get("faiss", [])
+
         if "hyde" in spec and effective_query == question:
             if faiss_ret is None:
                 raise RuntimeError("HyDE fusion requires FAISS")
@@ -471,27 +573,39 @@ def retrieve_question_context_uncached(cfg: dict, question: str, *, retriever_na
             weights["hyde"] = float(hyde_cfg.get("rrf_weight", 0.75))
             log.info("[HYDE] mode=%s used=%s reason=%s candidates=%d", hyde_mode, bool(hyde_results), reason, len(hyde_results))
 
-        signals = build_weighted_rrf_signal(channels, weights=weights, rrf_k=rrf_k, rrf_scale=float(retrieval_cfg.get("rrf_scale", 10.0)))
-        results = sorted(((cid, signal["rrf_score"]) for cid, signal in signals.items()), key=lambda item: item[1], reverse=True)
-        counts = " ".join(f"{channel}={len(values)}" for channel, values in channels.items())
-        log.info("[FUSION] retriever=%s query=%r %s fused=%d", name, effective_query, counts, len(results))
-        return results, signals
+        return fuse_channels(name, effective_query, channels, weights)
 
     conn = RESOURCES.get_sqlite_connection(db_path)
+    chunk_meta = get_chunk_meta(conn, db_path)
+    fetch_stats = new_fetch_stats()
     retriever_name = retriever_name.strip().lower()
     if retriever_name == "sql":
         retriever_name = "sqlite"
 
+    first_pass = None
     if retriever_name in HYBRID_FUSION_SPECS:
-        decomposition_subqueries = decompose_query(cfg, question, backend=backend,)
         expansion_cfg = (
             cfg.get("query_expansion", {}) or {})
 
         query_expansion_enabled = as_bool(
             expansion_cfg.get("enabled", False))
 
-        if (query_expansion_enabled and not decomposition_subqueries):
-            retrieval_queries = (build_retrieval_queries(cfg, question, max_expansions = max(0, min(5, int(expansion_cfg.get("max_expansions", 2)))), model=(str(expansion_cfg.get("model")).strip() if expansion_cfg.get("model") else None)))
+        # Decomposition, expansion and HyDE do not depend on each other or on the first pass,
+        # so all three generate while the original question is searched.
+        pre_retrieval = PreRetrieval(cfg)
+        pre_retrieval.start("decomposition", decompose_query, cfg, question, backend=backend)
+        if query_expansion_enabled:
+            pre_retrieval.start("expansion", build_retrieval_queries, cfg, question, max_expansions = max(0, min(5, int(expansion_cfg.get("max_expansions", 2)))), model=(str(expansion_cfg.get("model")).strip() if expansion_cfg.get("model") else None))
+        if "hyde" in HYBRID_FUSION_SPECS[retriever_name] and hyde_enabled and hyde_mode in {"always", "fallback"}:
+            pre_retrieval.start("hyde", generate_hyde_document, cfg, question)
+
+        first_pass = search_hybrid_fusion(retriever_name, candidate_k, question)
+        decomposition_subqueries = pre_retrieval.result("decomposition")
+
+        if decomposition_subqueries:
+            pre_retrieval.discard("expansion", "decomposition produced subqueries")
+        elif query_expansion_enabled:
+            retrieval_queries = pre_retrieval.result("expansion")
             expanded_queries = (retrieval_queries[1:])
             log.info("[QUERY_EXPANSION] original=%r expansions=%r", question, expanded_queries)
 
@@ -502,7 +616,7 @@ def retrieve_question_context_uncached(cfg: dict, question: str, *, retriever_na
         results, retrieval_signals = build_single_channel_results(raw_results, "semantic")
     elif retriever_name == "sqlite":
         log.info("[QNA] using SQLite brute-force retriever")
-        retriever = SqliteEmbeddingRetriever(conn)
+        retriever = SqliteEmbeddingRetriever(conn, store=get_vector_store(), index=get_exact_index())
         raw_results = search_embedding_retriever(retriever, candidate_k)
         results, retrieval_signals = build_single_channel_results(raw_results, "semantic")
     elif retriever_name == "bm25":
@@ -524,14 +638,14 @@ def retrieve_question_context_uncached(cfg: dict, question: str, *, retriever_na
         channels = "+".join(sorted(HYBRID_FUSION_SPECS[retriever_name]))
         log.info("[QNA] using %s channels=%s", retriever_name, channels)
         retriever = None
-        results, retrieval_signals = search_hybrid_fusion_decomposed(retriever_name, candidate_k)
+        results, retrieval_signals = search_hybrid_fusion_decomposed(retriever_name, candidate_k, original=first_pass)
     else:
         raise RuntimeError(f"Unknown retriever: {retriever_name}")
 
     chunk_ids = [cid for cid, score in results]
     rank_scores = {cid: (float(sig.get("rrf_score", 0.0)) if isinstance(sig, dict) else float(sig)) for cid, sig in retrieval_signals.items()}
     initial_scores = rank_scores
-    filtered_ids = filter_by_intent_source(conn, chunk_ids, intent, min_required=5, max_fallback=20)
+    filtered_ids = filter_by_intent_source(conn, chunk_ids, intent, min_required=5, max_fallback=20, meta=chunk_meta)
 
     if intent in ("build", "mechanic", "lore", "biography", "location") and len(filtered_ids) < 3:
         deep_k = candidate_k * deep_candidate_multiplier
@@ -559,7 +673,7 @@ def retrieve_question_context_uncached(cfg: dict, question: str, *, retriever_na
             raise RuntimeError(f"Unknown retriever: {retriever_name}")
 
         deep_ids = [cid for cid, _ in deep_results]
-        filtered_ids = filter_by_intent_source(conn, deep_ids, intent, min_required=5, max_fallback=40)
+        filtered_ids = filter_by_intent_source(conn, deep_ids, intent, min_required=5, max_fallback=40, meta=chunk_meta)
         deep_scores = {cid: (float(sig.get("rrf_score", 0.0)) if isinstance(sig, dict) else float(sig)) for cid, sig in retrieval_signals.items()}
         results = [(cid, deep_scores[cid]) for cid in filtered_ids if cid in deep_scores]
         chunk_ids = [cid for cid, _ in results]
@@ -571,13 +685,16 @@ def retrieve_question_context_uncached(cfg: dict, question: str, *, retriever_na
         chunk_ids = [cid for cid, _ in results]
         initial_scores = {cid: score for cid, score in results}
 
+    if pre_retrieval is not None:
+        pre_retrieval.close("hyde fallback not triggered")
+
     multi_hop_cfg = cfg.get("multi_hop", {}) or {}
     multi_hop_supported = retriever_name in HYBRID_FUSION_SPECS
 
     if multi_hop_supported and as_bool(multi_hop_cfg.get("enabled", False)) and results:
         evidence_k = max(1, int(multi_hop_cfg.get("evidence_k", 6)))
         evidence_ids = [int(cid) for cid, _ in results[:evidence_k]]
-        evidence_rows = fetch_chunks(conn, evidence_ids)
+        evidence_rows = fetch_chunks(conn, evidence_ids, stats=fetch_stats)
         evidence_by_id = {int(row["chunk_id"]): row for row in evidence_rows}
         evidence_chunks = [evidence_by_id[cid] for cid in evidence_ids if cid in evidence_by_id]
         multi_hop_queries = generate_bridge_queries(cfg, question, evidence_chunks, prior_queries=[question, *decomposition_subqueries], backend=backend)
@@ -586,20 +703,19 @@ def retrieve_question_context_uncached(cfg: dict, question: str, *, retriever_na
             hop_k = min(candidate_k, int(multi_hop_cfg.get("candidate_k_per_query", 300)))
             hop_runs = []
 
-            for bridge_query in multi_hop_queries:
-                hop_results, hop_signals = search_hybrid_fusion(retriever_name, hop_k, bridge_query)
+            for bridge_query, (hop_results, hop_signals) in zip(multi_hop_queries, search_hybrid_fusion_batch(retriever_name, hop_k, multi_hop_queries)):
                 hop_runs.append((bridge_query, hop_results, hop_signals))
 
             results, retrieval_signals = merge_multi_hop_results(results, retrieval_signals, hop_runs, rrf_k=rrf_k, rrf_scale=float(retrieval_cfg.get("rrf_scale", 10.0)), hop_weight=float(multi_hop_cfg.get("hop_weight", 0.65)), max_total_candidates=int(multi_hop_cfg.get("max_total_candidates", 1800)))
             merged_ids = [int(cid) for cid, _ in results]
-            filtered_ids = filter_by_intent_source(conn, merged_ids, intent, min_required=5, max_fallback=40)
+            filtered_ids = filter_by_intent_source(conn, merged_ids, intent, min_required=5, max_fallback=40, meta=chunk_meta)
             filtered_set = set(filtered_ids)
             results = [(cid, score) for cid, score in results if cid in filtered_set]
             chunk_ids = [cid for cid, _ in results]
             initial_scores = {cid: score for cid, score in results}
             log.info("[MULTIHOP] merged bridge_queries=%d candidates=%d", len(multi_hop_queries), len(results))
     
-    chunks = fetch_chunks(conn, chunk_ids)
+    chunks = fetch_chunk_records(chunk_meta, chunk_ids, stats=fetch_stats)
     lookup_entity: str | None = None
     lookup_facets: set[str] = set()
     resolved_lookup_entity: str | None = None
@@ -683,6 +799,7 @@ def retrieve_question_context_uncached(cfg: dict, question: str, *, retriever_na
             intent,
             min_required=5,
             max_fallback=40,
+            meta=chunk_meta,
         )
 
         filtered_set = set(filtered_ids)
@@ -703,9 +820,10 @@ def retrieve_question_context_uncached(cfg: dict, question: str, *, retriever_na
             for chunk_id, score in results
         }
 
-        chunks = fetch_chunks(
-            conn,
+        chunks = fetch_chunk_records(
+            chunk_meta,
             chunk_ids,
+            stats=fetch_stats,
         )
 
         log.info(
@@ -737,10 +855,11 @@ def retrieve_question_context_uncached(cfg: dict, question: str, *, retriever_na
         chunks.sort(key = lambda row: rank_index.get(int(row["chunk_id"]), len(rank_index)))
         metric_candidate_doc_ids = unique_doc_ids(chunks)
 
-    baseline_label, baseline_ord = get_kqm_news_fetch_version_baseline(conn)
+    baseline_label, baseline_ord = get_kqm_news_fetch_version_baseline(conn, meta=chunk_meta)
     log.info("[QNA] current version baseline from kqm_news: label=%s ord=%s", baseline_label, baseline_ord,)
 
     if reranker_mode in ("feature","cross_encoder"):
+        chunks=hydrate_chunks(conn,chunks,stats=fetch_stats)
         chunks=rerank_chunks(ranking_question,chunks,retrieval_signals,baseline_ord)
     else:
         for row in chunks:
@@ -749,6 +868,7 @@ def retrieve_question_context_uncached(cfg: dict, question: str, *, retriever_na
     ltr_cfg=cfg.get("lambdamart",{}) or {}
     if as_bool(ltr_cfg.get("enabled",False)):
         ranker=get_lambdamart_ranker()
+        chunks=hydrate_chunks(conn,chunks,stats=fetch_stats)
         chunks=ranker.rerank(cfg,ranking_question,chunks,retrieval_signals)
         top_n=int(ltr_cfg.get("top_n",128))
         if top_n>0:
@@ -781,7 +901,7 @@ def retrieve_question_context_uncached(cfg: dict, question: str, *, retriever_na
 
     if exact_page_entity:
         lookup_cfg = cfg.get("lookup", {}) or {}
-        exact_seed_chunks = fetch_exact_lookup_seed_chunks(conn, exact_page_entity, max_docs=int(lookup_cfg.get("exact_title_max_docs", 2)), chunks_per_doc=int(lookup_cfg.get("exact_title_chunks_per_doc", 4)))
+        exact_seed_chunks = fetch_exact_lookup_seed_chunks(conn, exact_page_entity, max_docs=int(lookup_cfg.get("exact_title_max_docs", 2)), chunks_per_doc=int(lookup_cfg.get("exact_title_chunks_per_doc", 4)), stats=fetch_stats)
 
         if exact_seed_chunks:
             exact_ids = {int(row["chunk_id"]) for row in exact_seed_chunks}
@@ -830,12 +950,21 @@ def retrieve_question_context_uncached(cfg: dict, question: str, *, retriever_na
                 "multi_hop_enabled": as_bool((cfg.get("multi_hop", {}) or {}).get("enabled", False)),
                 "multi_hop_used": bool(multi_hop_queries),
                 "multi_hop_queries": list(multi_hop_queries),
+                "fusion_channel_runs": list(fusion_channel_runs),
+                "pre_retrieval": dict(pre_retrieval.report) if pre_retrieval is not None else {},
+                "chunk_fetch": dict(fetch_stats),
                 "metric_candidate_doc_ids": metric_candidate_doc_ids,
                 "metric_reranked_doc_ids": metric_reranked_doc_ids,
                 "metric_context_doc_ids": metric_context_doc_ids,
             },
         )
 
+    # Only the rows that can reach the context (or, for a lookup, the entity-seed scan over every candidate) need text.
+    # The rest of candidate_chunks stay text-free records; consumers that read their text hydrate them by chunk_id.
+    text_rows = len(chunks) if broad or (intent == "lookup" and not lookup_facets) else max(top_k, direct_top_k)
+    chunks = hydrate_chunks(conn, chunks, limit=text_rows, stats=fetch_stats)
+    log.info("[FETCH] candidates=%d records=%d fetched_rows=%d hydrate_calls=%d text_bytes=%d", len(chunks), fetch_stats["record_rows"], fetch_stats["fetched_rows"], fetch_stats["hydrate_calls"], fetch_stats["text_bytes"])
+
     for row in chunks[:top_k]:
         log.info("[QNA] chunk_id=%s title=%s source=%s preview=%s", row["chunk_id"], row["title"], row["source"], (row["text"][:200] if row["text"] else "").replace("\n", " "))
 
@@ -910,6 +1039,7 @@ def retrieve_question_context_uncached(cfg: dict, question: str, *, retriever_na
             else:
                 log.warning("[BUILD] final context lost target entity=%r selected_titles=%s", build_entity, [row.get("title") for row in selected_chunks])
 
+    selected_chunks = hydrate_chunks(conn, selected_chunks, stats=fetch_stats)
     selected_chunks = trim_chunks_to_context_budget(selected_chunks, max_chunks=int(answer_context_cfg.get(f"{intent}_max_chunks", default_max_chunks)), max_chars=int(answer_context_cfg.get(f"{intent}_max_chars", default_max_chars)), max_chars_per_chunk=int(answer_context_cfg.get("max_chars_per_chunk", 2200)))
     if metrics_enabled:
         metric_context_doc_ids = unique_doc_ids(selected_chunks)
@@ -961,6 +1091,9 @@ def retrieve_question_context_uncached(cfg: dict, question: str, *, retriever_na
             "multi_hop_enabled": as_bool((cfg.get("multi_hop", {}) or {}).get("enabled", False)),
             "multi_hop_used": bool(multi_hop_queries),
             "multi_hop_queries": list(multi_hop_queries),
+            "fusion_channel_runs": list(fusion_channel_runs),
+            "pre_retrieval": dict(pre_retrieval.report) if pre_retrieval is not None else {},
+            "chunk_fetch": dict(fetch_stats),
             "metric_candidate_doc_ids": metric_candidate_doc_ids,
             "metric_reranked_doc_ids": metric_reranked_doc_ids,
             "metric_context_doc_ids": metric_context_doc_ids,
@@ -976,7 +1109,7 @@ def unique_doc_ids(rows: list[dict]) -> list[int]:
             output.append(doc_id)
     return output
 
-def fetch_exact_lookup_seed_chunks(conn, entity: str, *, max_docs: int = 2, chunks_per_doc: int = 4) -> list[dict]:
+def fetch_exact_lookup_seed_chunks(conn, entity: str, *, max_docs: int = 2, chunks_per_doc: int = 4, stats: dict | None = None) -> list[dict]:
     entity = re.sub(r"\s+", " ", entity).strip()
 
     if not entity:
@@ -1045,7 +1178,7 @@ def fetch_exact_lookup_seed_chunks(conn, entity: str, *, max_docs: int = 2, chun
     if not ordered_chunk_ids:
         return []
 
-    fetched = fetch_chunks(conn, ordered_chunk_ids,)
+    fetched = fetch_chunks(conn, ordered_chunk_ids, stats=stats)
     fetched_by_id = {int(row["chunk_id"]): dict(row) for row in fetched}
     return [fetched_by_id[chunk_id] for chunk_id in ordered_chunk_ids if chunk_id in fetched_by_id]
 
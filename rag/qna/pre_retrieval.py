@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import logging
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable
+
+from .resources import RESOURCES
+from .utils import as_bool
+
+log = logging.getLogger(__name__)
+
+def pre_retrieval_pool(workers: int) -> ThreadPoolExecutor:
+    return RESOURCES.get(("pre_retrieval",), workers, lambda: ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pre-retrieval"))
+
+class PreRetrieval:
+    """LLM query rewrites for one request, started together and collected on demand.
+
+    With ``pre_retrieval.enabled`` each call starts on a shared pool as soon
+    as it is registered, so decomposition, expansion and HyDE generate while
+    the first-pass searches run; ``result`` waits only for what is still
+    generating. Otherwise a call runs inline the first time its result is
+    asked for, and never runs if it is discarded first.
+    """
+
+    def __init__(self, cfg: dict):
+        pre_cfg = cfg.get("pre_retrieval", {}) or {}
+        self.concurrent = as_bool(pre_cfg.get("enabled", True))
+        self.workers = max(1, int(pre_cfg.get("workers", 6)))
+        self.calls: dict[str, Callable[[], Any]] = {}
+        self.futures: dict[str, Future] = {}
+        self.started_at: dict[str, float] = {}
+        self.report: dict[str, dict] = {}
+
+    def start(self, name: str, fn: Callable[..., Any], *args, **kwargs) -> None:
+        self.calls[name] = lambda: fn(*args, **kwargs)
+        self.started_at[name] = time.perf_counter()
+        self.report[name] = {"status": "pending"}
+        if self.concurrent:
+            self.futures[name] = pre_retrieval_pool(self.workers).submit(self.calls[name])
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.calls and self.report[name]["status"] in ("pending", "used")
+
+    def result(self, name: str) -> Any:
+        waited_from = time.perf_counter()
+        status = self.report[name]["status"]
+        if status == "discarded":
+            raise RuntimeError(f"[PRE_RETRIEVAL] {name} was already discarded")
+        try:
+            if name in self.futures:
+                value = self.futures[name].result()
+            else:
+                value = self.calls[name]()
+                self.futures[name] = Future()
+                self.futures[name].set_result(value)
+        finally:
+            now = time.perf_counter()
+            if status == "pending":
+                self.report[name] = {"status": "used", "elapsed_ms": round((now - self.started_at[name]) * 1000, 3), "waited_ms": round((now - waited_from) * 1000, 3)}
+                log.info("[PRE_RETRIEVAL] %s ready elapsed=%.1fms waited=%.1fms", name, self.report[name]["elapsed_ms"], self.report[name]["waited_ms"])
+        return value
+
+    def discard(self, name: str, reason: str) -> None:
+        if name not in self.calls or self.report[name]["status"] != "pending":
+            return
+        future = self.futures.get(name)
+        cancelled = future is None or future.cancel()
+        self.report[name] = {"status": "discarded", "reason": reason, "cancelled": bool(cancelled), "elapsed_ms": round((time.perf_counter() - self.started_at[name]) * 1000, 3)}
+        # A generation already in flight cannot be interrupted; its result is dropped when it lands.
+        log.info("[PRE_RETRIEVAL] %s discarded (%s) cancelled=%s", name, reason, bool(cancelled))
+
+    def close(self, reason: str = "not needed") -> None:
+        for name in list(self.calls):
+            self.discard(name, reason)
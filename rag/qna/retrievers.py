@@ -3,13 +3,16 @@ import json
 import sqlite3
 from pathlib import Path
 from turbovec import IdMapIndex
-import faiss
 import logging
 import threading
+import time
 import numpy as np
 
-from .utils import normalize_vec_from_blob, make_fts5_query, normalize_model_name, check_faiss_model_match
-from core.splade import encode_query_sparse, load_csc_shard, load_splade_model, search_csc_shard, resolve_splade_device
+from .utils import make_fts5_query, normalize_model_name, check_faiss_model_match
+from core.exact_search import ExactSearchIndex
+from core.vector_store import VectorStore
+from core.faiss import apply_search_params, read_faiss_bundle, tuned_search_params
+from core.splade import encode_queries_sparse, load_csc_shard, load_splade_model, search_csc_shard_batch, resolve_splade_device
 
 log = logging.getLogger(__name__)
 
@@ -20,15 +23,19 @@ splade_model_locks = {}
 splade_model_locks_guard = threading.Lock()
 
 class FaissRetriever:
-    def __new__(cls, faiss_dir: Path, *, expected_model: str | None = None, mismatch_policy:str = "error"):
-        key = str(faiss_dir)
+    def __new__(cls, faiss_dir: Path, *, expected_model: str | None = None, mismatch_policy:str = "error", load_mode: str = "memory"):
+        # A promoted generation replaces meta.json, so its mtime retires the previous instance.
+        meta_path = Path(faiss_dir) / "current" / "meta.json"
+        key = f"{faiss_dir}|{load_mode}|{meta_path.stat().st_mtime_ns if meta_path.exists() else 0}"
         if key not in faiss_retriever_cache:
+            for stale in [k for k in faiss_retriever_cache if k.split("|", 1)[0] == str(faiss_dir)]:
+                faiss_retriever_cache.pop(stale)
             instance = super().__new__(cls)
             instance._initialized = False
             faiss_retriever_cache[key] = instance
         return faiss_retriever_cache[key]
 
-    def __init__(self, faiss_dir: Path, *, expected_model: str | None = None, mismatch_policy: str = "error"):
+    def __init__(self, faiss_dir: Path, *, expected_model: str | None = None, mismatch_policy: str = "error", load_mode: str = "memory"):
         if self._initialized:
             if expected_model:
                 check_faiss_model_match(actual_model=self.model, expected_model=expected_model, policy=mismatch_policy)
@@ -41,68 +48,58 @@ class FaissRetriever:
         if not (self.index_path.exists() and self.ids_path.exists() and self.meta_path.exists()):
             raise FileNotFoundError(f"FAISS bundle missing under {current}")
 
-        self.index = faiss.read_index(str(self.index_path))
-        self.ids = np.load(str(self.ids_path))
+        t0 = time.perf_counter()
+        self.load_mode = load_mode
+        self.index, self.ids = read_faiss_bundle(current, load_mode=load_mode)
+        load_ms = (time.perf_counter() - t0) * 1000
         self.meta = json.loads(self.meta_path.read_text(encoding="utf-8"))
         self.dims = int(self.meta["dims"])
         self.model = self.meta.get("embedding_model", "unknown")
+        self.id_map = bool(self.meta.get("id_map", False))
+        apply_search_params(self.index, tuned_search_params(self.meta))
         if expected_model:
             check_faiss_model_match(actual_model=self.model, expected_model=expected_model, policy=mismatch_policy)
-        log.info("[FAISS] loaded index dims=%d model=%s ntotal=%d",
-             self.dims, self.model, self.index.ntotal)
+        log.info("[FAISS] loaded index dims=%d model=%s ntotal=%d load_mode=%s in %.1fms",
+             self.dims, self.model, self.index.ntotal, self.load_mode, load_ms)
         self._initialized = True
 
     def search(self, query_vec: np.ndarray, k: int) -> list[tuple[int, float]]:
+        return self.search_batch(query_vec, k)[0]
+
+    def search_batch(self, query_vecs: np.ndarray, k: int) -> list[list[tuple[int, float]]]:
+        Q = np.ascontiguousarray(np.atleast_2d(query_vecs), dtype=np.float32)
         k = min(k, self.index.ntotal)
         if k == 0:
-            return []
-        dists, indices = self.index.search(query_vec, k)
+            return [[] for _ in range(Q.shape[0])]
+        dists, indices = self.index.search(Q, k)
         out = []
-        for i, score in zip(indices[0], dists[0]):
-            if i < 0:
-                continue
-            out.append((int(self.ids[i]), float(score)))
+        for row_ids, row_scores in zip(indices, dists):
+            hits = []
+            for i, score in zip(row_ids, row_scores):
+                if i < 0:
+                    continue
+                hits.append((int(i) if self.id_map else int(self.ids[i]), float(score)))
+            out.append(hits)
         return out
 
 class SqliteEmbeddingRetriever:
-    def __init__(self, conn: sqlite3.Connection):
+    def __init__(self, conn: sqlite3.Connection, store: VectorStore | None = None, *, index: ExactSearchIndex | None = None):
         self.conn = conn
-        cur = conn.cursor()
-        cur.execute("""
-            SELECT e.dims
-            FROM embeddings e
-            JOIN chunks c ON c.chunk_id = e.chunk_id
-            WHERE c.is_active=1
-            LIMIT 1
-        """)
-        row = cur.fetchone()
-        if row is None:
+        if index is None:
+            index = ExactSearchIndex.load(conn, store)
+        else:
+            index.refresh(conn, store)
+        if not index.count:
             raise RuntimeError("No active embeddings found in SQLite")
-        self.dims = int(row["dims"])
+        self.index = index
+        self.dims = index.dims
 
     def search(self, query_vec: np.ndarray, k: int) -> list[tuple[int, float]]:
-        cur = self.conn.cursor()
-        cur.execute("""
-            SELECT e.chunk_id, e.dims, e.vector
-            FROM embeddings e
-            JOIN chunks c ON c.chunk_id = e.chunk_id
-            WHERE c.is_active=1
-        """)
-
-        scores: list[tuple[float, int]] = []
-        q = query_vec[0]
-
-        for row in cur:
-            chunk_id = int(row["chunk_id"])
-            dims = int(row["dims"])
-            blob = row["vector"]
-            v = normalize_vec_from_blob(blob, dims)
-            score = float(np.dot(q, v))
-            scores.append((score, chunk_id))
-
-        scores.sort(key=lambda x: x[0], reverse=True)
-        k = min(k, len(scores))
-        return [(cid, score) for score, cid in scores[:k]]
+        return self.search_batch(query_vec, k)[0]
+
+    def search_batch(self, query_vecs: np.ndarray, k: int) -> list[list[tuple[int, float]]]:
+        ids, scores = self.index.search(query_vecs, k)
+        return [[(int(cid), float(score)) for cid, score in zip(row_ids, row_scores)] for row_ids, row_scores in zip(ids, scores)]
     
 class BM25Retriever:
     def __init__(self, conn: sqlite3.Connection):
@@ -133,6 +130,10 @@ class BM25Retriever:
     
     def search_fts(self, fts_query: str, top_k: int, *, weights: tuple[float, float, float, float, float] | None = None):
         return self._search_fts(fts_query, top_k, weights=weights)
+
+    def search_batch(self, queries: list[str], top_k: int, *, weights: tuple[float, float, float, float, float] | None = None):
+        # FTS5 has no multi-query MATCH; one statement per query on the shared connection.
+        return [self.search(query, top_k, weights=weights) for query in queries]
     
 class TurboVecRetriever:
     def __init__(self, turbovec_dir: Path, *, expected_model: str | None = None, mismatch_policy: str = "error"):
@@ -170,9 +171,6 @@ class TurboVecRetriever:
         log.info("[TURBOVEC] loaded index dims=%d model=%s count=%d path=%s", self.dims, self.model, self.count, self.index_path)
 
     def search(self, query_vec: np.ndarray, k: int) -> list[tuple[int, float]]:
-        if k <= 0 or self.count <= 0:
-            return []
-
         q = np.asarray(query_vec, dtype=np.float32)
 
         if q.ndim == 1:
@@ -181,6 +179,16 @@ class TurboVecRetriever:
         if q.ndim != 2 or q.shape[0] != 1:
             raise ValueError(f"TurboVecRetriever expects one query with shape (1, dims), got {q.shape}")
 
+        return self.search_batch(q, k)[0]
+
+    def search_batch(self, query_vecs: np.ndarray, k: int) -> list[list[tuple[int, float]]]:
+        q = np.atleast_2d(np.asarray(query_vecs, dtype=np.float32))
+        if k <= 0 or self.count <= 0:
+            return [[] for _ in range(q.shape[0])]
+
+        if q.ndim != 2:
+            raise ValueError(f"TurboVecRetriever expects queries with shape (n, dims), got {q.shape}")
+
         if q.shape[1] != self.dims:
             raise ValueError(f"TurboVec query dimension mismatch: expected {self.dims}, got {q.shape[1]}")
 
@@ -190,19 +198,14 @@ class TurboVecRetriever:
 
         try:
             scores, ids = self.index.search(q, k=k)
+            scores = np.asarray(scores).reshape(q.shape[0], -1)
+            ids = np.asarray(ids).reshape(q.shape[0], -1)
         except (TypeError, ValueError):
-            scores, ids = self.index.search(q[0], k=k)
+            rows = [self.index.search(row, k=k) for row in q]
+            scores = np.vstack([np.asarray(row_scores).reshape(1, -1) for row_scores, _ in rows])
+            ids = np.vstack([np.asarray(row_ids).reshape(1, -1) for _, row_ids in rows])
 
-        scores = np.asarray(scores)
-        ids = np.asarray(ids)
-
-        if scores.ndim == 2:
-            scores = scores[0]
-
-        if ids.ndim == 2:
-            ids = ids[0]
-
-        return [(int(cid), float(score)) for cid, score in zip(ids, scores) if int(cid) >= 0]
+        return [[(int(cid), float(score)) for cid, score in zip(row_ids, row_scores) if int(cid) >= 0] for row_ids, row_scores in zip(ids, scores)]
     
 class SpladeRetriever:
     def __new__(cls, index_dir: Path, *, model_name: str, device: str, max_length: int, max_active_dims: int | None, cache_folder: str | None = None, precision: str = "fp32"):
@@ -260,19 +263,25 @@ class SpladeRetriever:
         self._initialized = True
 
     def search(self, query: str, k: int,) -> list[tuple[int, float]]:
-        if k <= 0:
-            return []
+        return self.search_batch([query], k)[0]
+
+    def search_batch(self, queries: list[str], k: int) -> list[list[tuple[int, float]]]:
+        if k <= 0 or not queries:
+            return [[] for _ in queries]
 
         with self.query_lock:
-            (query_indices, query_values, dimensions,) = encode_query_sparse(self.model, query, max_active_dims=self.max_active_dims,)
+            query_matrix = encode_queries_sparse(self.model, list(queries), max_active_dims=self.max_active_dims)
 
-        if dimensions != self.vocabulary_size:
-            raise RuntimeError(f"[SPLADE] query dimension mismatch: query={dimensions} index={self.vocabulary_size}")
+        if query_matrix.shape[1] != self.vocabulary_size:
+            raise RuntimeError(f"[SPLADE] query dimension mismatch: query={query_matrix.shape[1]} index={self.vocabulary_size}")
 
-        candidates: list[tuple[int, float]] = []
+        candidates: list[list[tuple[int, float]]] = [[] for _ in queries]
         for matrix, chunk_ids, _ in self.shards:
-            candidates.extend(search_csc_shard(matrix, chunk_ids, query_indices, query_values, k=k))
-        candidates.sort(key=lambda item: item[1], reverse=True)
-        results = candidates[:k]
-        log.info("[SPLADE] query_dims=%d candidates=%d returned=%d", query_indices.size, len(candidates), len(results))
-        return results
\ No newline at end of file
+            for bucket, hits in zip(candidates, search_csc_shard_batch(matrix, chunk_ids, query_matrix, k=k)):
+                bucket.extend(hits)
+        results = []
+        for bucket in candidates:
+            bucket.sort(key=lambda item: item[1], reverse=True)
+            results.append(bucket[:k])
+        log.info("[SPLADE] queries=%d query_dims=%d returned=%s", len(queries), query_matrix.nnz, [len(r) for r in results])
+        return results
@@ -0,0 +1,147 @@
+from __future__ import annotations
+
+import logging
+import time
+from pathlib import Path
+
+import numpy as np
+
+from core.db import read_only_connect
+from core.exact_search import ExactSearchIndex
+from core.faiss import faiss_load_mode, fetch_active_vectors
+from core.faiss_autotune import load_query_texts
+from core.paths import resolve_db_path, resolve_faiss_dir, resolve_splade_dir, resolve_storage_root, resolve_turbovec_dir
+from core.vector_store import open_synced_vector_store
+from .utils import as_bool
+from .retrievers import BM25Retriever, FaissRetriever, SpladeRetriever, SqliteEmbeddingRetriever, TurboVecRetriever
+
+log = logging.getLogger(__name__)
+
+def sample_query_texts(cfg: dict, conn, n: int, rng: np.random.Generator) -> list[str]:
+    pairs_path = Path(str((cfg.get("lambdamart", {}) or {}).get("training_pairs", "")))
+    if pairs_path.is_file():
+        texts = load_query_texts(pairs_path, n, rng)
+        if texts:
+            return texts
+    titles = [str(r[0]) for r in conn.execute("""
+        SELECT DISTINCT d.title
+        FROM chunks c
+        JOIN docs d ON d.doc_id = c.doc_id
+        WHERE c.is_active=1 AND d.title IS NOT NULL AND d.title != ''
+    """)]
+    if len(titles) > n:
+        titles = [titles[i] for i in sorted(rng.choice(len(titles), size=n, replace=False))]
+    return titles
+
+def sample_query_vectors(conn, store, n: int, rng: np.random.Generator) -> np.ndarray:
+    ids = np.fromiter((r[0] for r in conn.execute("""
+        SELECT e.chunk_id
+        FROM embeddings e
+        JOIN chunks c ON c.chunk_id = e.chunk_id
+        WHERE c.is_active=1
+    """)), dtype=np.int64)
+    if ids.size == 0:
+        raise RuntimeError("[SEARCH_BENCH] no active embeddings to sample queries from")
+    ids = np.sort(rng.choice(ids, size=min(n, ids.size), replace=False))
+    d = int(conn.execute("SELECT dims FROM embeddings WHERE chunk_id=?", (int(ids[0]),)).fetchone()[0])
+    _, Q = fetch_active_vectors(conn, ids, d, store)
+    Q /= np.maximum(np.linalg.norm(Q, axis=1, keepdims=True), 1e-12)
+    return Q
+
+def open_splade_retriever(cfg: dict) -> SpladeRetriever:
+    splade_cfg = cfg.get("splade", {}) or {}
+    if not as_bool(splade_cfg.get("enabled", False)):
+        raise RuntimeError("[SPLADE] SPLADE is disabled")
+    cache_folder = None
+    if cache_folder_value := splade_cfg.get("cache_folder"):
+        cache_path = Path(str(cache_folder_value)).expanduser()
+        if not cache_path.is_absolute():
+            cache_path = resolve_storage_root(cfg) / cache_path
+        cache_folder = str(cache_path.resolve())
+    active_dims_value = splade_cfg.get("max_active_dims", 128)
+    return SpladeRetriever(
+        resolve_splade_dir(cfg),
+        model_name=str(splade_cfg["model"]),
+        device=str(splade_cfg.get("device", "auto")),
+        max_length=int(splade_cfg.get("max_length", 256)),
+        max_active_dims=int(active_dims_value) if active_dims_value is not None else None,
+        cache_folder=cache_folder,
+        precision=str(splade_cfg.get("precision", "fp32")).strip().lower(),
+    )
+
+def time_pair(sequential, batched, repeats: int) -> dict:
+    seq_s, batch_s = [], []
+    seq_out = batch_out = None
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        seq_out = sequential()
+        seq_s.append(time.perf_counter() - t0)
+        t0 = time.perf_counter()
+        batch_out = batched()
+        batch_s.append(time.perf_counter() - t0)
+    same = sum(
+        [cid for cid, _ in a] == [cid for cid, _ in b]
+        for a, b in zip(seq_out, batch_out)
+    )
+    seq_ms, batch_ms = float(np.median(seq_s) * 1000), float(np.median(batch_s) * 1000)
+    return {"sequential_ms": seq_ms, "batch_ms": batch_ms, "speedup": seq_ms / max(batch_ms, 1e-9), "same_ranking": int(same)}
+
+def benchmark_batch_search(cfg: dict, *, queries: int = 16, k: int = 100, repeats: int = 3, seed: int = 1337) -> dict:
+    """Time ``search`` called once per query against one ``search_batch`` call per retriever.
+
+    Vector retrievers are queried with stored chunk vectors so no embedding
+    backend is needed, and their recall@k is measured against exact search; BM25 and SPLADE get question texts from the LambdaMART
+    training pairs, or document titles when those are missing. Retrievers that
+    are not built or configured are skipped.
+    """
+    rng = np.random.default_rng(seed)
+    conn = read_only_connect(str(resolve_db_path(cfg)))
+    store = open_synced_vector_store(cfg)
+    report: dict[str, dict] = {}
+    try:
+        Q = sample_query_vectors(conn, store, queries, rng)
+        texts = sample_query_texts(cfg, conn, queries, rng)
+        oracle = ExactSearchIndex.load(conn, store)
+        truth, _ = oracle.search(Q, k)
+        log.info("[SEARCH_BENCH] queries=%d texts=%d k=%d repeats=%d", Q.shape[0], len(texts), k, repeats)
+
+        channels = {
+            "faiss": lambda: FaissRetriever(resolve_faiss_dir(cfg), load_mode=faiss_load_mode(cfg)),
+            "sqlite": lambda: SqliteEmbeddingRetriever(conn, store, index=oracle),
+            "turbovec": lambda: TurboVecRetriever(resolve_turbovec_dir(cfg)),
+            "bm25": lambda: BM25Retriever(conn),
+            "splade": lambda: open_splade_retriever(cfg),
+        }
+        for name, factory in channels.items():
+            try:
+                ret = factory()
+            except Exception as e:
+                log.warning("[SEARCH_BENCH] %s skipped (%s: %s)", name, type(e).__name__, e)
+                continue
+
+            if name in ("bm25", "splade"):
+                if not texts:
+                    log.warning("[SEARCH_BENCH] %s skipped (no query texts)", name)
+                    continue
+                row = time_pair(lambda: [ret.search(q, k) for q in texts], lambda: ret.search_batch(texts, k), repeats)
+                row["queries"] = len(texts)
+            else:
+                if ret.dims != Q.shape[1]:
+                    log.warning("[SEARCH_BENCH] %s skipped (dims %d != embeddings %d)", name, ret.dims, Q.shape[1])
+                    continue
+                row = time_pair(lambda: [ret.search(q, k) for q in Q], lambda: ret.search_batch(Q, k), repeats)
+                row["queries"] = int(Q.shape[0])
+                found = ret.search_batch(Q, k)
+                row["recall_at_k"] = sum(np.intersect1d(t, [cid for cid, _ in hits]).size for t, hits in zip(truth, found)) / max(truth.size, 1)
+
+            report[name] = row
+            log.info(
+                "[SEARCH_BENCH] %s queries=%d sequential=%.2fms batch=%.2fms speedup=%.2fx same_ranking=%d/%d recall@%d=%s",
+                name, row["queries"], row["sequential_ms"], row["batch_ms"], row["speedup"], row["same_ranking"], row["queries"], k,
+                f"{row['recall_at_k']:.4f}" if "recall_at_k" in row else "n/a",
+            )
+    finally:
+        if store is not None:
+            store.close()
+        conn.close()
+    return report
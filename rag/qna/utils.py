@@ -14,6 +14,8 @@ from pathlib import Path
 from difflib import SequenceMatcher
 
 from .types import RetrievalResult
+from .chunk_meta import ChunkMetaCache
+from utils.codec import decode_vector
 
 log = logging.getLogger(__name__)
 
@@ -1005,7 +1007,7 @@ def make_intent_fts5_query(question: str, intent: str) -> str | None:
             f"(title:{entity} OR text:{entity}) "
             f"AND ({build_terms})")
 
-def filter_by_intent_source(conn: sqlite3.Connection, chunk_ids: list[int], intent: str, min_required: int=5, max_fallback: int=30) -> list[int]:
+def filter_by_intent_source(conn: sqlite3.Connection, chunk_ids: list[int], intent: str, min_required: int=5, max_fallback: int=30, *, meta: ChunkMetaCache | None = None) -> list[int]:
     if not chunk_ids:
         return []
     
@@ -1018,6 +1020,21 @@ def filter_by_intent_source(conn: sqlite3.Connection, chunk_ids: list[int], inte
 
     if not required and not excluded:
         return chunk_ids
+
+    if meta is not None:
+        ids = np.asarray(chunk_ids, dtype=np.int64)
+        codes = meta.sources_of(ids)
+        keep = ~np.isin(codes, meta.source_codes(excluded))
+        is_required = keep & np.isin(codes, meta.source_codes(required))
+        is_preferred = keep & ~is_required & np.isin(codes, meta.source_codes(preferred))
+        is_neutral = keep & ~is_required & ~is_preferred
+
+        result = ids[is_required]
+        if result.size < min_required:
+            result = np.concatenate([result, ids[is_preferred]])
+        if result.size < min_required:
+            result = np.concatenate([result, ids[is_neutral][:max(0, max_fallback - result.size)]])
+        return [int(cid) for cid in result]
     
     placeholder = ",".join("?" for _ in chunk_ids)
     cur = conn.cursor()
@@ -1082,20 +1099,17 @@ def read_only_connect(path: str) -> sqlite3.Connection:
     return conn
 
 def normalize_vec_from_blob(blob: bytes, dims: int) -> np.ndarray:
-    v = np.frombuffer(blob, dtype=np.float32)
-    if v.size != dims:
-        raise ValueError(f"vector size mismatch: expected {dims}, got {v.size}")
-    v = v.astype(np.float32, copy=False)
+    v = decode_vector(blob, dims)
     norm = np.linalg.norm(v)
     if norm > 0:
         v = v / norm
     return v
 
 def normalize_query_vec(blob: bytes, dims: int) -> np.ndarray:
-    q = np.frombuffer(blob, dtype=np.float32)
-    if q.size != dims:
-        raise ValueError(f"query dim mismatch: expected {dims}, got {q.size}")
-    q = q.astype(np.float32, copy=False)
+    try:
+        q = decode_vector(blob, dims)
+    except ValueError:
+        raise ValueError(f"query dim mismatch: expected {dims}, got {len(blob)} bytes") from None
     norm = np.linalg.norm(q)
     if norm > 0:
         q = q / norm
@@ -1554,12 +1568,15 @@ def is_recency_sensitive_question(question: str) -> bool:
 
     return any(m in q for m in RECENCY_MARKERS)
 
-def get_kqm_news_fetch_version_baseline(conn: sqlite3.Connection, max_version_ord: int | None = None) -> tuple[str | None, int | None]:
+def get_kqm_news_fetch_version_baseline(conn: sqlite3.Connection, max_version_ord: int | None = None, *, meta: ChunkMetaCache | None = None) -> tuple[str | None, int | None]:
     cur = conn.cursor()
 
     if max_version_ord is None:
         max_version_ord = 699
 
+    if meta is not None:
+        return meta.kqm_news_baseline(max_version_ord)
+
     cur.execute("""
         SELECT version_label, version_ord
         FROM docs
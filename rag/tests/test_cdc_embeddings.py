@@ -0,0 +1,69 @@
+import random
+import tempfile
+import unittest
+from dataclasses import replace
+from pathlib import Path
+
+import yaml
+
+from core.db import connect, ensure_db, get_embedding_meta
+from core.pipeline import prepare_document, write_document_batch
+from utils.thread import resolve_embedding_reuse
+
+CONFIG = Path(__file__).resolve().parents[1] / "config.yaml"
+URL = "https://example.invalid/wiki/A"
+
+class CdcEmbeddingsTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db = str(Path(self.tmp.name) / "rag.db")
+        ensure_db(self.db)
+        self.conn = connect(self.db)
+        self.cfg = yaml.safe_load(CONFIG.read_text(encoding="utf-8"))
+        self.cfg["pipeline"].update({"chunking_mode": "cdc", "chunk_size": 300, "chunk_overlap": 0, "reuse_embeddings": True})
+        self.cfg["ollama"]["embedding_model"] = "model-a"
+        rng = random.Random(7)
+        words = "alpha beta gamma delta epsilon zeta eta theta iota kappa".split()
+        self.paras = [" ".join(rng.choice(words) for _ in range(60)) for _ in range(8)]
+
+    def tearDown(self):
+        self.conn.close()
+        self.tmp.cleanup()
+
+    def write(self, paras: list[str], *, force_rebuild: bool = False) -> list:
+        doc = prepare_document(self.cfg, "wiki", URL, "A", "\n\n".join(paras))
+        if force_rebuild:
+            doc = replace(doc, force_rebuild=True)
+        reuse = resolve_embedding_reuse(self.conn, self.cfg, "ollama")
+        report = write_document_batch(self.conn, [doc], raise_errors=True, reuse_embeddings=reuse)
+        # Stand in for the embed workers.
+        self.conn.execute("INSERT OR IGNORE INTO embeddings(chunk_id, dims, vector) SELECT chunk_id, 1, x'00000000' FROM chunks WHERE is_active=1")
+        return report.outcomes[0].rows
+
+    def active_chunks(self) -> int:
+        return int(self.conn.execute("SELECT COUNT(*) FROM chunks WHERE is_active=1").fetchone()[0])
+
+    def test_unchanged_signature_keeps_vectors_of_kept_chunks(self):
+        self.write(self.paras)
+        rows = self.write([*self.paras[:-1], self.paras[-1] + " omega"])
+        self.assertGreater(len(rows), 0)
+        self.assertLess(len(rows), self.active_chunks())
+
+    def test_signature_change_clears_cdc_vectors(self):
+        self.write(self.paras)
+        self.cfg["ollama"]["embedding_model"] = "model-b"
+        rows = self.write([*self.paras[:-1], self.paras[-1] + " omega"])
+        self.assertEqual(len(rows), self.active_chunks())
+        self.assertTrue(str(get_embedding_meta(self.conn, "embedding_signature")).startswith("model-b|"))
+
+        # Everything was re-embedded with model-b, so the next edit reuses again.
+        rows = self.write([*self.paras[:-1], self.paras[-1] + " omega omega"])
+        self.assertLess(len(rows), self.active_chunks())
+
+    def test_force_rebuild_clears_cdc_vectors(self):
+        self.write(self.paras)
+        rows = self.write(self.paras, force_rebuild=True)
+        self.assertEqual(len(rows), self.active_chunks())
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,53 @@
+import threading
+import unittest
+
+import requests
+
+from core.embed_client import AdaptiveEmbedClient
+
+def client(**client_cfg) -> AdaptiveEmbedClient:
+    cfg = {"embedding_client": {"initial_concurrency": 4, "max_concurrency": 4, "target_latency_s": 4.0, **client_cfg}}
+    return AdaptiveEmbedClient(lambda *a, **k: None, cfg, backend="ollama")
+
+class AdaptiveEmbedClientTest(unittest.TestCase):
+    def test_only_server_pushback_lowers_the_limit(self):
+        c = client()
+        c.observe(None, 0.1, KeyError("embeddings"))
+        c.observe(None, 0.1, ValueError("bad payload"))
+        c.observe(500, 0.1, requests.HTTPError("500"))
+        self.assertEqual(c.limiter.limit, 4.0)
+        self.assertEqual(c.throttled, 0)
+
+        c.observe(None, 0.1, requests.ConnectionError("refused"))
+        self.assertEqual(c.limiter.limit, 2.0)
+        c.limiter.last_decrease = 0.0
+        c.observe(429, 0.1, requests.HTTPError("429"))
+        self.assertEqual(c.limiter.limit, 1.0)
+        self.assertEqual(c.throttled, 2)
+
+    def test_backoff_releases_the_slot(self):
+        c = client(initial_concurrency=1, max_concurrency=1)
+        in_backoff = threading.Event()
+        other_ran = threading.Event()
+
+        def sleep_then_retry(texts, mode="passage", title=None, observer=None, backoff=None):
+            if texts == "first":
+                in_backoff.set()
+                backoff(0.5)
+                # The second request ran while this one slept.
+                return other_ran.is_set()
+            other_ran.set()
+            return True
+
+        c.embed_fn = sleep_then_retry
+        results = {}
+        first = threading.Thread(target=lambda: results.setdefault("first", c("first")))
+        first.start()
+        self.assertTrue(in_backoff.wait(5))
+        self.assertTrue(c("second"))
+        first.join(5)
+        self.assertTrue(results["first"])
+        self.assertEqual(c.limiter.inflight, 0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+import sqlite3
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+from core.db import ensure_db
+from core.exact_search import ExactSearchIndex
+from core.vector_store import register_consumer
+from utils.codec import encode_vector
+
+DIMS = 4
+
+class ExactSearchRefreshTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        path = Path(self.tmp.name) / "rag.db"
+        ensure_db(str(path))
+        self.conn = sqlite3.connect(str(path), isolation_level=None)
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        self.conn.execute("INSERT INTO docs(doc_id, source, url, title) VALUES (1, 'test', 'https://example.invalid/a', 'A')")
+        for i in range(3):
+            self.conn.execute("INSERT INTO chunks(chunk_id, doc_id, chunk_index, text) VALUES (?, 1, ?, ?)", (i + 1, i, f"chunk {i}"))
+            self.write_vector(i + 1, np.eye(DIMS, dtype=np.float32)[i])
+
+    def tearDown(self):
+        self.conn.close()
+        self.tmp.cleanup()
+
+    def write_vector(self, chunk_id: int, vec: np.ndarray):
+        self.conn.execute(
+            "INSERT INTO embeddings(chunk_id, dims, vector) VALUES (?, ?, ?) ON CONFLICT(chunk_id) DO UPDATE SET dims=excluded.dims, vector=excluded.vector",
+            (chunk_id, DIMS, encode_vector(vec)),
+        )
+
+    def top(self, index: ExactSearchIndex, axis: int) -> int:
+        ids, _ = index.search(np.eye(DIMS, dtype=np.float32)[axis], 1)
+        return int(ids[0][0])
+
+    def test_in_place_reembed_without_consumer(self):
+        index = ExactSearchIndex.load(self.conn)
+        self.assertFalse(index.refresh(self.conn))
+
+        # Same chunk_ids, new vectors: the active set is unchanged but the matrix is stale.
+        self.write_vector(1, np.eye(DIMS, dtype=np.float32)[3])
+        self.assertTrue(index.refresh(self.conn))
+        self.assertEqual(self.top(index, 3), 1)
+        self.assertFalse(index.refresh(self.conn))
+
+    def test_consumer_registered_after_load_reloads(self):
+        index = ExactSearchIndex.load(self.conn)
+        self.write_vector(2, np.eye(DIMS, dtype=np.float32)[3])
+        register_consumer(self.conn, "test")
+        self.write_vector(3, np.eye(DIMS, dtype=np.float32)[0])
+
+        # The first write predates the consumer, so the log alone would miss it.
+        self.assertTrue(index.refresh(self.conn))
+        self.assertEqual(self.top(index, 3), 2)
+        self.assertTrue(index.logged)
+
+        self.conn.execute("UPDATE chunks SET is_active=0 WHERE chunk_id=2")
+        self.assertTrue(index.refresh(self.conn))
+        self.assertNotIn(2, index.snapshot[0].tolist())
+        self.assertFalse(index.refresh(self.conn))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+
+import core.faiss as F
+from core.db import connect, ensure_db
+from core.vector_store import prune_dirty_log, register_consumer
+from utils.codec import encode_vector
+
+DIMS = 8
+CHUNKS = 40
+
+class FaissDirtyLogTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        root = Path(self.tmp.name)
+        self.cfg = {"storage": {"primary_root": str(root)}, "db_path": "rag.db", "faiss_path": "faiss", "faiss": {"index_mode": "flat_ip"}}
+        self.db = str(root / "rag.db")
+        ensure_db(self.db)
+        self.conn = connect(self.db)
+        self.conn.execute("INSERT INTO docs(doc_id, source, url, title) VALUES (1, 'test', 'https://example.invalid/a', 'A')")
+        rng = np.random.default_rng(3)
+        for cid in range(1, CHUNKS + 1):
+            self.conn.execute("INSERT INTO chunks(chunk_id, doc_id, chunk_index, text) VALUES (?, 1, ?, 'x')", (cid, cid))
+            self.write_vector(cid, rng.standard_normal(DIMS))
+        self.current = root / "faiss" / "current"
+
+    def tearDown(self):
+        self.conn.close()
+        self.tmp.cleanup()
+
+    def write_vector(self, cid: int, vec: np.ndarray):
+        self.conn.execute("INSERT OR REPLACE INTO embeddings(chunk_id, dims, vector) VALUES (?, ?, ?)", (cid, DIMS, encode_vector(np.asarray(vec, dtype=np.float32))))
+
+    def change_vectors(self) -> np.ndarray:
+        moved = np.zeros(DIMS, dtype=np.float32)
+        moved[0] = 1.0
+        self.write_vector(1, moved)
+        self.conn.execute("DELETE FROM embeddings WHERE chunk_id=2")
+        return moved
+
+    def assert_index_matches(self, moved: np.ndarray):
+        index, ids = F.read_faiss_bundle(self.current)
+        self.assertNotIn(2, ids.tolist())
+        self.assertEqual(index.ntotal, CHUNKS - 1)
+        _, I = index.search(moved.reshape(1, -1), 1)
+        self.assertEqual(int(I[0, 0]), 1)
+
+    def test_failed_rebuild_keeps_log_rows_for_the_next_update(self):
+        F.build_faiss_from_sqlite(self.cfg)
+        register_consumer(self.conn, "other")
+        moved = self.change_vectors()
+
+        with mock.patch.object(F, "write_generation", side_effect=OSError("disk full")):
+            with self.assertRaises(OSError):
+                F.build_faiss_from_sqlite(self.cfg, overwrite=True)
+        # Another consumer catching up must not prune rows faiss has not applied.
+        register_consumer(self.conn, "other", int(self.conn.execute("SELECT MAX(seq) FROM vector_dirty_log").fetchone()[0]))
+        prune_dirty_log(self.conn)
+
+        generation = json.loads((self.current / "meta.json").read_text(encoding="utf-8"))["generation"]
+        with self.assertLogs("core.faiss", "INFO") as logs:
+            F.update_faiss_from_sqlite(self.cfg)
+        self.assertFalse(any("full rebuild" in line for line in logs.output))
+        self.assertEqual(json.loads((self.current / "meta.json").read_text(encoding="utf-8"))["generation"], generation + 1)
+        self.assert_index_matches(moved)
+
+    def test_gap_in_dirty_log_forces_rebuild(self):
+        F.build_faiss_from_sqlite(self.cfg)
+        moved = self.change_vectors()
+        self.conn.execute("DELETE FROM vector_dirty_log WHERE seq = (SELECT MIN(seq) FROM vector_dirty_log)")
+
+        with self.assertLogs("core.faiss", "INFO") as logs:
+            F.update_faiss_from_sqlite(self.cfg)
+        self.assertTrue(any("dirty log has gaps" in line for line in logs.output))
+        self.assert_index_matches(moved)
+
+if __name__ == "__main__":
+    unittest.main()
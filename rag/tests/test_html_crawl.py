@@ -0,0 +1,95 @@
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from adapters.html import crawl_site
+
+PAGES = 12
+
+def page_body(n: int) -> bytes:
+    links = "".join(f'<li><a href="/p{i}">Page {i}</a></li>' for i in range(PAGES) if i != n)
+    text = " ".join(f"Paragraph {n} sentence {k}." for k in range(40))
+    return f"<html><head><title>Page {n}</title></head><body><main><h1>Page {n}</h1><p>{text}</p><ul>{links}</ul></main></body></html>".encode("utf-8")
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.server.hits.append((self.path, self.headers.get("If-None-Match")))
+        if not self.path.startswith("/p") or not self.path[2:].isdigit():
+            self.send_error(404)
+            return
+        etag = f'"v1-{self.path[2:]}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        body = page_body(int(self.path[2:]))
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+class CrawlSiteFixtureTest(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), FixtureHandler)
+        self.server.hits = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.tmp = tempfile.TemporaryDirectory()
+        self.frontier = str(Path(self.tmp.name) / "frontier.sqlite3")
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmp.cleanup()
+
+    def crawl(self, *, validators=None, frontier=None, stats=None):
+        return crawl_site(self.base, [f"{self.base}/p0"], None, rate_limit_s=0.0, max_pages=None, validators=validators, frontier_path=frontier or self.frontier, stats=stats)
+
+    def test_recrawl_with_stored_pages_is_all_not_modified(self):
+        docs = list(self.crawl())
+        self.assertEqual(len(docs), PAGES)
+        validators = {url: (etag, last_modified) for url, _, _, last_modified, etag in docs}
+
+        stats = {}
+        self.server.hits.clear()
+        self.assertEqual(list(self.crawl(validators=validators, stats=stats)), [])
+        self.assertEqual(stats["requests"], PAGES)
+        self.assertEqual(stats["not_modified"], PAGES)
+        self.assertEqual(stats["bytes_received"], 0)
+        self.assertEqual(stats["bytes_saved"], sum(len(page_body(n)) for n in range(PAGES)))
+        self.assertTrue(all(etag for _, etag in self.server.hits))
+
+    def test_validators_without_stored_pages_fetch_in_full(self):
+        docs = list(self.crawl())
+        validators = {url: (etag, last_modified) for url, _, _, last_modified, etag in docs}
+
+        # Validators from docs but an empty pages table, as on the first run after an upgrade.
+        stats = {}
+        self.server.hits.clear()
+        fresh = list(self.crawl(validators=validators, frontier=str(Path(self.tmp.name) / "fresh.sqlite3"), stats=stats))
+        self.assertEqual(len(fresh), PAGES)
+        self.assertEqual(stats["not_modified"], 0)
+        self.assertFalse(any(etag for _, etag in self.server.hits))
+
+    def test_interrupted_crawl_resumes_from_frontier(self):
+        crawl = self.crawl()
+        first = [next(crawl) for _ in range(5)]
+        crawl.close()
+
+        stats = {}
+        rest = list(self.crawl(stats=stats))
+        self.assertEqual(stats["resumed_seen"], 5)
+        self.assertEqual(stats["requests"], PAGES - 5)
+        self.assertEqual(len({url for url, *_ in first + rest}), PAGES)
+        self.assertEqual(len(self.server.hits), PAGES)
+
+if __name__ == "__main__":
+    unittest.main()
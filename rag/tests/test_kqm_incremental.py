@@ -0,0 +1,77 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from git import Actor, Repo
+
+from adapters.kqm import load_kqm_tcl_docs
+
+AUTHOR = Actor("fixture", "fixture@example.invalid")
+
+def commit(repo: Repo, files: dict[str, str | None], message: str) -> str:
+    root = Path(repo.working_tree_dir)
+    for rel, text in files.items():
+        path = root / rel
+        if text is None:
+            repo.index.remove([rel], working_tree=True)
+            continue
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(text, encoding="utf-8")
+        repo.index.add([rel])
+    return repo.index.commit(message, author=AUTHOR, committer=AUTHOR).hexsha
+
+class KqmIncrementalScanTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        root = Path(self.tmp.name)
+        self.upstream = Repo.init(root / "upstream")
+        self.base = commit(self.upstream, {"chars/a.md": "# A\nold", "chars/b.md": "# B", "README.md": "# readme"}, "base")
+        Repo.clone_from(str(root / "upstream"), str(root / "clone"))
+        self.state = root / "state" / "kqm_tcl_last_commit.txt"
+        self.state.parent.mkdir()
+        self.cfg = {"name": "kqm_tcl", "path": str(root / "clone"), "state_file": str(self.state)}
+
+    def tearDown(self):
+        self.upstream.close()
+        self.tmp.cleanup()
+
+    def scan(self, since: str | None):
+        if since is not None:
+            self.state.write_text(since, encoding="utf-8")
+        deleted: list[str] = []
+        completed: list[str] = []
+        urls = [url for url, *_ in load_kqm_tcl_docs(self.cfg, on_deleted=deleted.extend, on_complete=completed.append)]
+        return sorted(urls), sorted(deleted), completed
+
+    def test_changed_and_deleted_files_since_recorded_commit(self):
+        head = commit(self.upstream, {"chars/a.md": "# A\nnew", "chars/b.md": None, "chars/c.md": "# C", "README.md": "# readme v2"}, "update")
+
+        urls, deleted, completed = self.scan(self.base)
+        self.assertEqual(urls, ["kqm://kqm_tcl/chars/a.md", "kqm://kqm_tcl/chars/c.md"])
+        self.assertEqual(deleted, ["kqm://kqm_tcl/chars/b.md"])
+        self.assertEqual(completed, [head])
+        # Recording is left to the caller, after ingest succeeds.
+        self.assertEqual(self.state.read_text(encoding="utf-8"), self.base)
+
+    def test_unknown_since_commit_falls_back_to_full_scan(self):
+        commit(self.upstream, {"chars/c.md": "# C"}, "add c")
+
+        urls, deleted, completed = self.scan("0" * 40)
+        self.assertEqual(urls, ["kqm://kqm_tcl/chars/a.md", "kqm://kqm_tcl/chars/b.md", "kqm://kqm_tcl/chars/c.md"])
+        self.assertEqual(deleted, [])
+        self.assertEqual(len(completed), 1)
+
+    def test_commit_not_recorded_until_generator_is_drained(self):
+        head = commit(self.upstream, {"chars/a.md": "# A\nnew", "chars/c.md": "# C"}, "update")
+        self.state.write_text(self.base, encoding="utf-8")
+
+        docs = load_kqm_tcl_docs(self.cfg)
+        next(docs)
+        docs.close()
+        self.assertEqual(self.state.read_text(encoding="utf-8"), self.base)
+
+        list(load_kqm_tcl_docs(self.cfg))
+        self.assertEqual(self.state.read_text(encoding="utf-8"), head)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+import json
+import queue
+import tempfile
+import unittest
+from pathlib import Path
+
+from core.telemetry import PipelineTelemetry, render_prometheus
+
+class TelemetryTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def telemetry(self, fmt: str, name: str) -> PipelineTelemetry:
+        t = PipelineTelemetry(self.root / name, fmt=fmt)
+        q = queue.Queue(maxsize=8)
+        q.put(1)
+        t.watch_queue("doc_q", q)
+        t.count("produced:wiki", 3)
+        t.count("written_docs", 2)
+        t.observe("fetch:wiki", 0.5)
+        t.observe("fetch:wiki", 1.5)
+        t.observe("sqlite_write:docs", 0.25)
+        return t
+
+    def test_render_prometheus_labels(self):
+        text = render_prometheus(self.telemetry("jsonl", "unused.jsonl").snapshot())
+        lines = set(text.splitlines())
+        self.assertIn('rag_ingest_queue_depth{queue="doc_q"} 1', lines)
+        self.assertIn('rag_ingest_queue_capacity{queue="doc_q"} 8', lines)
+        self.assertIn('rag_ingest_items_total{stage="produced",source="wiki"} 3', lines)
+        self.assertIn('rag_ingest_items_total{stage="written_docs"} 2', lines)
+        self.assertIn('rag_ingest_seconds_sum{stage="fetch",source="wiki"} 2.000000', lines)
+        self.assertIn('rag_ingest_seconds_count{stage="fetch",source="wiki"} 2', lines)
+        self.assertIn('rag_ingest_seconds_max{stage="fetch",source="wiki"} 1.500000', lines)
+        # sqlite_write:docs is a table written, not a source.
+        self.assertIn('rag_ingest_seconds_sum{stage="sqlite_write",kind="docs"} 0.250000', lines)
+        self.assertNotIn('source="docs"', text)
+
+    def test_prometheus_writer_replaces_the_textfile(self):
+        t = self.telemetry("prometheus", "ingest.prom")
+        t.write()
+        t.count("written_docs", 5)
+        t.write()
+        text = (self.root / "ingest.prom").read_text(encoding="utf-8")
+        self.assertEqual(text.count("# TYPE rag_ingest_items_total counter"), 1)
+        self.assertIn('rag_ingest_items_total{stage="written_docs"} 7', text)
+        self.assertFalse((self.root / "ingest.prom.tmp").exists())
+
+    def test_jsonl_writer_appends_snapshots(self):
+        t = self.telemetry("jsonl", "ingest.jsonl")
+        t.write()
+        t.count("written_docs", 5)
+        t.write()
+        snaps = [json.loads(line) for line in (self.root / "ingest.jsonl").read_text(encoding="utf-8").splitlines()]
+        self.assertEqual(len(snaps), 2)
+        self.assertEqual(snaps[0]["counters"]["written_docs"]["total"], 2)
+        self.assertEqual(snaps[1]["counters"]["written_docs"]["total"], 7)
+        self.assertEqual(snaps[0]["queues"]["doc_q"], {"depth": 1, "maxsize": 8})
+        self.assertEqual(snaps[0]["timers"]["fetch:wiki"]["count"], 2)
+        self.assertAlmostEqual(snaps[0]["timers"]["fetch:wiki"]["avg_s"], 1.0)
+
+if __name__ == "__main__":
+    unittest.main()
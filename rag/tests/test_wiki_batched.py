@@ -0,0 +1,133 @@
+import json
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import requests
+
+from adapters.wiki import iter_fandom_batched, query_page_revisions
+
+PAGES = 120
+TITLE_LIMIT = 50
+REDIRECTS = {"Old 2": "Page 2"}
+
+class StubApiHandler(BaseHTTPRequestHandler):
+    """Just enough of api.php for batched fetches: prop=revisions queries and parse by oldid."""
+
+    def do_GET(self):
+        params = {k: v[0] for k, v in parse_qs(urlparse(self.path).query).items()}
+        self.server.hits.append(params)
+        if params.get("action") == "query" and params.get("prop") == "revisions":
+            titles = params["titles"].split("|")
+            if len(titles) > TITLE_LIMIT:
+                self.reply(400, {"error": {"code": "toomanyvalues"}})
+                return
+            self.reply(200, {"batchcomplete": True, "query": self.query(titles)})
+        elif params.get("action") == "parse" and params.get("oldid"):
+            title = self.server.by_revid.get(int(params["oldid"]))
+            if title is None:
+                self.reply(200, {"error": {"code": "nosuchrevid"}})
+                return
+            html = f'<div class="mw-parser-output"><h2>{title}</h2><p>Body of {title} at revision {params["oldid"]}.</p></div>'
+            self.reply(200, {"parse": {"title": title, "revid": int(params["oldid"]), "text": html}})
+        else:
+            self.reply(400, {"error": {"code": "badparams"}})
+
+    def query(self, titles: list[str]) -> dict:
+        normalized = [{"from": t, "to": t[:1].upper() + t[1:]} for t in titles if t[:1].islower()]
+        names = [t[:1].upper() + t[1:] for t in titles]
+        redirects = [{"from": t, "to": REDIRECTS[t]} for t in names if t in REDIRECTS]
+        pages = []
+        for name in dict.fromkeys(REDIRECTS.get(t, t) for t in names):
+            revid = self.server.revids.get(name)
+            if revid is None:
+                pages.append({"ns": 0, "title": name, "missing": True})
+            else:
+                pages.append({"pageid": revid, "ns": 0, "title": name, "revisions": [{"revid": revid, "parentid": 0, "timestamp": "2026-01-01T00:00:00Z"}]})
+        query = {"pages": pages}
+        if normalized:
+            query["normalized"] = normalized
+        if redirects:
+            query["redirects"] = redirects
+        return query
+
+    def reply(self, status: int, payload: dict):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+class WikiBatchedTest(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), StubApiHandler)
+        self.server.hits = []
+        self.set_revids({f"Page {i}": 1000 + i for i in range(PAGES)})
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.api = f"http://127.0.0.1:{self.server.server_address[1]}/api.php"
+        self.session = requests.Session()
+        self.source_cfg = {"batch_size": 50, "fetch_workers": 4, "convert_workers": 0}
+
+    def tearDown(self):
+        self.session.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def set_revids(self, revids: dict[str, int]):
+        self.server.revids = revids
+        self.server.by_revid = {revid: title for title, revid in revids.items()}
+
+    def hits(self, action: str) -> list[dict]:
+        return [h for h in self.server.hits if h.get("action") == action]
+
+    def run_batched(self, titles: list[str], validators=None) -> list:
+        self.server.hits.clear()
+        return list(iter_fandom_batched(self.session, self.api, titles, self.source_cfg, 0.0, validators))
+
+    def test_normalized_and_redirected_titles_map_to_their_pages(self):
+        revisions = query_page_revisions(self.session, self.api, ["page 1", "Old 2", "old 2", "Page 3", "Nowhere"])
+        self.assertEqual(revisions["page 1"]["title"], "Page 1")
+        self.assertEqual(revisions["Old 2"]["title"], "Page 2")
+        # Normalized first, then redirected.
+        self.assertEqual(revisions["old 2"]["revid"], 1002)
+        self.assertEqual(revisions["Page 3"]["revid"], 1003)
+        self.assertNotIn("Nowhere", revisions)
+
+    def test_titles_are_batched_under_the_limit_and_fetched_by_oldid(self):
+        titles = [f"Page {i}" for i in range(PAGES)] + ["page 7", "Old 2", "Nowhere"]
+        docs = self.run_batched(titles)
+
+        queries = self.hits("query")
+        self.assertEqual([len(q["titles"].split("|")) for q in queries], [50, 50, 23])
+        # Aliases of pages already fetched and missing pages produce nothing.
+        self.assertEqual(len(docs), PAGES)
+        self.assertTrue(all(doc is not None for _, doc in docs))
+        self.assertEqual(sorted(int(h["oldid"]) for h in self.hits("parse")), sorted(range(1000, 1000 + PAGES)))
+
+        title, (url, doc_title, text, timestamp, etag) = next(d for d in docs if d[0] == "Page 5")
+        self.assertEqual(doc_title, "Page 5")
+        self.assertEqual(etag, "rev:1005")
+        self.assertIn("Body of Page 5 at revision 1005", text)
+        self.assertTrue(url.startswith(self.api))
+
+    def test_unchanged_revisions_are_not_fetched_again(self):
+        titles = [f"Page {i}" for i in range(PAGES)]
+        docs = self.run_batched(titles)
+        validators = {url: (etag, timestamp) for _, (url, _, _, timestamp, etag) in docs}
+
+        self.assertEqual(self.run_batched(titles, validators), [])
+        self.assertEqual(self.hits("parse"), [])
+        self.assertEqual(len(self.hits("query")), 3)
+
+        self.set_revids({**self.server.revids, "Page 42": 5000})
+        docs = self.run_batched(titles, validators)
+        self.assertEqual([title for title, _ in docs], ["Page 42"])
+        self.assertEqual([h["oldid"] for h in self.hits("parse")], ["5000"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -3,18 +3,24 @@ from __future__ import annotations
 import random
 import sqlite3
 import logging
+import time
 import json
 import faiss
 import numpy as np
 
 from pathlib import Path
-from dataclasses import dataclass
+from urllib.parse import unquote
+from bs4 import BeautifulSoup
+from dataclasses import dataclass, field
 from typing import Optional
 
 from utils.hashing import sha256_text
-from utils.codec import zstd_decompress_text
+from utils.codec import zstd_decompress_text, zstd_compress_text, frame_dictionary_id, ACTIVE_DICTIONARY, decode_vector
 from core.paths import resolve_db_path, resolve_faiss_dir
 from core.db import read_only_connect
+from core.vector_store import open_vector_store, vector_store_is_current
+from adapters.html import extract_links, extract_page, soup_title, soup_to_text
+from adapters.wiki import fandom_html_to_text
 
 log = logging.getLogger(__name__)
 
@@ -57,6 +63,8 @@ class CompressionStats:
     chunks_avg_zst: Optional[float]
     chunks_ratio: Optional[float]
 
+    benchmark: dict = field(default_factory=dict)
+
 @dataclass
 class FaissAuditReport:
     index_total: int
@@ -310,7 +318,67 @@ def audit_integrity(conn: sqlite3.Connection, sample_docs: Optional[int] = 50, s
         missing_embeddings=missing_embeddings,
         docs_missing_chunks=docs_missing_chunks)
 
-def compression_stats(conn: sqlite3.Connection, active_chunks_only: bool = True) -> CompressionStats:
+def benchmark_compression(texts: list[str], *, kind: str, level: int = 6) -> dict:
+    raw = sum(len(t.encode("utf-8")) for t in texts)
+    out: dict = {"samples": len(texts), "raw_bytes": raw}
+    if not texts or raw == 0:
+        return out
+    variants = [("plain", 0)]
+    if ACTIVE_DICTIONARY.get(kind):
+        variants.append(("dict", ACTIVE_DICTIONARY[kind]))
+    for label, dict_id in variants:
+        t0 = time.perf_counter()
+        blobs = [zstd_compress_text(t, level=level, dict_id=dict_id) for t in texts]
+        t1 = time.perf_counter()
+        for b in blobs:
+            zstd_decompress_text(b)
+        t2 = time.perf_counter()
+        zst = sum(len(b) for b in blobs)
+        out[label] = {
+            "dict_id": dict_id,
+            "zst_bytes": zst,
+            "ratio": zst / raw,
+            "compress_mb_s": (raw / 1e6) / max(t1 - t0, 1e-9),
+            "decompress_mb_s": (raw / 1e6) / max(t2 - t1, 1e-9),
+        }
+    return out
+
+def reference_html_extraction(html: str, url: str) -> tuple[str, str, list[str]]:
+    if "fandom.com" in url:
+        return fandom_html_to_text(html, reparse=True), url, []
+    text = soup_to_text(BeautifulSoup(html, "lxml"), url, reparse=True)
+    title = soup_title(BeautifulSoup(html, "lxml"), url)
+    return text, title, list(dict.fromkeys(extract_links(html, url)))
+
+def fast_html_extraction(html: str, url: str) -> tuple[str, str, list[str]]:
+    if "fandom.com" in url:
+        return fandom_html_to_text(html), url, []
+    return extract_page(html, url)
+
+def benchmark_html_extraction(fixtures_dir: str | Path, *, limit: int | None = None, rounds: int = 3) -> dict:
+    pages = []
+    for path in sorted(Path(fixtures_dir).glob("*.html"))[:limit]:
+        pages.append((unquote(path.stem), path.read_text(encoding="utf-8", errors="replace")))
+    out: dict = {"pages": len(pages), "mismatches": []}
+    if not pages:
+        return out
+
+    for url, html in pages:
+        if reference_html_extraction(html, url) != fast_html_extraction(html, url):
+            out["mismatches"].append(url)
+
+    for label, extract in (("reference", reference_html_extraction), ("fast", fast_html_extraction)):
+        best = float("inf")
+        for _ in range(max(1, rounds)):
+            t0 = time.perf_counter()
+            for url, html in pages:
+                extract(html, url)
+            best = min(best, time.perf_counter() - t0)
+        out[f"{label}_pages_s"] = len(pages) / max(best, 1e-9)
+    out["speedup"] = out["fast_pages_s"] / max(out["reference_pages_s"], 1e-9)
+    return out
+
+def compression_stats(conn: sqlite3.Connection, active_chunks_only: bool = True, benchmark_sample: int = 0, seed: int = 1337) -> CompressionStats:
     cur = conn.cursor()
     cur.execute("""
     SELECT COUNT(*), AVG(raw_len), AVG(raw_zst_len)
@@ -339,6 +407,27 @@ def compression_stats(conn: sqlite3.Connection, active_chunks_only: bool = True)
     if c_rows and c_avg_raw and c_avg_zst and c_avg_raw > 0:
         c_ratio = float(c_avg_zst) / float(c_avg_raw)
 
+    benchmark: dict = {}
+    if benchmark_sample > 0:
+        rng = random.Random(seed)
+        for kind, table, id_col, blob_col, where in (
+            ("chunks", "chunks", "chunk_id", "text_zst", chunk_where),
+            ("docs", "docs", "doc_id", "raw_zst", "raw_zst IS NOT NULL"),
+        ):
+            ids = [row[0] for row in cur.execute(f"SELECT {id_col} FROM {table} WHERE {where}").fetchall()]
+            picked_ids = sample(ids, benchmark_sample if kind == "chunks" else max(1, benchmark_sample // 10), rng)
+            picked = []
+            for start in range(0, len(picked_ids), 500):
+                part = picked_ids[start:start + 500]
+                placeholders = ",".join("?" for _ in part)
+                picked.extend(row[0] for row in cur.execute(f"SELECT {blob_col} FROM {table} WHERE {id_col} IN ({placeholders})", part).fetchall())
+            stored_dicts: dict[int, int] = {}
+            for b in picked:
+                dict_id = frame_dictionary_id(b)
+                stored_dicts[dict_id] = stored_dicts.get(dict_id, 0) + 1
+            benchmark[kind] = benchmark_compression([zstd_decompress_text(b) for b in picked], kind=kind)
+            benchmark[kind]["stored_dict_ids"] = stored_dicts
+
     return CompressionStats(
         docs_rows=int(d_rows or 0),
         docs_avg_raw=float(d_avg_raw) if d_avg_raw is not None else None,
@@ -349,6 +438,7 @@ def compression_stats(conn: sqlite3.Connection, active_chunks_only: bool = True)
         chunks_avg_raw=float(c_avg_raw) if c_avg_raw is not None else None,
         chunks_avg_zst=float(c_avg_zst) if c_avg_zst is not None else None,
         chunks_ratio=c_ratio,
+        benchmark=benchmark,
     )
 
 def audit_faiss_against_sqlite(cfg: dict, *, index_dir: str | None = None, sample_self_test: int = 200,) -> FaissAuditReport:
@@ -414,21 +504,34 @@ def audit_faiss_against_sqlite(cfg: dict, *, index_dir: str | None = None, sampl
     sqlite_active_embeds = int(cur.fetchone()[0] or 0)
 
     
-    cur.execute("""
-        SELECT e.chunk_id
-        FROM embeddings e
-        JOIN chunks c ON c.chunk_id = e.chunk_id
-        WHERE c.is_active=1
-        ORDER BY e.chunk_id
-    """)
-    sqlite_ids = [int(x[0]) for x in cur.fetchall()]
+    store = open_vector_store(cfg)
+    if store is not None and not vector_store_is_current(conn, store):
+        log.warning("[FAISS_AUDIT] vector store is behind the dirty log; reading ids from SQLite")
+        store.close()
+        store = None
+
+    if store is not None:
+        sqlite_ids = store.sorted_ids
+    else:
+        cur.execute("""
+            SELECT e.chunk_id
+            FROM embeddings e
+            JOIN chunks c ON c.chunk_id = e.chunk_id
+            WHERE c.is_active=1
+            ORDER BY e.chunk_id
+        """)
+        sqlite_ids = np.fromiter((x[0] for x in cur), dtype=np.int64)
 
-    faiss_ids = ids.astype(np.int64, copy=False).tolist()
+    # Incremental updates append to ids.npy, so id-mapped bundles are compared as a set.
+    id_map = bool(meta.get("id_map", False))
+    faiss_ids = ids.astype(np.int64, copy=False)
+    if id_map:
+        faiss_ids = np.sort(faiss_ids)
 
     if len(sqlite_ids) != len(faiss_ids):
         failures.append(f"count_mismatch: sqlite_active={len(sqlite_ids)} faiss={len(faiss_ids)}")
     else:
-        if sqlite_ids != faiss_ids:
+        if not np.array_equal(sqlite_ids, faiss_ids):
             failures.append("id_order_or_content_mismatch_between_sqlite_and_faiss")
 
     if hasattr(index, "reconstruct") and index.ntotal > 0 and d > 0:
@@ -439,18 +542,27 @@ def audit_faiss_against_sqlite(cfg: dict, *, index_dir: str | None = None, sampl
 
         for i in range(0, n, step):
             try:
-                index.reconstruct(i, q)
+                key = int(faiss_ids[i]) if id_map and i < len(faiss_ids) else i
+                index.reconstruct(key, q)
                 k = min(5, n)
                 D, I = index.search(q.reshape(1, -1), k)
                 got_positions = [int(x) for x in I[0] if int(x) >= 0]
                 top_score = float(D[0, 0]) if D.size else float("-inf")
-                if i in got_positions:
+                if key in got_positions:
                     pass
                 elif top_score >= 0.999999:
                     pass
                 else:
                     failures.append(f"self_test_failed_at={i} got_topk={got_positions} score={top_score}")
                     break
+                if store is not None and i < len(faiss_ids) and not meta.get("compressed"):
+                    row = int(store.find_rows(faiss_ids[i:i + 1])[0])
+                    if row >= 0 and store.norms[row] > 0:
+                        stored = store.vectors[row] / store.norms[row]
+                        cos = float(np.dot(stored, q) / max(float(np.linalg.norm(q)), 1e-12))
+                        if cos < 0.999:
+                            failures.append(f"vector_mismatch_at={i} chunk_id={int(faiss_ids[i])} cos={cos:.6f}")
+                            break
                 take -= 1
                 if take <= 0:
                     break
@@ -473,6 +585,9 @@ def audit_faiss_against_sqlite(cfg: dict, *, index_dir: str | None = None, sampl
     if meta_index and meta_index != cfg_index_mode:
         failures.append(f"index_mode_mismatch: cfg={cfg_index_mode} meta={meta_index}")
 
+    if store is not None:
+        store.close()
+
     return FaissAuditReport(
         index_total=int(index.ntotal),
         ids_total=int(len(ids)),
@@ -615,13 +730,12 @@ def audit_turbovec_against_sqlite(cfg: dict, *, index_dir: str | None = None, sa
                 failures.append(f"embedding_dims_mismatch: chunk_id={chunk_id} faiss={d} db={dims}")
                 continue
 
-            q = np.frombuffer(blob, dtype=np.float32)
-            if q.size != d:
-                failures.append(f"sample_vector_size_mismatch: chunk_id={chunk_id} expected={d} got={q.size}")
+            try:
+                q = decode_vector(blob, d)
+            except ValueError:
+                failures.append(f"sample_vector_size_mismatch: chunk_id={chunk_id} expected={d} got_bytes={len(blob)}")
                 break
 
-            q = q.astype(np.float32, copy=False)
-
             if bool(meta.get("normalized", True)):
                 norm = np.linalg.norm(q)
                 if norm > 0:
@@ -1,9 +1,124 @@
+import threading
+
+import numpy as np
 import zstandard as zstd
 
-def zstd_compress_text(s: str, level: int = 6) -> bytes:
-    c = zstd.ZstdCompressor(level=level)
+thread_state = threading.local()
+DICTIONARIES: dict[int, zstd.ZstdCompressionDict] = {}
+ACTIVE_DICTIONARY: dict[str, int] = {}
+
+def register_zstd_dictionary(dict_id: int, data: bytes, kind: str | None = None, active: bool = False) -> None:
+    DICTIONARIES[int(dict_id)] = zstd.ZstdCompressionDict(bytes(data))
+    if kind and active:
+        ACTIVE_DICTIONARY[kind] = int(dict_id)
+
+def export_zstd_dictionaries() -> list[tuple[int, bytes, str | None, bool]]:
+    active = {dict_id: kind for kind, dict_id in ACTIVE_DICTIONARY.items()}
+    return [(dict_id, d.as_bytes(), active.get(dict_id), dict_id in active) for dict_id, d in DICTIONARIES.items()]
+
+def import_zstd_dictionaries(entries: list[tuple[int, bytes, str | None, bool]]) -> None:
+    for dict_id, data, kind, active in entries or []:
+        register_zstd_dictionary(dict_id, data, kind=kind, active=active)
+
+def active_dictionary_id(kind: str | None) -> int:
+    return ACTIVE_DICTIONARY.get(kind, 0) if kind else 0
+
+def get_compressor(level: int, dict_id: int = 0) -> zstd.ZstdCompressor:
+    cache = getattr(thread_state, "compressors", None)
+    if cache is None:
+        cache = thread_state.compressors = {}
+    c = cache.get((level, dict_id))
+    if c is None:
+        c = zstd.ZstdCompressor(level=level, dict_data=DICTIONARIES[dict_id]) if dict_id else zstd.ZstdCompressor(level=level)
+        cache[(level, dict_id)] = c
+    return c
+
+def get_decompressor(dict_id: int = 0) -> zstd.ZstdDecompressor:
+    cache = getattr(thread_state, "decompressors", None)
+    if cache is None:
+        cache = thread_state.decompressors = {}
+    d = cache.get(dict_id)
+    if d is None:
+        if dict_id and dict_id not in DICTIONARIES:
+            raise RuntimeError(f"zstd dictionary {dict_id} is not loaded; call load_zstd_dictionaries(conn) first")
+        d = zstd.ZstdDecompressor(dict_data=DICTIONARIES[dict_id]) if dict_id else zstd.ZstdDecompressor()
+        cache[dict_id] = d
+    return d
+
+def frame_dictionary_id(b: bytes) -> int:
+    return int(zstd.get_frame_parameters(b).dict_id)
+
+def zstd_compress_text(s: str, level: int = 6, kind: str | None = None, dict_id: int | None = None) -> bytes:
+    c = get_compressor(level, active_dictionary_id(kind) if dict_id is None else dict_id)
     return c.compress(s.encode("utf-8"))
 
 def zstd_decompress_text(b: bytes) -> str:
-    d = zstd.ZstdDecompressor()
-    return d.decompress(b).decode("utf-8")
\ No newline at end of file
+    d = get_decompressor(frame_dictionary_id(b))
+    return d.decompress(b).decode("utf-8")
+
+def train_zstd_dictionary(samples: list[bytes], dict_size: int = 112 * 1024, level: int = 6) -> zstd.ZstdCompressionDict:
+    return zstd.train_dictionary(dict_size, samples, level=level)
+
+VECTOR_DTYPES = ("float32", "float16", "int8")
+
+def normalize_vector_dtype(name: str | None) -> str:
+    x = str(name or "float32").strip().lower()
+    x = {"f32": "float32", "fp32": "float32", "f16": "float16", "fp16": "float16", "half": "float16", "i8": "int8", "sq8": "int8"}.get(x, x)
+    if x not in VECTOR_DTYPES:
+        raise ValueError(f"unsupported embedding dtype: {name!r} (expected one of {VECTOR_DTYPES})")
+    return x
+
+def vector_blob_dtype(size: int, dims: int) -> str:
+    # The layout is implied by the blob length, so rows of different dtypes can coexist mid-migration.
+    if size == 4 * dims:
+        return "float32"
+    if size == 2 * dims:
+        return "float16"
+    if size == dims + 4:
+        return "int8"
+    raise ValueError(f"vector size mismatch: {size} bytes does not match dims={dims} as float32, float16 or int8")
+
+def encode_vectors(vectors: np.ndarray, dtype: str = "float32") -> list[bytes]:
+    X = np.asarray(vectors, dtype=np.float32)
+    if X.ndim == 1:
+        X = X.reshape(1, -1)
+    if dtype == "float32":
+        packed = np.ascontiguousarray(X, dtype="<f4").view(np.uint8)
+    elif dtype == "float16":
+        packed = np.ascontiguousarray(X, dtype="<f2").view(np.uint8)
+    elif dtype == "int8":
+        scale = (np.abs(X).max(axis=1) / 127.0).astype("<f4")
+        q = np.rint(np.divide(X, scale[:, None], out=np.zeros_like(X), where=scale[:, None] > 0))
+        q = np.clip(q, -127, 127).astype(np.int8)
+        packed = np.hstack([scale.reshape(-1, 1).view(np.uint8), q.view(np.uint8)])
+    else:
+        raise ValueError(f"unsupported embedding dtype: {dtype!r}")
+    return [row.tobytes() for row in packed]
+
+def encode_vector(vector: np.ndarray, dtype: str = "float32") -> bytes:
+    return encode_vectors(vector, dtype)[0]
+
+def decode_vector_block(joined: bytes, n: int, dims: int, dtype: str) -> np.ndarray:
+    if dtype == "float32":
+        return np.frombuffer(joined, dtype="<f4").reshape(n, dims)
+    if dtype == "float16":
+        return np.frombuffer(joined, dtype="<f2").reshape(n, dims).astype(np.float32)
+    raw = np.frombuffer(joined, dtype=np.uint8).reshape(n, dims + 4)
+    scale = raw[:, :4].copy().view("<f4")
+    return raw[:, 4:].view(np.int8).astype(np.float32) * scale
+
+def decode_vector(blob: bytes, dims: int) -> np.ndarray:
+    return decode_vector_block(blob, 1, dims, vector_blob_dtype(len(blob), dims))[0]
+
+def decode_vectors(blobs: list[bytes], dims: int) -> np.ndarray:
+    if not blobs:
+        return np.empty((0, dims), dtype=np.float32)
+    sizes = {len(b) for b in blobs}
+    if len(sizes) == 1:
+        return decode_vector_block(b"".join(blobs), len(blobs), dims, vector_blob_dtype(sizes.pop(), dims))
+    return np.stack([decode_vector(b, dims) for b in blobs], axis=0)
+
+def convert_vector_blob(blob: bytes, dims: int, dtype: str) -> bytes:
+    if vector_blob_dtype(len(blob), dims) == dtype:
+        return blob
+    return encode_vector(decode_vector(blob, dims), dtype)
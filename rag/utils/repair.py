@@ -3,7 +3,8 @@ import logging
 import sqlite3
 from typing import Callable
 
-from utils.codec import zstd_decompress_text
+from utils.codec import zstd_decompress_text, convert_vector_blob
+from core.compression import resolve_embedding_dtype
 from core.pipeline import process_document
 
 log = logging.getLogger(__name__)
@@ -62,9 +63,10 @@ def repair_doc_from_archived_raw(conn: sqlite3.Connection, embed_fn: Callable, c
         log.exception("[REPAIR] failed archived-raw repair doc_id=%s url=%s", doc_row["doc_id"], doc_row["url"])
         return False
     
-def repair_missing_embeddings(conn: sqlite3.Connection, embed_fn: Callable, cfg: dict, rows: list[dict]) -> int:
+def repair_missing_embeddings(conn: sqlite3.Connection, embed_fn: Callable, cfg: dict, rows: list[dict], embed_cache=None) -> int:
     repaired = 0
     max_chars = int(cfg.get("pipeline", {}).get("max_embed_chars", 1800))
+    embed_dtype = resolve_embedding_dtype(conn, cfg)
     cur = conn.cursor()
 
     for row in rows:
@@ -72,8 +74,15 @@ def repair_missing_embeddings(conn: sqlite3.Connection, embed_fn: Callable, cfg:
         txt = row["text"] or ""
         safe_txt = txt[:max_chars] if len(txt) > max_chars else txt
         try:
-            vec, dims = embed_fn(safe_txt, title=row.get("title"))
-            cur.execute("INSERT OR REPLACE INTO embeddings(chunk_id, dims, vector) VALUES (?, ?, ?)", (chunk_id, dims, vec))
+            cache_key = embed_cache.key_for(safe_txt, row.get("title")) if embed_cache is not None else None
+            hit = embed_cache.get_many([cache_key]).get(cache_key) if cache_key is not None else None
+            if hit is not None:
+                vec, dims = hit
+            else:
+                vec, dims = embed_fn(safe_txt, title=row.get("title"))
+                if cache_key is not None:
+                    embed_cache.put_many([(cache_key, vec, dims)])
+            cur.execute("INSERT OR REPLACE INTO embeddings(chunk_id, dims, vector) VALUES (?, ?, ?)", (chunk_id, dims, convert_vector_blob(vec, dims, embed_dtype)))
             repaired += 1
         except Exception:
             log.exception("[REPAIR] failed embedding repair chunk_id=%s doc_id=%s url=%s", chunk_id, row["doc_id"], row["url"])
@@ -81,7 +90,7 @@ def repair_missing_embeddings(conn: sqlite3.Connection, embed_fn: Callable, cfg:
     conn.commit()
     return repaired
 
-def repair_database(conn: sqlite3.Connection, embed_fn: Callable, cfg: dict) -> dict:
+def repair_database(conn: sqlite3.Connection, embed_fn: Callable, cfg: dict, embed_cache=None) -> dict:
     report = {
         "docs_no_active_chunks_found": 0,
         "docs_no_active_chunks_repaired": 0,
@@ -98,6 +107,8 @@ def repair_database(conn: sqlite3.Connection, embed_fn: Callable, cfg: dict) ->
     missing_embed = find_active_chunks_missing_embeddings(conn)
     report["chunks_missing_embeddings_found"] = len(missing_embed)
 
-    repaired = repair_missing_embeddings(conn, embed_fn, cfg, missing_embed)
+    repaired = repair_missing_embeddings(conn, embed_fn, cfg, missing_embed, embed_cache=embed_cache)
+    if embed_cache is not None:
+        embed_cache.log_stats("repair")
     report["chunks_missing_embeddings_repaired"] = repaired
     return report
\ No newline at end of file
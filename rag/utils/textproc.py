@@ -1,4 +1,4 @@
-import re, unicodedata
+import re, unicodedata, zlib
 
 SENTENCE_END = re.compile(r'(?<=[.!?。！？])\s+')
 
@@ -40,4 +40,74 @@ def chunk_text(text: str, size=2400, overlap=300) -> list[str]:
         if i >= j:
             i = j
 
-    return chunks
\ No newline at end of file
+    return chunks
+
+CDC_BOUNDARY = re.compile(r'(?<=[.!?。！？])\s+|\n+')
+HEADING_LINE = re.compile(r'#{1,6}\s')
+
+def split_cdc_segments(text: str, max_size: int) -> list[str]:
+    segments = []
+    start = 0
+    for m in CDC_BOUNDARY.finditer(text):
+        if m.end() > start:
+            segments.append(text[start:m.end()])
+            start = m.end()
+    if start < len(text):
+        segments.append(text[start:])
+
+    out = []
+    for seg in segments:
+        while len(seg) > max_size:
+            out.append(seg[:max_size])
+            seg = seg[max_size:]
+        if seg:
+            out.append(seg)
+    return out
+
+def cdc_overlap_tail(chunk: str, overlap: int) -> str:
+    if overlap <= 0 or len(chunk) <= overlap:
+        return ""
+    tail = chunk[-overlap:]
+    m = CDC_BOUNDARY.search(tail)
+    return tail[m.end():] if m else ""
+
+def chunk_text_cdc(text: str, size=2400, overlap=300, min_size: int | None = None, window: int = 64) -> list[str]:
+    text = text.strip()
+    if not text:
+        return []
+
+    max_size = max(1, size - overlap)
+    min_size = min(max_size, max(1, int(min_size if min_size is not None else max_size // 2)))
+    spread = max(1, max_size - min_size)
+
+    bodies = []
+    current = ""
+    for seg in split_cdc_segments(text, max_size):
+        if current and len(current) >= min_size and HEADING_LINE.match(seg):
+            bodies.append(current)
+            current = ""
+        if current and len(current) + len(seg) > max_size:
+            bodies.append(current)
+            current = ""
+        current += seg
+        if len(current) >= min_size:
+            anchor = current[-window:].strip().encode("utf-8")
+            if zlib.crc32(anchor) < 0x100000000 * min(1.0, len(seg) / spread):
+                bodies.append(current)
+                current = ""
+    if current.strip():
+        bodies.append(current)
+
+    chunks = []
+    prev = ""
+    for body in bodies:
+        chunk = (cdc_overlap_tail(prev, overlap) + body).strip()
+        if chunk:
+            chunks.append(chunk)
+        prev = body
+    return chunks
+
+def chunk_document_text(text: str, size=2400, overlap=300, mode: str = "fixed") -> list[str]:
+    if mode == "cdc":
+        return chunk_text_cdc(text, size, overlap)
+    return chunk_text(text, size, overlap)
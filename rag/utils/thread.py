@@ -1,9 +1,15 @@
-import threading, queue, logging, time
+import threading, queue, logging, time, os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass
 from typing import Callable
-from core.pipeline import process_document, defang_tables
-from core.db import connect
-from core.embed import NonRetryableEmbedError
+from core.pipeline import prepare_document, prepare_unchanged_document, source_config, write_document_batch, refresh_document_metadata, defang_tables, PreparedDocument
+from core.db import connect, get_embedding_meta, set_embedding_meta, load_document_state
+from core.embed import NonRetryableEmbedError, embedding_signature, passage_prompt_uses_title
+from core.embed_client import AdaptiveEmbedClient, pack_length_buckets
+from utils.codec import export_zstd_dictionaries, import_zstd_dictionaries, convert_vector_blob
+from core.compression import resolve_embedding_dtype
+from utils.hashing import sha256_text
 
 log = logging.getLogger(__name__)
 STOP = object()
@@ -83,8 +89,10 @@ def embed_batch_resilient(embed_fn, prepared_jobs, min_chars, worker_id):
         right = embed_batch_resilient(embed_fn, prepared_jobs[mid:], min_chars, worker_id)
         return left + right
 
-def producer(source_name: str, docs_iter, out_q: queue.Queue, source_filters=None):
+def producer(source_name: str, docs_iter, out_q: queue.Queue, source_filters=None, telemetry=None):
     produced = 0
+    if telemetry is not None:
+        docs_iter = telemetry.timed_iter(f"fetch:{source_name}", docs_iter)
     try:
         for item in docs_iter:
             if len(item) == 5:
@@ -117,8 +125,12 @@ def producer(source_name: str, docs_iter, out_q: queue.Queue, source_filters=Non
 
             if out_q.full():
                 log.warning("[PRODUCER] [%s] doc queue FULL; waiting...", source_name)
+            t_put = time.perf_counter()
             out_q.put((source_name, url, title, text, last_modified, etag))
             produced += 1
+            if telemetry is not None:
+                telemetry.observe(f"doc_q_put_wait:{source_name}", time.perf_counter() - t_put)
+                telemetry.count(f"produced:{source_name}")
             if produced % out_q.maxsize == 0:
                 log.info("[PRODUCER] [%s] produced=%d q=%d", source_name, produced, out_q.qsize())
     except Exception:
@@ -127,10 +139,44 @@ def producer(source_name: str, docs_iter, out_q: queue.Queue, source_filters=Non
         out_q.put((source_name, STOP, STOP, STOP, STOP, STOP))
         log.info("[PRODUCER] [%s] finished produced=%d", source_name, produced)
 
-def embed_worker(embed_fn: Callable[[str], tuple[bytes, int]], embed_q: queue.Queue, res_q: queue.Queue, cfg: dict, worker_id: int):
+def embed_prepared_batch(embed_fn, prepared_jobs: list[tuple[EmbedJob, str]], res_q: queue.Queue, min_chars: int, worker_id: int, embed_cache=None, cache_keys: dict[int, str] | None = None, telemetry=None) -> None:
+    batch_texts = [txt for _, txt in prepared_jobs]
+    batch_titles = [job.title for job, _ in prepared_jobs]
+    if telemetry is not None:
+        telemetry.count("embed_requested", len(prepared_jobs))
+    try:
+        t_call = time.perf_counter()
+        batch_result = embed_fn(batch_texts, title = batch_titles)
+        if telemetry is not None:
+            telemetry.observe("embed_call", time.perf_counter() - t_call)
+        if isinstance(batch_result, list) and len(batch_result) == len(prepared_jobs):
+            for (job, _), (blob, dims) in zip(prepared_jobs, batch_result):
+                res_q.put(EmbedResult(chunk_id=job.chunk_id, dims=dims, vec=blob))
+            if embed_cache is not None and cache_keys is not None:
+                embed_cache.put_many([(cache_keys[job.chunk_id], blob, dims) for (job, _), (blob, dims) in zip(prepared_jobs, batch_result)])
+            log.debug("[EMBED-%d] batch ok size=%d chars=%d", worker_id, len(prepared_jobs), sum(len(t) for t in batch_texts))
+            return
+        log.warning("[EMBED-%d] batch unexpected shape expected=%d got=%s, falling back", worker_id, len(prepared_jobs), len(batch_result) if isinstance(batch_result, list) else type(batch_result).__name__)
+    except Exception as e:
+        log.warning("[EMBED-%d] batch embed failed (%s), falling back to per-item",
+                    worker_id, type(e).__name__)
+    results = embed_batch_resilient(embed_fn, prepared_jobs, min_chars, worker_id)
+    for res in results:
+        res_q.put(res)
+    if embed_cache is not None and cache_keys is not None:
+        embed_cache.put_many([(cache_keys[res.chunk_id], res.vec, res.dims) for res in results if res.vec is not None])
+
+def embed_worker(embed_fn: Callable[[str], tuple[bytes, int]], embed_q: queue.Queue, res_q: queue.Queue, cfg: dict, worker_id: int, embed_cache=None, telemetry=None):
     max_chars = int(cfg.get("pipeline", {}).get("max_embed_chars", 1800))
     min_chars = int(cfg.get("pipeline", {}).get("min_embed_chars", 800))
-    batch_size = int(cfg.get("threading", {}).get("embed_batch_size", 4))
+    threading_cfg = cfg.get("threading", {}) or {}
+    batch_size = int(threading_cfg.get("embed_batch_size", 4))
+    batch_chars = int(threading_cfg.get("embed_batch_chars", 0))
+    collect_factor = max(1, int(threading_cfg.get("embed_collect_factor", 1)))
+    linger_s = float(threading_cfg.get("embed_linger_ms", 0)) / 1000.0
+    bucket_bounds = sorted(int(x) for x in (threading_cfg.get("embed_length_buckets") or []))
+    collect_items = batch_size * collect_factor
+    collect_chars = batch_chars * collect_factor
 
     while True:
         first_job = embed_q.get()
@@ -139,14 +185,18 @@ def embed_worker(embed_fn: Callable[[str], tuple[bytes, int]], embed_q: queue.Qu
             if first_job is STOP:
                 return
 
-            while len(jobs) < batch_size:
+            collected_chars = len(first_job.text or "")
+            deadline = time.monotonic() + linger_s
+            while len(jobs) < collect_items and (collect_chars <= 0 or collected_chars < collect_chars):
                 try:
-                    nxt = embed_q.get_nowait()
+                    wait_s = deadline - time.monotonic()
+                    nxt = embed_q.get(timeout=wait_s) if wait_s > 0 else embed_q.get_nowait()
                     if nxt is STOP:
                         embed_q.task_done()
                         embed_q.put(STOP)
                         break
                     jobs.append(nxt)
+                    collected_chars += len(nxt.text or "")
                 except queue.Empty:
                     break
 
@@ -158,57 +208,248 @@ def embed_worker(embed_fn: Callable[[str], tuple[bytes, int]], embed_q: queue.Qu
                 safe_txt = defang_tables(safe_txt)
                 prepared_jobs.append((job, safe_txt))
 
-            batch_success = False
-            if len(prepared_jobs) > 1:
-                batch_texts = [txt for _, txt in prepared_jobs]
-                batch_titles = [job.title for job, _ in prepared_jobs]
-                try:
-                    batch_result = embed_fn(batch_texts, title = batch_titles)
-                    if isinstance(batch_result, list) and len(batch_result) == len(prepared_jobs):
-                        for (job, _), (blob, dims) in zip(prepared_jobs, batch_result):
-                            res_q.put(EmbedResult(chunk_id=job.chunk_id, dims=dims, vec=blob))
-                        log.debug("[EMBED-%d] batch ok size=%d", worker_id, len(prepared_jobs))
-                        batch_success = True
+            cache_keys: dict[int, str] = {}
+            if embed_cache is not None:
+                cache_keys = {job.chunk_id: embed_cache.key_for(txt, job.title) for job, txt in prepared_jobs}
+                cached = embed_cache.get_many(list(cache_keys.values()))
+                misses: list[tuple[EmbedJob, str]] = []
+                for job, txt in prepared_jobs:
+                    hit = cached.get(cache_keys[job.chunk_id])
+                    if hit is None:
+                        misses.append((job, txt))
                     else:
-                        log.warning("[EMBED-%d] batch unexpected shape expected=%d got=%s, falling back", worker_id, len(prepared_jobs), len(batch_result) if isinstance(batch_result, list) else type(batch_result).__name__)
-                except Exception as e:
-                    log.warning("[EMBED-%d] batch embed failed (%s), falling back to per-item",
-                                worker_id, type(e).__name__)
-            if not batch_success:
-                results = embed_batch_resilient(embed_fn, prepared_jobs, min_chars, worker_id)
-                for res in results:
-                    res_q.put(res)
+                        res_q.put(EmbedResult(chunk_id=job.chunk_id, dims=hit[1], vec=hit[0]))
+                if telemetry is not None:
+                    telemetry.count("embed_cache_hits", len(prepared_jobs) - len(misses))
+                prepared_jobs = misses
+                if not prepared_jobs:
+                    continue
+
+            for batch in pack_length_buckets(prepared_jobs, lambda item: len(item[1]), max_items=batch_size, max_chars=batch_chars, bucket_bounds=bucket_bounds):
+                embed_prepared_batch(embed_fn, batch, res_q, min_chars, worker_id, embed_cache, cache_keys, telemetry)
 
         finally:
             for _ in jobs:
                 embed_q.task_done()
 
-def ingest_consumer(num_producers: int, doc_q: queue.Queue, db_path: str, embed_fn: Callable[[str], tuple[bytes, int]], cfg: dict, filters, tier_map: dict, weight_map: dict, embed_workers: int = 2, embed_queue_size: int = 200):
-    log.info("[INGEST] start db_path=%s producers=%d embed_workers=%d",db_path, num_producers, embed_workers)
+PREPARE_CFG: dict = {}
+
+def init_prepare_worker(cfg: dict, dictionaries: list | None = None) -> None:
+    global PREPARE_CFG
+    PREPARE_CFG = cfg
+    import_zstd_dictionaries(dictionaries or [])
+
+def prepare_document_task(item: tuple) -> PreparedDocument | None:
+    src, url, title, text, last_modified, etag, tier, weight = item
+    return prepare_document(PREPARE_CFG, src, url, title, text, tier=tier, weight=weight, last_modified=last_modified, etag=etag)
+
+def resolve_preprocess_workers(cfg: dict) -> int:
+    raw = (cfg.get("threading", {}) or {}).get("preprocess_workers")
+    if raw is None:
+        return max(1, (os.cpu_count() or 2) - 1)
+    return max(0, int(raw))
+
+def load_unchanged_state(db_path: str | None, cfg: dict) -> dict[str, tuple[str, bool]]:
+    if not db_path or not bool((cfg.get("pipeline", {}) or {}).get("unchanged_fast_path", True)):
+        return {}
+    t_state = time.monotonic()
     conn = connect(db_path)
+    try:
+        doc_state = load_document_state(conn)
+    finally:
+        conn.close()
+    log.info("[PREPROCESS] loaded document state docs=%d complete=%d in %.2fs", len(doc_state), sum(1 for _, complete in doc_state.values() if complete), time.monotonic() - t_state)
+    return doc_state
+
+def preprocess_worker(num_producers: int, doc_q: queue.Queue, out_q: queue.Queue, cfg: dict, filters, tier_map: dict, weight_map: dict, workers: int | None = None, telemetry=None, report: dict | None = None, db_path: str | None = None):
+    workers = resolve_preprocess_workers(cfg) if workers is None else workers
+    max_inflight = max(1, int((cfg.get("threading", {}) or {}).get("preprocess_inflight", max(workers, 1) * 8)))
+    log.info("[PREPROCESS] start producers=%d workers=%d inflight=%d", num_producers, workers, max_inflight)
+    # Unchanged, fully embedded docs are recognised here by raw_hash, before any chunking or compression is paid for.
+    doc_state = load_unchanged_state(db_path, cfg)
+
+    pool = ProcessPoolExecutor(max_workers=workers, initializer=init_prepare_worker, initargs=(cfg, export_zstd_dictionaries())) if workers > 0 else None
+    init_prepare_worker(cfg)
+    inflight: deque = deque()
+    finished = submitted = skipped = failed = unchanged = stops_sent = 0
+    t0 = time.monotonic()
+
+    def send_stop() -> None:
+        nonlocal stops_sent
+        out_q.put(STOP)
+        stops_sent += 1
+
+    def handle_prepared(prepared: PreparedDocument | None) -> None:
+        nonlocal skipped
+        if prepared is None:
+            skipped += 1
+            return
+        out_q.put(prepared)
+        if telemetry is not None:
+            telemetry.count("prepared")
+
+    def emit(wait: bool = False) -> None:
+        nonlocal failed
+        while inflight:
+            entry = inflight[0]
+            if entry is not STOP and not entry.done() and not wait and len(inflight) < max_inflight:
+                return
+            inflight.popleft()
+            if entry is STOP:
+                send_stop()
+                continue
+            try:
+                handle_prepared(entry.result())
+            except Exception:
+                failed += 1
+                log.exception("[PREPROCESS] prepare failed")
+
+    try:
+        while finished < num_producers:
+            try:
+                src, url, title, text, last_modified, etag = doc_q.get(timeout=1.0)
+            except queue.Empty:
+                emit()
+                continue
+            try:
+                if url is STOP:
+                    finished += 1
+                    if pool is None:
+                        send_stop()
+                    else:
+                        inflight.append(STOP)
+                    continue
+
+                if not filters.url_allowed(url):
+                    skipped += 1
+                    continue
+                if not text or not text.strip():
+                    skipped += 1
+                    continue
+
+                tier, weight = tier_map.get(src, "primary"), weight_map.get(src, 1.0)
+                if doc_state and not source_config(cfg, src).get("force_rebuild", False):
+                    raw_text = str(text).strip()
+                    raw_hash = sha256_text(raw_text)
+                    if doc_state.get(url) == (raw_hash, True):
+                        unchanged += 1
+                        handle_prepared(prepare_unchanged_document(cfg, src, url, title, raw_text, raw_hash=raw_hash, tier=tier, weight=weight, last_modified=last_modified, etag=etag))
+                        continue
+                    # Once a URL takes the full path its stored state is stale; a repeat later in the run goes the full path too.
+                    doc_state.pop(url, None)
+
+                item = (src, url, title, text, last_modified, etag, tier, weight)
+                if pool is None:
+                    try:
+                        handle_prepared(prepare_document_task(item))
+                    except Exception:
+                        failed += 1
+                        log.exception("[PREPROCESS] prepare failed src=%s url=%s", src, url)
+                        continue
+                else:
+                    inflight.append(pool.submit(prepare_document_task, item))
+                submitted += 1
+                if submitted % 1000 == 0:
+                    elapsed = time.monotonic() - t0
+                    log.info("[PREPROCESS] submitted=%d unchanged=%d skipped=%d failed=%d inflight=%d out_q=%d %.1f docs/s", submitted, unchanged, skipped, failed, len(inflight), out_q.qsize(), submitted / max(elapsed, 1e-9))
+            finally:
+                doc_q.task_done()
+
+            emit()
+
+        emit(wait=True)
+        if report is not None:
+            report["completed"] = True
+    except Exception:
+        log.exception("[PREPROCESS] crashed")
+    finally:
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+        while stops_sent < num_producers:
+            send_stop()
+
+    elapsed = time.monotonic() - t0
+    log.info("[PREPROCESS] DONE submitted=%d unchanged=%d skipped=%d failed=%d %.1f docs/s", submitted, unchanged, skipped, failed, submitted / max(elapsed, 1e-9))
+    if report is not None:
+        report.update({"submitted": submitted, "unchanged": unchanged, "skipped": skipped, "failed": failed})
+
+def resolve_embedding_reuse(conn, cfg: dict, backend: str | None = None) -> bool:
+    if not bool((cfg.get("pipeline", {}) or {}).get("reuse_embeddings", True)):
+        return False
+    current = embedding_signature(cfg, backend)
+    stored = get_embedding_meta(conn, "embedding_signature")
+    if stored is None:
+        has_embeddings = conn.execute("SELECT 1 FROM embeddings LIMIT 1").fetchone() is not None
+        set_embedding_meta(conn, "embedding_signature", current)
+        if has_embeddings:
+            # Stored vectors predate the signature, so their model is unknown; re-embed changed chunks this run.
+            log.warning("[INGEST] recorded embedding_signature=%s over existing embeddings of unknown model; chunk_hash embedding reuse disabled for this run", current)
+            return False
+        log.info("[INGEST] recorded embedding_signature=%s", current)
+        return True
+    if stored != current:
+        # Chunks written from here on carry the new model's vectors, so the next run can reuse them again.
+        set_embedding_meta(conn, "embedding_signature", current)
+        log.warning("[INGEST] embedding signature changed stored=%s current=%s; chunk_hash embedding reuse disabled for this run", stored, current)
+        return False
+    return True
+
+def ingest_consumer(num_producers: int, doc_q: queue.Queue, db_path: str, embed_fn: Callable[[str], tuple[bytes, int]], cfg: dict, embed_workers: int = 2, embed_queue_size: int = 200, embed_backend: str | None = None, embed_cache=None, telemetry=None, report: dict | None = None):
+    threading_cfg = cfg.get("threading", {}) or {}
+    write_batch_docs = max(1, int(threading_cfg.get("write_batch_docs", 64)))
+    write_batch_chunks = max(1, int(threading_cfg.get("write_batch_chunks", 4000)))
+    write_batch_wait_s = float(threading_cfg.get("write_batch_wait_s", 2.0))
+    metadata_batch_docs = max(1, int(threading_cfg.get("metadata_batch_docs", 1000)))
+    metadata_batch_wait_s = float(threading_cfg.get("metadata_batch_wait_s", 30.0))
+
+    log.info("[INGEST] start db_path=%s producers=%d embed_workers=%d write_batch_docs=%d write_batch_chunks=%d",db_path, num_producers, embed_workers, write_batch_docs, write_batch_chunks)
+    conn = connect(db_path)
+    reuse_embeddings = resolve_embedding_reuse(conn, cfg, embed_backend)
+    embed_dtype = resolve_embedding_dtype(conn, cfg)
+    reuse_requires_title = passage_prompt_uses_title(cfg, embed_backend)
+    embed_client = None
+    if bool((cfg.get("embedding_client", {}) or {}).get("adaptive", False)):
+        embed_client = AdaptiveEmbedClient(embed_fn, cfg, backend=embed_backend, max_concurrency=embed_workers)
+        embed_fn = embed_client
+        # Idle workers just wait on the limiter, so start enough for its ceiling and let AIMD decide how many embed at once.
+        if int(embed_client.limiter.maximum) > embed_workers:
+            log.info("[INGEST] embed_workers %d -> %d to match embedding_client.max_concurrency", embed_workers, int(embed_client.limiter.maximum))
+            embed_workers = int(embed_client.limiter.maximum)
     embed_q: queue.Queue = queue.Queue(maxsize=embed_queue_size)
     embed_res_q: queue.Queue = queue.Queue()
+    if telemetry is not None:
+        telemetry.watch_queue("embed_q", embed_q)
+        telemetry.watch_queue("res_q", embed_res_q)
 
     workers = []
     for wid in range(embed_workers):
         t = threading.Thread(
             target=embed_worker,
-            args=(embed_fn, embed_q, embed_res_q, cfg, wid),
+            args=(embed_fn, embed_q, embed_res_q, cfg, wid, embed_cache, telemetry),
             daemon=False,
         )
         t.start()
         workers.append(t)
 
     finished = 0
-    processed = skipped = failed = 0
-    pending_embeds = 0
+    processed = failed = 0
+    pending_embeds = embed_failed = 0
     last_commit = time.monotonic()
-    inserted_since_commit = 0
+    pending_rows: list[tuple[int, int, bytes]] = []
+
+    pending_docs: list[PreparedDocument] = []
+    pending_doc_chunks = 0
+    batch_started = 0.0
+    written_docs = written_chunks = reused_embeddings = 0
+    write_seconds = 0.0
+    pending_metadata: list[PreparedDocument] = []
+    metadata_started = 0.0
+    unchanged_docs = 0
+    ingest_started = time.monotonic()
 
     def drain_results(max_n: int = 200) -> int:
-        nonlocal pending_embeds, last_commit, inserted_since_commit
+        nonlocal pending_embeds, embed_failed, last_commit
         drained = 0
-        batch = []
 
         while drained < max_n:
             try:
@@ -217,80 +458,156 @@ def ingest_consumer(num_producers: int, doc_q: queue.Queue, db_path: str, embed_
                 break
             try:
                 if res.vec is not None and res.dims is not None:
-                    batch.append((res.chunk_id, res.dims, res.vec))
-                    inserted_since_commit += 1
+                    vec = res.vec if embed_dtype == "float32" else convert_vector_blob(res.vec, res.dims, embed_dtype)
+                    pending_rows.append((res.chunk_id, res.dims, vec))
+                else:
+                    embed_failed += 1
                 pending_embeds -= 1
             finally:
                 embed_res_q.task_done()
             drained += 1
 
-        if batch:
-            cur = conn.cursor()
-            cur.executemany(
-                "INSERT OR REPLACE INTO embeddings(chunk_id, dims, vector) VALUES(?, ?, ?)",
-                batch
-            )
-
         now = time.monotonic()
-        if inserted_since_commit >= 2500 or (inserted_since_commit > 0 and now - last_commit >= 3.0):
-            conn.commit()
+        if len(pending_rows) >= 2500 or (pending_rows and now - last_commit >= 3.0):
+            cur = conn.cursor()
+            try:
+                t_lock = time.perf_counter()
+                cur.execute("BEGIN IMMEDIATE")
+                t_locked = time.perf_counter()
+                cur.executemany(
+                    "INSERT OR REPLACE INTO embeddings(chunk_id, dims, vector) VALUES(?, ?, ?)",
+                    pending_rows
+                )
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            if telemetry is not None:
+                telemetry.observe("sqlite_lock_wait", t_locked - t_lock)
+                telemetry.observe("sqlite_write:embeddings", time.perf_counter() - t_locked)
+                telemetry.count("embeddings_stored", len(pending_rows))
+            pending_rows.clear()
             last_commit = now
-            inserted_since_commit = 0
 
         return drained
+
+    def enqueue_embed_jobs(rows: list[tuple[int, str]], title: str | None) -> None:
+        nonlocal pending_embeds
+        for chunk_id, chunk_text in rows:
+            if embed_q.full():
+                log.warning("[INGEST] embed queue FULL; waiting chunk_id=%s", chunk_id)
+            while True:
+                try:
+                    embed_q.put(EmbedJob(chunk_id=chunk_id, text=chunk_text, title=title), timeout=1.0)
+                    pending_embeds += 1
+                    break
+                except queue.Full:
+                    drain_results(max_n=100)
+                    time.sleep(0.01)
+
+    def flush_metadata() -> None:
+        if not pending_metadata:
+            return
+        batch = list(pending_metadata)
+        pending_metadata.clear()
+        try:
+            t_refresh = time.perf_counter()
+            refresh_document_metadata(conn, batch)
+            if telemetry is not None:
+                telemetry.observe("sqlite_write:metadata", time.perf_counter() - t_refresh)
+            log.info("[WRITER] metadata refresh docs=%d unchanged_total=%d", len(batch), unchanged_docs)
+        except Exception:
+            log.exception("[WRITER] metadata refresh failed docs=%d", len(batch))
+
+    def flush_documents() -> None:
+        nonlocal pending_doc_chunks, processed, failed, written_docs, written_chunks, reused_embeddings, write_seconds
+        if not pending_docs:
+            return
+        batch = list(pending_docs)
+        pending_docs.clear()
+        pending_doc_chunks = 0
+        try:
+            report = write_document_batch(conn, batch, reuse_embeddings=reuse_embeddings, reuse_requires_title=reuse_requires_title)
+        except Exception:
+            failed += len(batch)
+            log.exception("[WRITER] batch failed docs=%d", len(batch))
+            return
+
+        batch_failed = report.count("failed")
+        failed += batch_failed
+        if telemetry is not None:
+            telemetry.observe("sqlite_lock_wait", report.lock_wait_s)
+            telemetry.observe("sqlite_write:docs", report.seconds - report.lock_wait_s)
+            telemetry.count("written_docs", len(report.outcomes) - batch_failed)
+        processed += len(report.outcomes) - batch_failed
+        written_docs += len(report.outcomes)
+        written_chunks += report.chunks_written
+        reused_embeddings += report.embeddings_reused
+        write_seconds += report.seconds
+        log.info("[WRITER] batch docs=%d written=%d skipped=%d embed_only=%d rejected=%d failed=%d chunks=%d reused=%d %.1f docs/s %.1f chunks/s", len(report.outcomes), report.count("written"), report.count("skipped"), report.count("embed_only"), report.count("rejected"), batch_failed, report.chunks_written, report.embeddings_reused, report.docs_per_s, report.chunks_per_s)
+
+        for outcome in report.outcomes:
+            if outcome.rows:
+                enqueue_embed_jobs(outcome.rows, outcome.title)
     
     try:
         while finished < num_producers:
+            if pending_docs:
+                timeout = max(0.0, write_batch_wait_s - (time.monotonic() - batch_started))
+            elif pending_metadata:
+                timeout = max(0.0, metadata_batch_wait_s - (time.monotonic() - metadata_started))
+            else:
+                timeout = 15
             try:
-                src, url, title, text, last_modified, etag = doc_q.get(timeout=15)
+                prepared = doc_q.get(timeout=timeout)
             except queue.Empty:
-                log.info("[INGEST] idle finished=%d/%d doc_q=%d pending=%d embed_q=%d res_q=%d", finished, num_producers, doc_q.qsize(), pending_embeds, embed_q.qsize(), embed_res_q.qsize())
+                if pending_docs:
+                    flush_documents()
+                elif pending_metadata:
+                    flush_metadata()
+                else:
+                    log.info("[INGEST] idle finished=%d/%d doc_q=%d pending=%d embed_q=%d res_q=%d", finished, num_producers, doc_q.qsize(), pending_embeds, embed_q.qsize(), embed_res_q.qsize())
                 drain_results(600)
                 continue
             try:
-                if url is STOP:
+                if prepared is STOP:
                     finished += 1
                     continue
 
-                if not filters.url_allowed(url):
-                    skipped += 1
-                    continue
-                if not text or not text.strip():
-                    skipped += 1
+                if prepared.unchanged:
+                    unchanged_docs += 1
+                    if telemetry is not None:
+                        telemetry.count("unchanged_docs")
+                    processed += 1
+                    if not pending_metadata:
+                        metadata_started = time.monotonic()
+                    pending_metadata.append(prepared)
+                    if len(pending_metadata) >= metadata_batch_docs or time.monotonic() - metadata_started >= metadata_batch_wait_s:
+                        flush_metadata()
                     continue
 
-                tier = tier_map.get(src, "primary")
-                weight = weight_map.get(src, 1.0)
-                chunks_to_embed = process_document(conn, embed_fn, cfg, src, url, title, text, tier=tier, weight=weight, do_embed=False, last_modified=last_modified, etag=etag) or []
-                processed += 1
-                for chunk_id, chunk_text in chunks_to_embed:
-                    if embed_q.full():
-                        log.warning("[INGEST] embed queue FULL; waiting chunk_id=%s", chunk_id)
-                    while True:
-                        try:
-                            embed_q.put(EmbedJob(chunk_id=chunk_id, text=chunk_text, title=title), timeout=1.0)
-                            pending_embeds += 1
-                            break
-                        except queue.Full:
-                            drain_results(max_n=100)
-                            time.sleep(0.01)
+                if not pending_docs:
+                    batch_started = time.monotonic()
+                pending_docs.append(prepared)
+                pending_doc_chunks += len(prepared.chunks)
+                if len(pending_docs) >= write_batch_docs or pending_doc_chunks >= write_batch_chunks:
+                    flush_documents()
 
                 drain_results(600)
 
-                total = processed + skipped + failed
+                total = processed + failed
                 if total and total % embed_queue_size == 0:
-                    log.info("[INGEST] processed=%d skipped=%d failed=%d doc_q=%d pending=%d embed_q=%d res_q=%d", processed, skipped, failed, doc_q.qsize(), pending_embeds, embed_q.qsize(), embed_res_q.qsize())
-
-                if processed and processed % 650 == 0:
-                    conn.commit()
+                    log.info("[INGEST] processed=%d failed=%d doc_q=%d pending=%d embed_q=%d res_q=%d", processed, failed, doc_q.qsize(), pending_embeds, embed_q.qsize(), embed_res_q.qsize())
 
             except Exception:
                 failed += 1
-                log.exception("[INGEST] failed src=%s url=%s", src, url)
+                log.exception("[INGEST] failed url=%s", getattr(prepared, "url", None))
 
             finally:
                 doc_q.task_done()
 
+        flush_documents()
+        flush_metadata()
         log.info("[INGEST] producers finished; waiting embed jobs pending=%d", pending_embeds)
         embed_q.join()
         while pending_embeds>0:
@@ -299,7 +616,8 @@ def ingest_consumer(num_producers: int, doc_q: queue.Queue, db_path: str, embed_
                 time.sleep(0.01)
 
         embed_res_q.join()
-        conn.commit()
+        last_commit = 0.0
+        drain_results(0)
 
     finally:
         for _ in workers:
@@ -312,4 +630,12 @@ def ingest_consumer(num_producers: int, doc_q: queue.Queue, db_path: str, embed_
         except Exception:
             pass
 
-    log.info("[INGEST] DONE processed=%d skipped=%d failed=%d", processed, skipped, failed)
\ No newline at end of file
+    elapsed = time.monotonic() - ingest_started
+    log.info("[WRITER] totals docs=%d chunks=%d reused_embeddings=%d write_s=%.1f %.1f docs/s %.1f chunks/s (wall %.1f docs/s)", written_docs, written_chunks, reused_embeddings, write_seconds, written_docs / max(write_seconds, 1e-9), written_chunks / max(write_seconds, 1e-9), written_docs / max(elapsed, 1e-9))
+    if embed_client is not None:
+        embed_client.maybe_report(force=True)
+    if embed_cache is not None:
+        embed_cache.log_stats("ingest")
+    log.info("[INGEST] DONE processed=%d unchanged=%d failed=%d embed_failed=%d", processed, unchanged_docs, failed, embed_failed)
+    if report is not None:
+        report.update({"completed": True, "processed": processed, "unchanged": unchanged_docs, "failed": failed, "embed_failed": embed_failed})